@@ -0,0 +1,142 @@
+"""
+  Benchmark cases, one for every command in `commands/extract` and `commands/transform`.
+  Each case builds its inputs in a work directory and returns the command name,
+  its params and the amount of work done by one run (units).
+"""
+import os
+
+from etl.benchmarks import generators as gen
+
+SCALES = {'small': 1, 'medium': 10, 'large': 100}
+
+def _path(workdir, *names):
+    path = os.path.join(workdir, *names)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def csv_reader(workdir, scale, seed):
+    rows = 10000 * scale
+    source = gen.csv_long(_path(workdir, 'csv', 'long.csv'), rows, seed)
+    params = {'input': source, 'output': _path(workdir, 'csv', 'long-out.csv'), 'unique': ['category'], 'overwrite': True}
+    return 'CsvReader', params, rows, 'rows'
+
+def csv_reader_wide(workdir, scale, seed):
+    rows = 2000 * scale
+    source = gen.csv_wide(_path(workdir, 'csv', 'wide.csv'), rows, 50, seed)
+    params = {'input': source, 'output': _path(workdir, 'csv', 'wide-out.csv'), 'overwrite': True}
+    return 'CsvReader', params, rows, 'rows'
+
+def excel_reader(workdir, scale, seed):
+    rows = 2000 * scale
+    source = gen.xlsx(_path(workdir, 'xlsx', 'sheets.xlsx'), rows, 3, 10, seed)
+    output = _path(workdir, 'xlsx', 'sheet1.csv')
+    params = {'input': source, 'output': output, 'local': output, 'sheet-name': 'sheet1', 'overwrite': True}
+    return 'ExcelReader', params, rows, 'rows'
+
+def text_reader(workdir, scale, seed):
+    rows = 10000 * scale
+    source = gen.text(_path(workdir, 'text', 'addresses.txt'), rows, seed)
+    params = {
+        'input'    : source,
+        'output'   : _path(workdir, 'text', 'addresses.csv'),
+        'overwrite': True,
+        'columns'  : {'name': 0, 'state': 1, 'postcode': 2},
+        'keys'     : ['postcode'],
+        'patterns' : {
+            0: '([A-Z]+) (ACT|NSW|NT|SA|QLD|TAS|VIC|WA) ([0-9]+)',
+            1: '([A-Z]+)  (ACT|NSW|NT|SA|QLD|TAS|VIC|WA)  ([0-9]+)',
+        },
+    }
+    return 'TextReader', params, rows, 'rows'
+
+def pdf_reader(workdir, scale, seed):
+    pages = 20 * scale
+    source = gen.pdf(_path(workdir, 'pdf-reader', 'report.pdf'), pages, 40, seed)
+    params = {'input': source, 'output': _path(workdir, 'pdf-reader', 'report.txt'), 'pages': [], 'tokens': [], 'result': 'save'}
+    return 'PdfReader', params, pages, 'pages'
+
+def pdf_papers(workdir, scale, seed):
+    pages, files = 20 * scale, 2
+    for n in range(files):
+        gen.pdf(_path(workdir, 'pdf-papers', f"paper-{n}.pdf"), pages, 40, seed + n)
+    params = {'path': _path(workdir, 'pdf-papers', ''), 'min_words': 10, 'max_words': 400, 'max_length': 2000}
+    return 'PDFPapers', params, pages * files, 'pages'
+
+def sqlite_read_write(workdir, scale, seed):
+    rows = 10000 * scale
+    source = gen.csv_long(_path(workdir, 'sqlite', 'long.csv'), rows, seed)
+    params = {
+        'connection': _path(workdir, 'sqlite', 'bench.db'),
+        'tables': {'long': {'input': source, 'output': _path(workdir, 'sqlite', 'long-out.csv')}},
+    }
+    return 'SQLiteReadWrite', params, rows, 'rows'
+
+def unzip(workdir, scale, seed):
+    files, rows = 5, 2000 * scale
+    source = gen.archive(_path(workdir, 'zip', 'archive.zip'), files, rows, seed)
+    params = {'input': source, 'output': _path(workdir, 'zip', 'out', ''), 'overwrite': True}
+    return 'Unzip', params, files * rows, 'rows'
+
+def download(workdir, scale, seed):
+    rows = 10000 * scale
+    source = gen.csv_long(_path(workdir, 'download', 'remote.csv'), rows, seed)
+    local = _path(workdir, 'download', 'local.csv')
+
+    def reset():
+        if os.path.exists(local): os.remove(local)
+    params = {'url': f"file://{os.path.abspath(source)}", 'local': local, 'overwrite': True}
+    return 'Download', params, rows, 'rows', reset
+
+def auto_postgresql(workdir, scale, seed):
+    tables = 10
+    staging = {}
+    for n in range(tables):
+        staging[f"t{n}"] = {'input': gen.csv_long(_path(workdir, 'autopg', f"t{n}.csv"), 1000 * scale, seed + n)}
+    path = _path(workdir, 'autopg', '')
+    params = {
+        'config'        : {'data_sources': path, 'data_path': path, 'sql_path': path},
+        'staging-tables': staging,
+        'star-tables'   : {},
+        'star-inserts'  : {},
+    }
+    return 'AutoPostgreSql', params, tables, 'tables'
+
+def gis_extract(workdir, scale, seed):
+    rows = 10000 * scale
+    source = gen.csv_wkt(_path(workdir, 'gis', 'points.csv'), rows, seed)
+    params = {'input': source, 'output': _path(workdir, 'gis', 'points-out.csv'), 'point': 'point', 'overwrite': True}
+    return 'GisExtract', params, rows, 'rows'
+
+def google_translator(workdir, scale, seed):
+    rows = 1000 * scale
+    gen.csv_text(_path(workdir, 'translate', 'text.csv'), rows, seed)
+    params = {
+        'path': _path(workdir, 'translate', ''), 'from_column': 'text', 'to_column': 'text-hr',
+        'src': 'en', 'dest': 'hr', 'min_threshold': 2, 'num_threads': 4,
+    }
+    return 'GoogleTranslator', params, rows, 'rows'
+
+def huggingface_summariser(workdir, scale, seed):
+    rows = 1000 * scale
+    gen.csv_text(_path(workdir, 'summarise', 'text.csv'), rows, seed)
+    params = {
+        'path': _path(workdir, 'summarise', ''), 'model': 'stub', 'from_column': 'text',
+        'to_column': 'summary', 'min_threshold': 10, 'num_threads': 4,
+    }
+    return 'HuggingFaceSummariser', params, rows, 'rows'
+
+CASES = {
+    'csv-reader-long'       : csv_reader,
+    'csv-reader-wide'       : csv_reader_wide,
+    'excel-reader'          : excel_reader,
+    'text-reader'           : text_reader,
+    'pdf-reader'            : pdf_reader,
+    'pdf-papers'            : pdf_papers,
+    'sqlite-read-write'     : sqlite_read_write,
+    'unzip'                 : unzip,
+    'download'              : download,
+    'auto-postgresql'       : auto_postgresql,
+    'gis-extract'           : gis_extract,
+    'google-translator'     : google_translator,
+    'huggingface-summariser': huggingface_summariser,
+}
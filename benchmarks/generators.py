@@ -0,0 +1,132 @@
+"""
+  Deterministic synthetic inputs for the benchmarks. The same `seed` and size
+  always produce the same files, so results of different runs are comparable.
+"""
+import os
+import csv
+import random
+import zipfile
+
+WORDS = (
+    "data pipeline extract transform load record batch stream column value table "
+    "process command report model summary paper page text field index schema "
+    "queue worker stage memory disk network latency throughput cache file"
+).split()
+
+STATES = ('ACT', 'NSW', 'NT', 'SA', 'QLD', 'TAS', 'VIC', 'WA')
+
+def _sentence(rng, min_words=5, max_words=20):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize() + '.'
+
+def paragraph(rng, sentences=5):
+    return ' '.join(_sentence(rng) for _ in range(sentences))
+
+def csv_wide(file_path, rows, cols=50, seed=0):
+    rng = random.Random(seed)
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([f"c{n}" for n in range(cols)])
+        for _ in range(rows):
+            writer.writerow([rng.randint(0, 10000) if n % 3 else rng.choice(WORDS) for n in range(cols)])
+    return file_path
+
+def csv_long(file_path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'category', 'amount', 'ratio', 'text'])
+        for n in range(rows):
+            writer.writerow([
+                n, f" {rng.choice(WORDS)}-{rng.randint(0, 999)} ", rng.choice(WORDS),
+                rng.randint(0, 1000000), round(rng.random(), 6), _sentence(rng, 3, 12)
+            ])
+    return file_path
+
+def csv_text(file_path, rows, seed=0, column='text'):
+    rng = random.Random(seed)
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['pg', column])
+        for n in range(rows):
+            writer.writerow([n, paragraph(rng, rng.randint(1, 6))])
+    return file_path
+
+def csv_wkt(file_path, rows, seed=0, column='point'):
+    rng = random.Random(seed)
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', column, 'name'])
+        for n in range(rows):
+            point = f"POINT ({rng.uniform(110, 155):.6f} {rng.uniform(-44, -10):.6f})"
+            writer.writerow([n, point, rng.choice(WORDS)])
+    return file_path
+
+def xlsx(file_path, rows, sheets=3, cols=10, seed=0):
+    import pandas as pd
+    rng = random.Random(seed)
+    with pd.ExcelWriter(file_path) as writer:
+        for sheet in range(sheets):
+            data = {f"c{n}": [rng.randint(0, 10000) for _ in range(rows)] for n in range(cols)}
+            pd.DataFrame(data).to_excel(writer, sheet_name=f"sheet{sheet}", index=False)
+    return file_path
+
+def text(file_path, rows, seed=0):
+    """
+      Lines matching the TextReader patterns, e.g. `SMITH NSW 2000`, mixed with noise.
+    """
+    rng = random.Random(seed)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for _ in range(rows):
+            name = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(rng.randint(3, 10)))
+            sep = rng.choice((' ', '  '))
+            f.write(f"{name}{sep}{rng.choice(STATES)}{sep}{rng.randint(800, 7999)}\n")
+            f.write(_sentence(rng).lower() + "\n")
+    return file_path
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def pdf(file_path, pages, lines=40, seed=0):
+    """
+      Minimal multi-page PDF with one text line per row, readable by pypdf and pdfplumber.
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None, # page tree, written when the page objects are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for _ in range(pages):
+        rows = [f"({_pdf_escape(_sentence(rng, 4, 12))}) Tj T*" for _ in range(lines)]
+        stream = ("BT /F1 9 Tf 40 800 Td 12 TL\n" + "\n".join(rows) + "\nET").encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % n for n in kids), pages)
+
+    with open(file_path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for n, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (n, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return file_path
+
+def archive(file_path, files, rows, seed=0):
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for n in range(files):
+            name = f"{os.path.splitext(file_path)[0]}-{n}.csv"
+            csv_long(name, rows, seed + n)
+            zf.write(name, os.path.basename(name))
+            os.remove(name)
+    return file_path
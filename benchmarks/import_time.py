@@ -0,0 +1,110 @@
+"""
+  Import-time benchmark of the etl package.
+
+  Every module is imported in a fresh interpreter with `python -X importtime`,
+  and the cumulative import time and the heavy libraries it loaded are recorded.
+  Results can be saved as a JSON baseline and compared against it later.
+
+  Usage:
+      python -m etl.benchmarks.import_time [--repeat 5] [--output import-time.json]
+                                           [--baseline import-time.json] [--tolerance 0.25]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+MODULES = [
+    'etl.core',
+    'etl.utils',
+    'etl.commands',
+    'etl.commands.extract.csv_reader',
+    'etl.commands.extract.pdf_papers',
+    'etl.commands.extract.pdf_reader',
+    'etl.commands.transform.google_translator',
+    'etl.commands.transform.huggingface_summariser',
+]
+
+HEAVY = (
+    'pandas', 'numpy', 'psycopg2', 'sqlalchemy', 'pyarrow', 'spacy', 'transformers',
+    'torch', 'dask', 'googletrans', 'pdfplumber', 'pypdf',
+)
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)\s*$')
+
+def package_parent():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def measure(module):
+    code = f"import sys, json, {module}; print(json.dumps(sorted(sys.modules)))"
+    env = dict(os.environ, PYTHONPATH=package_parent())
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {'module': module, 'error': proc.stderr.strip().splitlines()[-1]}
+
+    cumulative = None
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and match.group(3) == module:
+            cumulative = int(match.group(2))
+
+    loaded = json.loads(proc.stdout)
+    return {
+        'module': module,
+        'us'    : cumulative,
+        'heavy' : [name for name in HEAVY if name in loaded],
+    }
+
+def run(modules, repeat):
+    results = []
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r.get('us') or 0)
+        results.append(best)
+    return results
+
+def compare(results, baseline, tolerance):
+    before = {r['module']: r for r in baseline}
+    regressions = []
+    for result in results:
+        old = before.get(result['module'])
+        if not old or not old.get('us') or not result.get('us'):
+            continue
+        if result['us'] > old['us'] * (1 + tolerance):
+            regressions.append(f"{result['module']}: {old['us']} us -> {result['us']} us")
+        for name in set(result['heavy']) - set(old['heavy']):
+            regressions.append(f"{result['module']}: now imports {name}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="etl import-time benchmark")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, args.repeat)
+    for r in results:
+        if 'error' in r:
+            print(f"{r['module']:<48} error: {r['error']}")
+        else:
+            print(f"{r['module']:<48} {r['us'] / 1000:>9.1f} ms  {', '.join(r['heavy'])}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+  Benchmark suite of the etl commands.
+
+  Every case generates its synthetic input (see `cases.py`), runs the command
+  `--repeat` times and reports latency percentiles and throughput. One more run
+  with tracemalloc enabled records the peak memory, so tracing does not slow the
+  timed runs. Model steps (spaCy, transformers, googletrans) are replaced by the
+  stubs in `stubs.py`. Results can be saved as a JSON baseline and compared
+  against it later.
+
+  Usage:
+      python -m etl.benchmarks.run [--scale small|medium|large] [--repeat 5] [--warmup 1]
+                                   [--fanout serial] [--workdir DIR] [--output bench.json]
+                                   [--baseline bench.json] [--tolerance 0.25] [case ...]
+"""
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import traceback
+
+from etl.core.logger import WattleLogger
+from etl.core.metrics import WattleMetrics
+from etl.commands import get_command
+from etl.benchmarks import stubs
+from etl.benchmarks.cases import CASES, SCALES
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def run_case(log, name, scale, repeat, warmup, fanout, workdir, seed=0):
+    case = CASES[name](workdir, SCALES[scale], seed)
+    command, params, units, unit = case[:4]
+    reset = case[4] if len(case) > 4 else None
+    params.setdefault('fanout', fanout)
+    cls = get_command(command)
+
+    def once(metrics=None):
+        if reset: reset()
+        task = cls(log, dict(params))
+        task.metrics = metrics
+        started = time.perf_counter()
+        task.execute()
+        return time.perf_counter() - started
+
+    for _ in range(warmup):
+        once()
+    times = [once() for _ in range(repeat)]
+
+    metrics = WattleMetrics(log, {'tracemalloc': True})
+    once(metrics)
+    record = metrics.records[-1]
+
+    mean = sum(times) / len(times)
+    return {
+        'case'      : name,
+        'command'   : command,
+        'scale'     : scale,
+        'units'     : units,
+        'unit'      : unit,
+        'p50'       : percentile(times, 50),
+        'p90'       : percentile(times, 90),
+        'p99'       : percentile(times, 99),
+        'mean'      : mean,
+        'throughput': units / mean if mean else None,
+        'mem_peak'  : record['mem_peak'],
+        'rss_peak'  : record['rss_peak'],
+        'bytes_read': record['bytes_read'],
+        'bytes_written': record['bytes_written'],
+    }
+
+def run(names, scale, repeat, warmup, fanout, workdir=None):
+    log = WattleLogger({'name': 'benchmarks', 'level': logging.ERROR})
+    stubs.install()
+    results = []
+    for name in names:
+        path = workdir if workdir else tempfile.mkdtemp(prefix=f"wattle-bench-{name}-")
+        try:
+            results.append(run_case(log, name, scale, repeat, warmup, fanout, path))
+        except Exception as e:
+            results.append({'case': name, 'scale': scale, 'error': f"{e.__class__.__name__}: {e}"})
+            log.debug(traceback.format_exc())
+        finally:
+            if not workdir:
+                shutil.rmtree(path, ignore_errors=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    before = {(r['case'], r['scale']): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = before.get((result['case'], result['scale']))
+        if not old or 'error' in old:
+            continue
+        if 'error' in result:
+            regressions.append(f"{result['case']}: {result['error']}")
+            continue
+        if result['p50'] > old['p50'] * (1 + tolerance):
+            regressions.append(f"{result['case']}: p50 {old['p50']:.3f} s -> {result['p50']:.3f} s")
+        if old.get('mem_peak') and result['mem_peak'] > old['mem_peak'] * (1 + tolerance):
+            regressions.append(f"{result['case']}: memory {old['mem_peak']} B -> {result['mem_peak']} B")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="etl command benchmarks")
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--fanout', choices=['serial', 'thread', 'process'], default='serial')
+    parser.add_argument('--workdir')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('cases', nargs='*', default=list(CASES))
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, args.scale, max(1, args.repeat), args.warmup, args.fanout, args.workdir)
+    for r in results:
+        if 'error' in r:
+            print(f"{r['case']:<24} error: {r['error']}")
+            continue
+        mem = r['mem_peak'] / 2**20 if r['mem_peak'] is not None else 0
+        print(f"{r['case']:<24} p50 {r['p50']:>8.3f} s  p90 {r['p90']:>8.3f} s  p99 {r['p99']:>8.3f} s  "
+              f"{r['throughput']:>11.1f} {r['unit']}/s  {mem:>8.1f} MiB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+  Stand-ins for model steps, so benchmarks measure the command code rather than
+  model inference or network calls. Stubs are registered in the resource registry
+  (spaCy, transformers) or installed as the `googletrans` module.
+"""
+import re
+import sys
+import types
+
+from etl.core.resources import WattleResources
+
+SENTENCE = re.compile(r'(?<=[.!?])\s+')
+
+class _Span(str):
+    pass
+
+class _Doc:
+    def __init__(self, text):
+        self.text = text
+        self.sents = [_Span(s) for s in SENTENCE.split(text) if s]
+
+class StubNlp:
+    """ Rule-based sentence splitter with the spaCy `nlp(text).sents` interface. """
+    def __call__(self, text):
+        return _Doc(text)
+
+    def pipe(self, texts, batch_size=None, n_process=None):
+        for text in texts:
+            yield _Doc(text)
+
+class StubSummariser:
+    """ Returns the first words of a text, with the transformers pipeline interface. """
+    def __call__(self, text, max_length=None, min_length=None, do_sample=False):
+        words = f"{text}".split()
+        return [{'summary_text': ' '.join(words[:max(1, min_length or 1)])}]
+
+class _Translated:
+    def __init__(self, text):
+        self.text = text
+
+class StubTranslator:
+    def translate(self, text, src=None, dest=None):
+        return _Translated(f"{text}"[::-1])
+
+def install():
+    # must run after the command modules are imported, they register the real factories
+    import etl.commands.extract.pdf_papers
+    import etl.commands.transform.huggingface_summariser
+    WattleResources.register('spacy', lambda config: StubNlp())
+    WattleResources.register('transformers', lambda config: StubSummariser())
+
+    googletrans = types.ModuleType('googletrans')
+    googletrans.Translator = StubTranslator
+    sys.modules['googletrans'] = googletrans
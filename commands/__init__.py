@@ -0,0 +1,48 @@
+import importlib
+
+# Command classes by name. A command module (and the libraries it depends on)
+# is imported only when a pipeline references the command.
+COMMANDS = {
+    'AutoPostgreSql'       : 'etl.commands.extract.autopostgresql',
+    'CsvReader'            : 'etl.commands.extract.csv_reader',
+    'Download'             : 'etl.commands.extract.download',
+    'ExcelReader'          : 'etl.commands.extract.excel_reader',
+    'PDFPapers'            : 'etl.commands.extract.pdf_papers',
+    'PdfReader'            : 'etl.commands.extract.pdf_reader',
+    'SQLiteReadWrite'      : 'etl.commands.extract.sqllite_read_write',
+    'TextReader'           : 'etl.commands.extract.text_reader',
+    'Unzip'                : 'etl.commands.extract.unzip',
+    'GisExtract'           : 'etl.commands.transform.gis_extract',
+    'GoogleTranslator'     : 'etl.commands.transform.google_translator',
+    'HuggingFaceSummariser': 'etl.commands.transform.huggingface_summariser',
+    'ParquetLoader'        : 'etl.commands.load.parquet_loader',
+    'PostgresLoader'       : 'etl.commands.load.postgres_loader',
+}
+
+__all__ = list(COMMANDS) + ['COMMANDS', 'get_command', 'create_command']
+
+class UnknownCommandError(Exception):
+    pass
+
+def get_command(name):
+    """
+      Returns a command class by its name, e.g. `CsvReader`, or by its full
+      `module.Class` path for commands outside of this package.
+    """
+    if name in COMMANDS:
+        module, cls = COMMANDS[name], name
+    elif '.' in name:
+        module, cls = name.rsplit('.', 1)
+    else:
+        raise UnknownCommandError("Unknown command: {}".format(name))
+    return getattr(importlib.import_module(module), cls)
+
+def create_command(name, log, params):
+    return get_command(name)(log, params)
+
+def __getattr__(name):
+    if name not in COMMANDS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = get_command(name)
+    globals()[name] = value
+    return value
@@ -1,20 +1,46 @@
 import os
-import pandas as pd
+import time
+import threading
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from etl.core.constants import MSG_NOT_FOUND
 from etl.core.concrete import WattleExtract
 from etl.utils.base import WattleUtils
+from etl.utils.schema import WattleSchema, SCHEMA_CACHE
 
-fieldtype = {
-    'int'    : 'INTEGER',
-    'bool'   : 'BOOLEAN',
-    'int64'  : 'BIGINT',
-    'float'  : 'DECIMAL',
-    'float64': 'DOUBLE PRECISION',
-    'object' : 'VARCHAR(255)'
-}
+COPY_WORKERS = 4
+
+class AutoPostgreSqlError(Exception):
+    pass
 
 class AutoPostgreSql(WattleExtract):
+    """
+      This class generates PostgreSQL scripts for loading staging tables from CSV
+      files and building star tables: drop, create and copy scripts for the staging
+      tables and drop, create and insert scripts for the star tables.
+
+      Staging column types are inferred from a sample of each CSV file and cached by
+      file path, size and mtime (see WattleSchema).
+
+      When `connection` is given the scripts are also executed: staging tables are
+      dropped and created, then all staging tables are loaded concurrently with
+      `COPY ... FROM STDIN` over `workers` connections, then the star scripts run.
+      Load time, rows and throughput are logged and returned per staging table.
+
+      Constructor(params)
+          config         - dict(data_sources, data_path, sql_path).
+          staging-tables - dict(name: dict(input)).
+          star-tables    - dict(name: create sql).
+          star-inserts   - dict(name: insert sql).
+          schema         - dict(cache, sample, tail) schema inference config
+                           (default cache: {sql_path}.wattle-schema.json).
+          connection     - dict(user, pswd, host, port, dbname) execute the scripts (optional).
+          workers        - staging tables loaded in parallel (default: 4).
+
+      Methods:
+          execute(self) - generate and save the scripts, returns load timings per
+                          staging table when executed.
+    """
     def __init__(self, log, params):
         super().__init__(log, params)
         assert isinstance(params['config'],         dict)
@@ -25,9 +51,21 @@ class AutoPostgreSql(WattleExtract):
         self.config = params['config']
 
         self.staging_tables = params['staging-tables']
+        if 'inputs' not in params:
+            self.inputs = [t['input'] for t in self.staging_tables.values() if 'input' in t]
+        if 'outputs' not in params and 'sql_path' in self.config:
+            self.outputs = [f"{self.config['sql_path']}*.sql"]
         self.star_tables = params['star-tables']
         self.star_inserts = params['star-inserts']
 
+        schema = dict(params['schema']) if 'schema' in params else {}
+        if 'cache' not in schema and 'sql_path' in self.config:
+            schema['cache'] = f"{self.config['sql_path']}{SCHEMA_CACHE}"
+        self.schema = WattleSchema(log, schema)
+        self.connection = params['connection'] if 'connection' in params else None
+        self.workers = int(params['workers']) if 'workers' in params else COPY_WORKERS
+        self.timings = {}
+
         self._sql_staging_del = []
         self._sql_staging_cr  = []
         self._sql_staging_cp  = []
@@ -50,11 +88,9 @@ class AutoPostgreSql(WattleExtract):
     def _staging_create(self, name):
         self.log.info(f'stage-create: {name}')
         file_path = self.staging_tables[name]['input']
-        df = pd.read_csv(file_path)
 
         sql = f"CREATE TABLE IF NOT EXISTS staging_{name} (\n"
-        for field, dtype in df.dtypes.items():
-            field_type = fieldtype[str(dtype)] if str(dtype) in fieldtype else "UNKNOWN"
+        for field, field_type in self.schema.infer(file_path):
             sql += f"     \"{field}\" {field_type},\n"
         sql = sql[:-2] + "\n"
         sql += ");\n\n"
@@ -119,6 +155,79 @@ class AutoPostgreSql(WattleExtract):
         self._save_to_file(f'{sql_path}5-star-create.sql', self._sql_star_cr)
         self._save_to_file(f'{sql_path}6-star-inserts.sql', self._sql_star_ins)
 
+    def _connect(self):
+        from etl.utils.postgres import WattlePostgres
+        return WattlePostgres(logger=self.log, shared=False, **self.connection)
+
+    def _run_scripts(self, db, scripts):
+        for sql in scripts:
+            db.execute(sql)
+        db.commit()
+
+    def _copy_table(self, local, name):
+        # every worker thread keeps its own connection for all of its tables
+        if not hasattr(local, 'db'):
+            local.db = self._connect()
+            with self._lock: self._connections.append(local.db)
+        db = local.db
+        file_path = self.staging_tables[name]['input']
+
+        started = time.perf_counter()
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                db.cursor.copy_expert(f"COPY staging_{name} FROM STDIN WITH (FORMAT CSV, HEADER True)", f)
+            db.commit()
+        except Exception:
+            db.conn.rollback()
+            raise
+        seconds = time.perf_counter() - started
+        rows = db.cursor.rowcount
+        return {
+            'seconds'    : seconds,
+            'rows'       : rows,
+            'bytes'      : os.path.getsize(file_path),
+            'rows_per_sec': rows / seconds if seconds else None,
+        }
+
+    def _copy_tables(self):
+        local, failed = threading.local(), {}
+        self._lock, self._connections = threading.Lock(), []
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+                futures = {executor.submit(self._copy_table, local, name): name for name in self.staging_tables}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        self.timings[name] = future.result()
+                    except Exception as e:
+                        failed[name] = f"{e}"
+                        self.log.error("stage-load: {}: {}".format(name, e))
+                        continue
+                    self.log.info("stage-load: {}: {rows} rows in {seconds:.3f} s ({rows_per_sec:.0f} rows/s)".format(
+                        name, **self.timings[name]))
+        finally:
+            for db in self._connections: db.close()
+
+        rows = sum(t['rows'] for t in self.timings.values())
+        self.report(rows_in=rows)
+        self.log.info("stage-load: {} tables, {} rows in {:.3f} s with {} workers.".format(
+            len(self.timings), rows, time.perf_counter() - started, self.workers))
+        if failed:
+            raise AutoPostgreSqlError("{} of {} staging table(s) failed: {}".format(
+                len(failed), len(self.staging_tables), ', '.join(failed)))
+
+    def _execute_scripts(self):
+        self.log.debug("{}._execute_scripts()".format(self.__class__.__name__))
+        db = self._connect()
+        try:
+            self._run_scripts(db, self._sql_staging_del + self._sql_staging_cr)
+            self._copy_tables()
+            self._run_scripts(db, self._sql_star_del + self._sql_star_cr + self._sql_star_ins)
+        finally:
+            db.close()
+        return self.timings
+
     def extract(self):
         super().extract()
         if not WattleUtils.path_exists(self.config['data_sources']):
@@ -132,5 +241,7 @@ class AutoPostgreSql(WattleExtract):
             raise FileNotFoundError(msg)
         self._generate_scripts()
         self._save_scripts()
+        if self.connection:
+            return self._execute_scripts()
             
 ## TIMEFORMAT 'epochmillisecs', BLANKSASNULL true, EMPTYASNULL true TRUNCATECOLUMNS
\ No newline at end of file
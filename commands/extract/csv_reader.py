@@ -4,6 +4,8 @@ import pandas as pd
 
 from etl.core.constants import (
     MSG_FILE_EXIST,
+    MSG_NOT_FOUND,
+    MSG_CREATION_ERROR,
     MSG_FILE_DOWNLOADED,
     METHOD_EXEC,
     MSG_CSV_FILE_ERROR,
@@ -12,6 +14,10 @@ from etl.core.constants import (
 
 from etl.core.concrete import WattleExtract
 from etl.utils.base import WattleUtils
+from etl.utils.formats import WattleFormat
+from etl.utils.profiler import WattleProfiler
+
+UNIQUE_SHOW = 100 # max distinct values logged, the most common values are logged above it
 
 class FilePathError(Exception):
     pass
@@ -26,17 +32,32 @@ class CsvReader(WattleExtract):
       loaded csv data columns and log some basic information. The result is saved to a `output` 
       file and DataFrame returned by `execute` method.
 
+      With `chunksize` the file is streamed: every chunk is read, renamed, filtered and
+      appended to the output, and stats are accumulated across chunks, so peak memory
+      depends on the chunk size instead of the file size. `execute` then returns the
+      number of rows, and the reader can be iterated (or used by a stream) to get the
+      chunks as DataFrames.
+
       Constructor(params)
           input     - must be a local file path.
           output    - local path (if not given, text file will be stored next to the input pdf).
           columns   - csv field list.
           renamed   - new column name list.
+          query     - pandas query expression, only matching rows are kept (optional).
           unique    - produce unique values for a given column list.
-          min-maxm  - create log entries for min/max values of a given column list.
+          min-max   - create log entries for min/max values of a given column list.
+          profile   - True logs count, nulls, min/max, distinct and most common values
+                      of all columns (optional).
+          top       - number of most common values logged (default: 10).
+          chunksize - rows per chunk, enables streaming mode (optional).
+          format    - output format csv|parquet|feather, the output extension is changed
+                      to match (default: by output extension). The input is read in the
+                      format of its extension.
           overwrite - True|False.
 
       Methods:
           execute(self) - evaluate given input params and extracts archive.
+          batches(self) - yields DataFrame chunks (also written to the output).
     """
     def __init__(self, log, params):
         super().__init__(log, params)
@@ -47,89 +68,176 @@ class CsvReader(WattleExtract):
         self._output  = params['output']  if 'output'  in params else None
         self._columns = params['columns'] if 'columns' in params else None
         self._renamed = params['renamed'] if 'renamed' in params else None
+        self._query   = params['query']   if 'query'   in params else None
         self._unique  = params['unique']  if 'unique'  in params else None
-        self._min_max = params['min-max'] if 'min'     in params else None
+        self._min_max = params['min-max'] if 'min-max' in params else None
+        self._top     = params['top']     if 'top'     in params else 10
+        self._profile = params['profile'] if 'profile' in params else False
+        self._chunksize = params['chunksize'] if 'chunksize' in params else None
         self._overwrite = params['overwrite'] if 'overwrite' in params else True
+        self._format  = WattleFormat(params['format'] if 'format' in params else None)
+        if self._output:
+            self._output = self._format.path(self._output)
+            self.outputs = [self._output]
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._records = 0
+        self._names   = None
+        profiled = self._profile or self._unique or self._min_max
+        self.profiler = WattleProfiler(self._profiled(), top=self._top) if profiled else None
+
+    def _profiled(self):
+        if self._profile is True:
+            return None # all columns
+        columns = []
+        for column in (self._unique if isinstance(self._unique, list) else []) + (self._min_max if self._min_max else []):
+            if column not in columns: columns.append(column)
+        return columns
+
+    def _accumulate(self, df):
+        self._records += len(df)
+        if self._names is None:
+            self._names = list(df.columns)
+        if self.profiler is not None:
+            self.profiler.update(df)
 
     def _distinct(self):
         self.log.debug("{}._distinct()".format(self.__class__.__name__))
         try:
             for column in self._unique:
-                distinct = sorted(self._df[column].apply(lambda x: x.strip() if isinstance(x, str) else x).dropna().unique())
-                self.log.info("({}) {}: {}".format(len(distinct), column, distinct))
+                profile = self.profiler.profile(column)
+                if profile is None: continue
+                if profile.approximate or profile.distinct > UNIQUE_SHOW:
+                    self.log.info("({}{}) {} top: {}".format(
+                        '~' if profile.approximate else '', profile.distinct, column, profile.most_common()))
+                else:
+                    self.log.info("({}) {}: {}".format(profile.distinct, column, profile.values()))
         except Exception as e:
             self.log.error(e)
 
     def _read_requested_stats(self):
         self.log.debug("{}._read_requested_stats()".format(self.__class__.__name__))
 
-        self.log.info("Columns:({})[{}]".format(len(self._df.columns), ','.join(self._df.columns)))
-        self.log.info("Records: {}".format(len(self._df)))
+        names = self._names if self._names else []
+        self.log.info("Columns:({})[{}]".format(len(names), ','.join(f"{n}" for n in names)))
+        self.log.info("Records: {}".format(self._records))
        
         # Min/Max values for each given column
         if self._min_max:
             for each in self._min_max:
+                profile = self.profiler.profile(each)
                 self.log.info("{} min: {} max: {}".format(
-                    self._df[each].min(),
-                    self._df[each].max()
+                    each,
+                    profile.min if profile else None,
+                    profile.max if profile else None
                     )
                 )
 
-    def _read(self):
-        self.log.debug("{}._read()".format(self.__class__.__name__))
-
-        try:
-            if not self._columns:
-                self._df = pd.read_csv(self._input)
-            else:
-                self._df = pd.read_csv(self._input, usecols=self._columns)
-            
-            if self._renamed and isinstance(self._renamed, list):
-                self._df.columns = self._renamed
-
-        except Exception as e:
-            msg = MSG_CSV_FILE_ERROR.format(self._input)
-            self.log.error(msg)
-            self.log.error(e)
-            raise FileReadingError(msg)
-
-        self._read_requested_stats()
-
         if self._unique and isinstance(self._unique, list):
             self._distinct()
 
-    def _save(self):
-        self.log.debug("{}._save()".format(self.__class__.__name__))
+        if self._profile is True:
+            for stats in self.profiler.stats():
+                self.log.info("{column}: count {count}, nulls {nulls}, min {min}, max {max}, "
+                    "distinct {distinct}, top {top}".format(**stats))
+
+    def _prepare(self, df):
+        if self._renamed and isinstance(self._renamed, list):
+            df.columns = self._renamed
+        if self._query:
+            df = df.query(self._query)
+        return df
+
+    def _reader(self):
+        if not self._chunksize:
+            yield self._format.read(self._input, self._columns)
+            return
+        yield from self._format.chunks(self._input, self._chunksize, self._columns)
 
+    def _read(self):
+        self.log.debug("{}._read()".format(self.__class__.__name__))
+
+        chunks = self._reader()
+        while True:
+            try:
+                df = next(chunks)
+                df = self._prepare(df)
+            except StopIteration:
+                return
+            except Exception as e:
+                chunks.close()
+                msg = MSG_CSV_FILE_ERROR.format(self._input)
+                self.log.error(msg)
+                self.log.error(e)
+                raise FileReadingError(msg)
+
+            self._accumulate(df)
+            yield df
+
+    def _writable(self):
         if self._output is None: 
             self.log.info("Output not given.")
-            return
+            return False
 
         if not WattleUtils.path_exists(self._output):
             msg = MSG_NOT_FOUND.format("Path", self._output)
             self.log.error(msg)
             raise FilePathError(msg)
 
-        try:
-            if not os.path.exists(self._output):
-                self._df.to_csv(self._output, header=True, index=False)
-                self.log.info(MSG_FILE_CREATED.format(self._output))
-            else:
-                if self._overwrite: 
-                    self._df.to_csv(self._output, header=True, index=False)
-                    self.log.info("File overwritten: {}".format(self._output))
+        if os.path.exists(self._output) and not self._overwrite:
+            self.log.info(MSG_FILE_EXIST.format(self._output))
+            return False
+        return True
 
+    def _save(self, writer, df):
+        exists = writer.rows == 0 and os.path.exists(self._output)
+        try:
+            writer.write(df)
         except Exception as e:
-            self.log.error(MSG_CREATION_ERROR.format(self._output))
+            self.log.error(MSG_CREATION_ERROR.format(self._output, e))
+            raise
+        if exists:
+            self.log.info("File overwritten: {}".format(self._output))
+        elif writer.rows == len(df):
+            self.log.info(MSG_FILE_CREATED.format(self._output))
 
-    def extract(self):
-        super().extract()
+    def _chunks(self):
+        self.log.debug("{}._chunks()".format(self.__class__.__name__))
 
-        if not WattleUtils.path_exists(self._input):
+        if not WattleUtils.file_exists(self._input):
             msg = MSG_NOT_FOUND.format("File", self._input)
             self.log.error(msg)
             raise FileNotFoundError(msg)
 
-        self._read()
-        self._save()
-        return self._df
+        self._reset_stats()
+        writer = self._format.writer(self._output) if self._writable() else None
+        try:
+            for df in self._read():
+                if writer:
+                    self._save(writer, df)
+                self.report(rows_in=len(df))
+                yield df
+        finally:
+            if writer: writer.close()
+        self._read_requested_stats()
+
+    def batches(self):
+        self.log.debug("{}.batches()".format(self.__class__.__name__))
+        return self._chunks()
+
+    def __iter__(self):
+        return self._chunks()
+
+    def extract(self):
+        super().extract()
+
+        if not self._chunksize:
+            for df in self._chunks():
+                self._df = df
+            return self._df
+
+        rows = 0
+        for df in self._chunks():
+            rows += len(df)
+        return rows
@@ -1,8 +1,6 @@
-mport os
+import os
 import sys
 import csv
-import xlrd
-import numpy as np
 import pandas as pd
 
 from etl.core.constants import (
@@ -16,7 +14,8 @@ from etl.core.constants import (
 )
 
 from etl.core.concrete import WattleExtract
-from etl.core.utils import WattleUtils
+from etl.utils.base import WattleUtils
+from etl.utils.formats import WattleFormat
 
 class ExcelReaderFileError(Exception):
     pass
@@ -34,6 +33,7 @@ class ExcelReader(WattleExtract):
           skip-rows    - rows to skip when loading file.
           skip-footer  - footer rows to skip when loading file. 
           verbose      - print verbose informatin.
+          format       - output format csv|parquet|feather (default: by output extension).
 
       Methods:
           execute(self)  - evaluate given input params and extracts archive.
@@ -59,8 +59,13 @@ class ExcelReader(WattleExtract):
         self._names     = params['renamed']   if 'renamed'   in params else None
         self._keys      = params['keys']      if 'keys'      in params else None
         self._overwrite = params['overwrite'] if 'overwrite' in params else None
+        self._format    = WattleFormat(params['format'] if 'format' in params else None)
         self._kwargs    = {}
 
+        if self._local:
+            self._local = self._format.path(self._local)
+            self.outputs = [self._local]
+
         if 'columns'     in params: self._kwargs['usecols']     = params['columns'] 
         if 'sheet-name'  in params: self._kwargs['sheet_name']  = params['sheet-name']
         if 'columns'     in params: self._kwargs['names']       = params['columns']
@@ -112,15 +117,10 @@ class ExcelReader(WattleExtract):
 
         try:
             if os.path.exists( self._local ) or self._overwrite:
-                self._df.to_csv(
-                    path_or_buf = self._local,
-                    index       = False, 
-                    encoding    = 'utf-8'
-                    # **kwargs
-                )
+                self._format.write(self._df, self._local)
                 self.log.info( MSG_FILE_SAVED.format(self._local) )
         except IOError as e:
-            msg = f"Saving data to a csv {self._ouput}.\n {e}"
+            msg = f"Saving data to a file {self._local}.\n {e}"
             self.log.error( msg )
             raise IOError( msg )
 
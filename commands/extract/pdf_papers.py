@@ -2,20 +2,16 @@ import io
 import os
 import re
 import sys
-import pdfplumber
 # import pypdf
 import logging
-import gc, psutil, traceback
+import gc, traceback
 import timeit, datetime
-import pandas as pd
 # import nltk
-import spacy
+import csv
 import time
+import threading
 import warnings
-import numpy as np
 import pandas as pd
-import dask.dataframe as dd
-import dask.multiprocessing
 from etl.utils.lambda_functions import (
     inc,
     zero
@@ -23,9 +19,15 @@ from etl.utils.lambda_functions import (
 
 from tqdm.notebook import tqdm
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from etl.core.concrete import WattleExtract
+from etl.core.fanout import WattleFanOut, available_cores
+from etl.core.pipeline import WattlePipeline, WattleStage
+from etl.core.resources import WattleResources, resources
 from etl.utils import WattleUtils
+from etl.utils.formats import WattleFormat, CSV
 from etl.core.constants import (
     MSG_FILE_EXIST,
     MSG_FILE_OVERWRITEN,
@@ -41,25 +43,76 @@ from etl.core.constants import (
     TRANSLATOR_DEST,
     DEFAULT_MULTIPLIER,
     SUMMARY_TEXT,
+    SPACY_MODEL,
 )
 
+PARAGRAPH_FIELDS = ['text', 'pg', 'paragraph', 'wc', 'chars']
+PAGE_RANGES = 4 # page ranges per page worker, so uneven pages are balanced
+SEGMENT_BATCH = 64
+SEGMENT_DISABLE = ['ner', 'lemmatizer'] # components not needed for sentences
+
 class ReadingPdfFileError(Exception):
     pass
 
+def _load_spacy(config):
+    import spacy
+    nlp = spacy.load(config['model'])
+    if 'sentencizer' in config and config['sentencizer']:
+        # rule-based sentence boundaries instead of the dependency parser
+        nlp.select_pipes(enable=[])
+        nlp.add_pipe('sentencizer', name='wattle_sentencizer')
+    elif 'disable' in config and config['disable']:
+        nlp.select_pipes(disable=[name for name in config['disable'] if name in nlp.pipe_names])
+    return nlp
+
+WattleResources.register('spacy', _load_spacy)
+
+def _extract_pages(filename, pages):
+    # runs in a worker process, which opens the document on its own
+    import pdfplumber
+    texts = []
+    with pdfplumber.open(filename) as pdf:
+        for page_num in pages:
+            page = pdf.pages[page_num]
+            texts.append((page_num, page.extract_text()))
+            page.close()
+    return texts
+
 # PDF Paper Extractor
-class PDFPapers(WattleExtract):
+class PDFPapers(WattleFanOut, WattleExtract):
     """
       This class is a simple implementation of an concreate PDF Paper reader command.
       The class can use `page range` and `regex` to extract specific text from the file. 
-      The result is saved as a CSV file with following format:
+      The result is saved as a CSV (or `format`) file with following format:
           { 'text', 'pg', 'paragraph', 'wc', 'chars' }
 
       Constructor(params)
           path      - must have a path given
           pages     - user given page range.
+          model     - spaCy model name (default: en_core_web_sm).
+          batch_size  - pages segmented per `nlp.pipe` batch (default: 64).
+          n_process   - spaCy processes of `nlp.pipe` (default: 1).
+          disable     - spaCy components disabled for segmentation (default: ner, lemmatizer).
+          sentencizer - True|False use the rule-based sentencizer instead of the
+                        parser, much faster but boundaries can differ (default: False).
+          workers   - number of files processed in parallel, each worker process
+                      loads its own spaCy model (default: 1).
+          fanout    - process|thread|serial (default: process).
+          page_workers - processes extracting page ranges of a file in parallel, 1
+                      extracts pages in the file worker (default: available cores
+                      divided by the number of file workers).
+          pipeline  - dict(extract, segment, queue) run page extraction, sentence
+                      segmentation and CSV writing as overlapping stages with the given
+                      number of worker threads and queue size (default: sequential).
+          format    - output format csv|parquet|feather (default: csv).
       Methods:
           execute(self)       - evaluate given input params and extracts archive.
     """
+    # one spaCy model, the cores extract pages (`page_workers`)
+    fanout_workers = 1
+    # segment threads borrow the model on first use, a class lock isn't pickled
+    _nlp_lock = threading.Lock()
+
     def __init__(self, log, params):
         super().__init__(log, params)
         assert isinstance(params['path'], str)
@@ -73,76 +126,205 @@ class PDFPapers(WattleExtract):
         self._min_count = params['min_count'] if 'min_count' in params else EXTRACTOR_MIN_COUNT
         self._max_words = params['max_words'] if 'max_words' in params else EXTRACTOR_MAX_WORDS
         self._max_length = params['max_length'] if 'max_length' in params else EXTRACTOR_MAX_LENGTH
-        self._nlp = spacy.load("en_core_web_sm")
-        self._lines = deque()
+        self._model = params['model'] if 'model' in params else SPACY_MODEL
+        self._batch_size = int(params['batch_size']) if 'batch_size' in params else SEGMENT_BATCH
+        self._n_process = int(params['n_process']) if 'n_process' in params else 1
+        self._disable = params['disable'] if 'disable' in params else SEGMENT_DISABLE
+        self._sentencizer = params['sentencizer'] if 'sentencizer' in params else False
+        self._pipeline = params['pipeline'] if 'pipeline' in params else None
+        self._page_workers = int(params['page_workers']) if 'page_workers' in params else None
+        self._format = WattleFormat(params['format'] if 'format' in params else CSV)
+        if 'inputs' not in params:
+            self.inputs = [os.path.join(self._path, f"*{self._ext}")]
+        if 'outputs' not in params:
+            self.outputs = [os.path.join(self._path, f"*{self._format.suffix}")]
+        self._nlp = None
         self._progress = None
         self._filelist = deque() #         self._statlist = deque()
         self._paragraphs = deque()
         self._counter = 0
         self._text = ""
-        self.extract()
 
-    def _extract_paragraphs(self, text, pg):
-        self.log.debug("{}._make_senteces()".format(self.__class__.__name__))
-        self._counter += 1
-        self._lines.clear()
+    def _spacy_config(self):
+        return {'model': self._model, 'disable': self._disable, 'sentencizer': self._sentencizer}
+
+    def _spacy(self):
+        # borrowed on first use, so the command can be sent to worker processes
+        if self._nlp is None:
+            with self._nlp_lock:
+                if self._nlp is None:
+                    self._nlp = resources.borrow('spacy', self._spacy_config())
+        return self._nlp
+
+    def _release(self):
+        with self._nlp_lock:
+            if self._nlp is not None:
+                resources.release('spacy', self._spacy_config())
+                self._nlp = None
+
+    def _extract_paragraphs(self, pages):
+        self.log.debug("{}._extract_paragraphs()".format(self.__class__.__name__))
+        # pages below `min_count` words are numbered but not segmented
+        batch = []
+        for text, pg in pages:
+            self._counter += 1
+            text = self._clean(text)
+            if text is not None:
+                batch.append((text, pg, self._counter))
+
+        docs = self._spacy().pipe((text for text, _, _ in batch), batch_size=self._batch_size, n_process=self._n_process)
+        for (_, pg, paragraph), doc in zip(batch, docs):
+            self._paragraphs.extend(self._pack([f"{s}" for s in doc.sents], pg, paragraph))
+
+    def _clean(self, text):
         text = text.strip()
         text = re.sub(r'[^\x00-\x7F]+', '', text)
         text = re.sub(r'[\n]+', ' ', text)
         text = re.sub(r'[\s\s]+', ' ', text)
         wc = len(text.split())
-        
+
         if self._min_count > wc:
-            self.log.debug("{}._make_senteces(): {}".format(self.__class__.__name__, text))
-            return
+            self.log.debug("{}._clean(): {}".format(self.__class__.__name__, text))
+            return None
+        return text
+
+    def _page_paragraphs(self, text, pg, paragraph):
+        # no shared state, pages can be segmented in parallel
+        text = self._clean(text)
+        if text is None:
+            return []
+        return self._pack([f"{s}" for s in self._spacy()(text).sents], pg, paragraph)
 
+    def _pack(self, sentences, pg, paragraph):
+        # packs sentences into paragraphs of at most `max_words` and `max_length`
+        lines, paragraphs = [], []
         pg, words, length = inc(pg),0,0 #         self.stats.add(pg, text)
-        sentences = [ f"{s}" for s in self._nlp(text).sents ]
         for s in sentences:
             words += len(s.split())
             length += len(s)
             if words < self._max_words and length < self._max_length:
-                self._lines.append(s.strip())
+                lines.append(s.strip())
             else:
-                text = ' '.join(self._lines); self._lines.clear();
-                line = { 'text': text, 'pg': pg, 'paragraph': self._counter, 'wc': len(text.split()), 'chars': len(text) }
-                self._paragraphs.append(line)
-                self._lines.append(s)
+                text = ' '.join(lines); lines.clear();
+                line = { 'text': text, 'pg': pg, 'paragraph': paragraph, 'wc': len(text.split()), 'chars': len(text) }
+                paragraphs.append(line)
+                lines.append(s)
                 words += len(s.split())
                 length += len(s)
 
-        if len(self._lines) > 0:
-            text = ' '.join(self._lines)
-            line = { 'text': text, 'pg': pg, 'paragraph': self._counter, 'wc': len(text.split()), 'chars': len(text) }
-            self._paragraphs.append(line)
+        if len(lines) > 0:
+            text = ' '.join(lines)
+            line = { 'text': text, 'pg': pg, 'paragraph': paragraph, 'wc': len(text.split()), 'chars': len(text) }
+            paragraphs.append(line)
+        return paragraphs
+
+    def _process_pipelined(self, filename, page_range):
+        import pdfplumber
+        local, opened, lock = threading.local(), [], threading.Lock()
+        file_name = self._format.path(filename)
+        base = self._counter
+        rows = []
+
+        def extract(item):
+            # every extract worker opens its own copy of the document
+            if not hasattr(local, 'pdf'):
+                local.pdf = pdfplumber.open(filename)
+                with lock: opened.append(local.pdf)
+            n, page_num = item
+            return n, page_num, local.pdf.pages[page_num].extract_text()
 
-    def _process_file(self, filename):
-        self.log.debug("{}._process_file()".format(self.__class__.__name__))
+        def segment(item):
+            n, page_num, text = item
+            return self._page_paragraphs(text, page_num, base + n + 1)
+
+        # csv rows are written as they come, other formats are written at the end
+        with open(file_name, 'w', newline='', encoding='utf-8') if self._format.format == CSV else nullcontext() as f:
+            if f:
+                writer = csv.DictWriter(f, fieldnames=PARAGRAPH_FIELDS, lineterminator=os.linesep)
+                writer.writeheader()
+
+            def write(paragraphs):
+                if f: writer.writerows(paragraphs)
+                else: rows.extend(paragraphs)
+                self._progress.update(1)
+
+            queue = self._pipeline['queue'] if 'queue' in self._pipeline else 4
+            pipeline = WattlePipeline(self.log, [
+                WattleStage('extract', extract, self._pipeline['extract'] if 'extract' in self._pipeline else 1, queue),
+                WattleStage('segment', segment, self._pipeline['segment'] if 'segment' in self._pipeline else 1, queue),
+                WattleStage('write', write, queue=queue, ordered=True),
+            ])
+            try:
+                pipeline.execute(enumerate(page_range))
+            finally:
+                for pdf in opened: pdf.close()
+
+        if self._format.format != CSV:
+            self._format.write(pd.DataFrame(rows, columns=PARAGRAPH_FIELDS), file_name)
+
+        self._counter = base + len(page_range)
+        self.log.info("{}: bottleneck stage: {}".format(filename, pipeline.bottleneck()))
+        for stats in pipeline.stats():
+            self.report(**{f"{stats['stage']}_{key}": stats[key] for key in ('busy', 'stall_in', 'stall_out')})
+        return file_name
+
+    def _page_ranges(self, page_range, workers):
+        size = max(1, -(-len(page_range) // (workers * PAGE_RANGES)))
+        return [page_range[n:n + size] for n in range(0, len(page_range), size)]
+
+    def _page_texts(self, filename, pdf, page_range):
+        # yields (page_num, text) in page order
+        workers = min(self._page_workers if self._page_workers else 1, len(page_range))
+        if workers <= 1:
+            for page_num in page_range:
+                page = pdf.pages[page_num]
+                yield page_num, page.extract_text()
+                page.close()
+            return
+
+        self.log.debug("{}: {} pages, {} page workers".format(filename, len(page_range), workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for texts in executor.map(_extract_pages, repeat(filename), self._page_ranges(page_range, workers)):
+                yield from texts
+
+    def process_file(self, filename):
+        self.log.debug("{}.process_file()".format(self.__class__.__name__))
 
         if not filename.endswith('.pdf'):
             msg = "File [{}] is not a PDF document.".format(filename)
             self.log.warning(msg)
             raise ReadingPdfFileError(msg)
 
+        import pdfplumber
+        self._paragraphs.clear()
+        self._counter = 0
         try:
             with pdfplumber.open(filename) as pdf:
                 page_range = range(len(pdf.pages)) if not self._pages else self._pages
+                self.report(rows_in=len(page_range))
                 self._progress = tqdm(total=len(page_range), desc=f"Extracting: [{filename}]")
-                for page_num in page_range:
-                    page = pdf.pages[page_num]
-                    self._extract_paragraphs(page.extract_text(), page_num)
-                    time.sleep(0.1)
+                if self._pipeline:
+                    return self._process_pipelined(filename, page_range)
+                pages = []
+                for page_num, text in self._page_texts(filename, pdf, page_range):
+                    pages.append((text, page_num))
                     self._progress.update(1)
+                    if len(pages) == self._batch_size:
+                        self._extract_paragraphs(pages)
+                        pages = []
+                if pages:
+                    self._extract_paragraphs(pages)
 
             self.log.debug( f"Pages found: {len(pdf.pages)}")
             self.log.debug( f"Pages range: {page_range};" )
 
             df = pd.DataFrame(self._paragraphs)
-            file_name = filename.replace(".pdf", ".csv")
-            df.to_csv(file_name, index=False)
+            file_name = self._format.path(filename)
+            self._format.write(df, file_name)
             del df
+            return file_name
         except Exception as e:
-            msg = f"{self.__class__}._process_file: {e}\n"
+            msg = f"{self.__class__}.process_file: {e}\n"
             msg += traceback.format_exc()
             raise Exception(msg)
         finally:
@@ -155,17 +337,19 @@ class PDFPapers(WattleExtract):
             self.log.error(msg)
             raise FileNotFoundError(msg)
 
-        for name in os.listdir(self._path):
-            if name.endswith(self._ext):
-                filename = os.path.join(self._path, name)
-                self._filelist.append(filename)
-#                 self._stats = Stats(name)
-#                 self._statlist.append(self.stats)
-                self._process_file(filename)
-                self._counter += 1
-#                 self.log.info(self.stats)
+        self._filelist.extend(self.discover(self._path, self._ext))
 
         if zero(self._filelist):
             msg=f"WARNING: Files {self._ext} not found."
             self.log.warning(msg)
-            raise Exception(msg)
\ No newline at end of file
+            raise Exception(msg)
+
+        if self._page_workers is None:
+            # cores left over by the file workers extract pages of a file
+            _, workers = self._fanout_config(self._filelist)
+            self._page_workers = max(1, available_cores() // workers)
+
+        try:
+            return self.fan_out(self._filelist)
+        finally:
+            self._release()
\ No newline at end of file
@@ -2,7 +2,7 @@ import io
 import os
 import re
 import sys
-import pypdf
+import json
 import logging
 
 from etl.core.constants import (
@@ -15,11 +15,28 @@ from etl.core.constants import (
 )
 
 from etl.core.concrete import WattleExtract
-from etl.core.utils import WattleUtils
+from etl.utils.base import WattleUtils
+
+INDEX_SUFFIX = '.index.json'
 
 class ReadingPdfFileError(Exception):
     pass
 
+def read_page(file_path, page, index_path=None):
+    """
+      Returns the text of a page from a text file saved by PdfReader with `index`,
+      by seeking to its offset instead of parsing the PDF again.
+    """
+    index_path = index_path if index_path else f"{file_path}{INDEX_SUFFIX}"
+    with open(index_path, 'r', encoding='utf-8') as f:
+        pages = json.load(f)['pages']
+    for entry in pages:
+        if entry['page'] == page:
+            with open(file_path, 'rb') as f:
+                f.seek(entry['offset'])
+                return f.read(entry['length']).decode('utf-8')
+    raise KeyError("Page {} not found in {}".format(page, index_path))
+
 # PDF Reader
 class PdfReader(WattleExtract):
     """
@@ -27,15 +44,23 @@ class PdfReader(WattleExtract):
       The class can use `page range` and `regex` to extract specific text from the file. 
       The result is either file saved or text returned by `execute` method.
 
+      Pages are read lazily by `pages()`. A saved file is written page by page, so
+      the document text is never held in memory, and with `index` the byte offset
+      and length of every page are written to a JSON sidecar, so `read_page` can
+      fetch a page by seeking in the text file. Tokens are replaced page by page.
+
       Constructor(params)
           input     - must be a local file path.
           output    - local path (if not given, text file will be stored next to the input pdf).
           pages     - user given page range.
           tokens    - `regex` tokens (they must be fited for a JSON format).
-          method    - 
+          result    - text|save return the text or save it to the output (default: text).
+          index     - True|path write page offsets next to the output, to
+                      `{output}.index.json` if True (default: False).
 
       Methods:
           execute(self)       - evaluate given input params and extracts archive.
+          pages(self)         - yields (page number, text) of the page range.
     """
     def __init__(self, log, params):
         super().__init__(log, params)
@@ -50,36 +75,47 @@ class PdfReader(WattleExtract):
         self._pages  = params['pages']
         self._tokens = params['tokens']
         self._result = params['result'] if 'result' in params else 'text'
+        self._index  = params['index'] if 'index' in params else False
+        self._regex  = [re.compile(pattern) for pattern in self._tokens]
         self._text   = ""
+        if self._result == 'save' and 'outputs' not in params:
+            self.outputs = [self._output] + ([self._index_path()] if self._index else [])
 
-    def _read_text(self):
-        self.log.debug("{}._read_text()".format(self.__class__.__name__))
+    def pages(self):
+        self.log.debug("{}.pages()".format(self.__class__.__name__))
 
+        import pypdf
         try:
             with open(self._input, 'rb') as f:
                 reader = pypdf.PdfReader(f)
                 page_range = range(len(reader.pages)) if len(self._pages) == 0 else self._pages
+                self.log.info( f"Pages found: {len(reader.pages)}")
+                self.log.info( f"Page range: {page_range};" )
 
                 for page_number in page_range:
-                    page = reader.pages[page_number]
-                    self._text += page.extract_text()
-            
-            self.log.info( f"Pages found: {len(reader.pages)}")
-            self.log.info( f"Page range: {page_range};" )
-            self.log.info( f"Text lenght: {len(self._text)}" )
-
+                    text = reader.pages[page_number].extract_text()
+                    self.report(rows_in=1)
+                    yield page_number, text
         except Exception as e:
           msg = "Error reading pdf file: {}".format(self._input)
           self.log.error(msg)
           self.log.error(e)
           raise ReadingPdfFileError(msg)
 
-    def _replace_tokens(self):
-        self.log.debug("{}._replace_tokens()".format(self.__class__.__name__))
-        if not len(self._tokens) > 0 : return 0
-        for pattern in self._tokens:
-            regex = re.compile(pattern)
-            self._text = regex.sub(pattern, '', self._text)
+    def _replace_tokens(self, text):
+        for regex in self._regex:
+            text = regex.sub('', text)
+        return text
+
+    def _read_text(self):
+        self.log.debug("{}._read_text()".format(self.__class__.__name__))
+        # joined once, appending to a str copies the text read so far on every page
+        self._text = ''.join(self._replace_tokens(text) for _, text in self.pages())
+        self.log.info( f"Text lenght: {len(self._text)}" )
+
+    def _index_path(self):
+        if not self._index: return None
+        return self._index if isinstance(self._index, str) else f"{self._output}{INDEX_SUFFIX}"
 
     def _save_text(self):
         self.log.debug("{}._save_text()".format(self.__class__.__name__))
@@ -87,11 +123,22 @@ class PdfReader(WattleExtract):
             self.log.info(MSG_NOT_FOUND.format("Output file", self._output))
             return
 
-        with open(self._output, "w+", encoding='utf-8') as f:
-            f.write(self._text)
-
+        offset, index = 0, []
+        with open(self._output, "wb") as f:
+            for page_number, text in self.pages():
+                data = self._replace_tokens(text).encode('utf-8')
+                f.write(data)
+                index.append({'page': page_number, 'offset': offset, 'length': len(data)})
+                offset += len(data)
+        self.log.info( f"Text lenght: {offset} bytes" )
         self.log.info(MSG_FILE_SAVED.format(self._output))
 
+        index_path = self._index_path()
+        if index_path:
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump({'file': self._output, 'encoding': 'utf-8', 'pages': index}, f)
+            self.log.info(MSG_FILE_SAVED.format(index_path))
+
     def extract(self):
         super().extract()
 
@@ -100,12 +147,10 @@ class PdfReader(WattleExtract):
             self.log.error( msg )
             raise FileNotFoundError( msg )
 
-        self._read_text()
-        self._replace_tokens()
-    
         if self._result == "save":
             self._save_text()
         elif self._result == "text":
+            self._read_text()
             return self._text
         else:
             raise TypeError("Unknown method!")
@@ -1,5 +1,9 @@
+import os
+import time
 import sqlite3
 import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
 from pandas.errors import IntCastingNaNError
 
 from etl.core.constants import (
@@ -11,7 +15,9 @@ from etl.core.constants import (
 
 
 from etl.core.concrete import WattleExtract
-from etl.core.utils import WattleUtils
+from etl.utils.base import WattleUtils
+from etl.utils.formats import WattleFormat
+from etl.utils.sqlite import WattleSQLite, SQLITE_CHUNKSIZE, SQLITE_FETCHSIZE
 
 class SQLiteReadError(Exception):
     pass
@@ -27,6 +33,18 @@ class SQLiteReadWrite(WattleExtract):
       demonstrate opearation with database in support of writing a code for 
       enterprise relationioanl databases.
 
+      With `bulk` the input files are streamed in chunks into SQLite with
+      `executemany`, each table in a single transaction on a connection tuned for
+      bulk loads (WAL, synchronous NORMAL, large cache, in-memory temp store), and
+      table `indexes` are created after the rows are loaded. Tables with their own
+      `connection` (database file) are loaded in parallel, tables of the same file
+      one after the other, as SQLite allows a single writer per file.
+
+      With `stream` tables are exported by iterating the cursor with `fetchmany`
+      and appending every batch to the output (CSV, Parquet row groups or Feather
+      record batches), so memory doesn't depend on the table size. Tables of a
+      database file are exported in parallel on read-only connections.
+
       Constructor(params)
           input     - must be a local file path.
           output    - local path (if not given, text file will be stored next to 
@@ -36,6 +54,18 @@ class SQLiteReadWrite(WattleExtract):
           unique    - produce unique values for a given columns (list).
           min-maxm  - create log entries for min/max values of a given columns (list).
           overwrite - True|False.
+          format    - output format csv|parquet|feather (default: by output extension),
+                      inputs are read in the format of their extension.
+          bulk      - True|False stream inputs with the bulk loader (default: False).
+          chunksize - rows per chunk in bulk mode (default: 100000).
+          pragmas   - dict of PRAGMAs used in bulk mode (default: WAL, synchronous
+                      NORMAL, cache_size 256 MiB, temp_store MEMORY).
+          workers   - database files loaded, or tables exported, in parallel (default: 4).
+          stream    - True|False export tables batch by batch (default: False).
+          fetchsize - rows fetched per batch when streaming (default: 50000).
+          tables    - {name: {input, output, columns, dropna, indexes, connection}},
+                      `indexes` is a list of column lists, `connection` a database
+                      file of the table (default: `connection`).
 
       Methods:
           execute(self) - evaluate given input params and extracts archive.
@@ -48,12 +78,31 @@ class SQLiteReadWrite(WattleExtract):
 
         self._params = params
         self._connection = params['connection']
+        self._format = WattleFormat(params['format'] if 'format' in params else None)
+        self._bulk = params['bulk'] if 'bulk' in params else False
+        self._chunksize = int(params['chunksize']) if 'chunksize' in params else SQLITE_CHUNKSIZE
+        self._pragmas = params['pragmas'] if 'pragmas' in params else None
+        self._workers = int(params['workers']) if 'workers' in params else 4
+        self._stream = params['stream'] if 'stream' in params else False
+        self._fetchsize = int(params['fetchsize']) if 'fetchsize' in params else SQLITE_FETCHSIZE
         self._input = []
         self._output = []
+        if 'inputs' not in params:
+            self.inputs = self._table_files('input')
+            # without loads the database is the input of the exports
+            if not self.inputs and self._connection != ':memory:':
+                self.inputs = [self._connection]
+        if 'outputs' not in params:
+            self.outputs = [self._format.path(f) for f in self._table_files('output')]
+
+    def _table_files(self, key):
+        tables = self._params['tables'] if 'tables' in self._params else {}
+        return [t[key] for t in tables.values() if key in t and isinstance(t[key], str)]
 
     def _connect(self):
         self.log.debug("{}._connect()".format(self.__class__.__name__))
-        self.conn = sqlite3.connect(self._connection)
+        # bulk loads of the command database run in a worker thread
+        self.conn = sqlite3.connect(self._connection, check_same_thread=False)
 
     def _convert_fields(self, df, columns):
         self.log.debug("{}._convert_fields()".format(self.__class__.__name__))
@@ -83,11 +132,11 @@ class SQLiteReadWrite(WattleExtract):
                 if not file_path is None:
                     if not columns is None:
                         self.log.info("columns: {}".format(list(columns)))
-                        df = pd.read_csv(file_path, usecols=list(columns))
+                        df = self._format.read(file_path, columns)
                         if dropna: df.dropna(subset=dropna, inplace=True)
                         df = self._convert_fields(df, columns)
                     else:
-                        df = pd.read_csv(file_path)
+                        df = self._format.read(file_path)
                     
                     df.to_sql(name, self.conn, if_exists='replace', index=False)
                     self.log.info("sqlite: stored: {}".format(name))
@@ -97,6 +146,57 @@ class SQLiteReadWrite(WattleExtract):
             self.log.error(e)
             raise SQLiteReadError(msg)
 
+    def _chunks(self, file_path, columns, dropna):
+        for df in self._format.chunks(file_path, self._chunksize, list(columns) if columns else None):
+            if dropna: df = df.dropna(subset=dropna)
+            if columns: df = self._convert_fields(df, columns)
+            yield df
+
+    def _bulk_tables(self, database, tables):
+        # a database shared with the command connection (e.g. :memory:) is loaded on it
+        db = WattleSQLite(self.conn if database == self._connection else database, self._pragmas, logger=self.log)
+        rows = 0
+        try:
+            for name, table in tables:
+                file_path = table['input']
+                columns = table['columns'] if 'columns' in table else None
+                dropna  = table['dropna'] if 'dropna' in table else None
+                indexes = table['indexes'] if 'indexes' in table else None
+                self.log.info("table name: {}".format(name))
+                self.log.info("file path: {}".format(file_path))
+                try:
+                    rows += db.load(name, self._chunks(file_path, columns, dropna), indexes=indexes)
+                except Exception as e:
+                    msg = MSG_CSV_FILE_ERROR.format(file_path)
+                    self.log.error(msg)
+                    self.log.error(e)
+                    raise SQLiteReadError(msg)
+        finally:
+            db.close()
+        return rows
+
+    def _bulk_load(self):
+        self.log.debug("{}._bulk_load()".format(self.__class__.__name__))
+
+        databases = {}
+        for name, table in self._params['tables'].items():
+            if 'input' not in table or table['input'] is None: continue
+            database = table['connection'] if 'connection' in table else self._connection
+            databases.setdefault(database, []).append((name, table))
+        if not databases: return 0
+
+        size = sum(os.path.getsize(t['input']) for tables in databases.values()
+            for _, t in tables if os.path.isfile(t['input']))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(self._workers, len(databases)))) as executor:
+            rows = sum(executor.map(lambda item: self._bulk_tables(*item), databases.items()))
+        seconds = time.perf_counter() - started
+
+        self.report(rows_in=rows)
+        self.log.info("sqlite: bulk load: {} rows, {:.1f} MB in {:.3f} s ({:.0f} rows/s, {:.1f} MB/s)".format(
+            rows, size / 1e6, seconds, rows / seconds if seconds else 0, size / 1e6 / seconds if seconds else 0))
+        return rows
+
     def _write_to_csv(self):
         self.log.debug("{}._write_to_csv()".format(self.__class__.__name__))
         try:
@@ -109,14 +209,18 @@ class SQLiteReadWrite(WattleExtract):
                 self.log.info("file path: {}".format(file_path))
 
                 if not file_path is None:
+                    file_path = self._format.path(file_path)
+                    database = table['connection'] if 'connection' in table else self._connection
+                    conn = self.conn if database == self._connection else sqlite3.connect(database)
                     if not columns is None:
                         self.log.info("columns: {}".format(list(columns)))
-                        df = pd.read_sql_query("SELECT {} FROM {}".format(",".join(columns), name), self.conn)
+                        df = pd.read_sql_query("SELECT {} FROM {}".format(",".join(columns), name), conn)
                         df = self._convert_fields(df, columns)
-                        df.to_csv(file_path, header=True, index=False)
+                        self._format.write(df, file_path)
                     else:
-                        df = pd.read_sql_query("SELECT * FROM {}".format(name), self.conn)
-                        df.to_csv(file_path, header=True, index=False)  
+                        df = pd.read_sql_query("SELECT * FROM {}".format(name), conn)
+                        self._format.write(df, file_path)
+                    if conn is not self.conn: conn.close()
 
                     self.log.info("sqlite: saved to file: {}: {}".format(name, file_path))
         except Exception as e:
@@ -125,10 +229,65 @@ class SQLiteReadWrite(WattleExtract):
             self.log.error(e)
             raise SQLiteReadError(msg) 
 
+    def _export_table(self, name, table, database):
+        file_path = self._format.path(table['output'])
+        columns = table['columns'] if 'columns' in table else None
+        fields = ",".join(columns) if columns else "*"
+        convert = (lambda df: self._convert_fields(df, columns)) if columns else None
+
+        self.log.info("table name: {}".format(name))
+        self.log.info("file path: {}".format(file_path))
+        try:
+            # the command connection is used as it is, only files get own connections
+            if database is None:
+                db = WattleSQLite(self.conn, {}, logger=self.log)
+            else:
+                db = WattleSQLite(database, logger=self.log, readonly=True)
+            try:
+                # batches get the declared types, a NULL-only batch can't be inferred
+                dtypes = db.table_dtypes(name, list(columns) if columns else None)
+                with self._format.writer(file_path) as writer:
+                    rows = db.export("SELECT {} FROM {}".format(fields, name), writer, self._fetchsize, convert, dtypes)
+            finally:
+                db.close()
+        except Exception as e:
+            msg = MSG_CSV_FILE_ERROR.format(file_path)
+            self.log.error(msg)
+            self.log.error(e)
+            raise SQLiteReadError(msg)
+
+        self.log.info("sqlite: saved to file: {}: {}".format(name, file_path))
+        return rows
+
+    def _stream_to_files(self):
+        self.log.debug("{}._stream_to_files()".format(self.__class__.__name__))
+
+        serial, parallel = [], []
+        for name, table in self._params['tables'].items():
+            if 'output' not in table or table['output'] is None: continue
+            database = table['connection'] if 'connection' in table else self._connection
+            if database in (':memory:', ''):
+                serial.append((name, table, None))
+            else:
+                parallel.append((name, table, database))
+
+        rows = sum(self._export_table(*item) for item in serial)
+        if parallel:
+            self.conn.commit()
+            with ThreadPoolExecutor(max_workers=max(1, min(self._workers, len(parallel)))) as executor:
+                rows += sum(executor.map(lambda item: self._export_table(*item), parallel))
+        return rows
+
     def extract(self):
         super().extract()
 
         self._connect()
-        self._read_from_csv()
-        self._write_to_csv()
+        if self._bulk:
+            self._bulk_load()
+        else:
+            self._read_from_csv()
+        if self._stream:
+            self._stream_to_files()
+        else:
+            self._write_to_csv()
         return self.conn
@@ -4,13 +4,16 @@ import pandas as pd
 
 from etl.core.constants import (
     METHOD_EXEC,
+    MSG_NOT_FOUND,
+    MSG_FILE_EXIST,
     MSG_FILE_SAVED,
     MSG_TXT_LENGTH,
     MSG_REC_COUNT
 )
 
 from etl.core.concrete import WattleExtract
-from etl.core.utils import WattleUtils
+from etl.utils.base import WattleUtils
+from etl.utils.formats import WattleFormat
 
 class ReadingTxtfFileError(Exception):
     pass
@@ -28,6 +31,7 @@ class TextReader(WattleExtract):
           pages    - user given page range.
           patterns - `regex` tokens (they must be fited for a JSON format).
           index    - is given index to sort out result.
+          format   - output format csv|parquet|feather (default: by output extension).
 
       Methods:
           execute(self)  - evaluate given input params and extracts archive.
@@ -57,6 +61,9 @@ class TextReader(WattleExtract):
         self._columns   = params['columns']  if 'columns'    in params else None
         self._keys      = params['keys']     if 'keys'       in params else None
         self._tokens    = params['patterns'] if 'patterns'   in params else None
+        self._format    = WattleFormat(params['format'] if 'format' in params else None)
+        self._output    = self._format.path(self._output)
+        self.outputs    = [self._output]
         self._df        = None
 
     def _read(self):
@@ -122,12 +129,12 @@ class TextReader(WattleExtract):
 
         if WattleUtils.file_exists(self._output):
             if self._overwrite:
-                self._df.to_csv(self._output, index=False)
+                self._format.write(self._df, self._output)
                 self.log.info("File overwriten: {}".format(self._output)) 
             else:
                 self.log.info(MSG_FILE_EXIST.format(self._output))
         else:
-            self._df.to_csv(self._output, index=False)
+            self._format.write(self._df, self._output)
             self.log.info(MSG_FILE_SAVED.format(self._output))       
 
     def extract(self):
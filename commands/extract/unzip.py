@@ -1,8 +1,6 @@
 import io
 import os
-import requests
 import zipfile
-import pandas as pd
 
 from etl.core.constants import (
     METHOD_EXEC,
@@ -12,7 +10,7 @@ from etl.core.constants import (
 )
 
 from etl.core.concrete import WattleExtract
-from etl.core.utils import WattleUtils
+from etl.utils.base import WattleUtils
 
 class Unzip(WattleExtract):
     """
@@ -0,0 +1,216 @@
+import os
+import time
+import uuid
+import shutil
+import itertools
+import pandas as pd
+
+from etl.core.constants import MSG_NOT_FOUND
+from etl.core.concrete import WattleLoad
+from etl.utils.base import WattleUtils
+from etl.utils.formats import WattleFormat, promote_schema, conform, rewrite
+
+PARQUET_ROW_GROUP   = 128 * 1024
+PARQUET_COMPRESSION = 'zstd'
+PARQUET_CHUNKSIZE   = 100000
+PARQUET_MAX_OPEN    = 512
+PARQUET_MODES       = ('append', 'replace', 'overwrite')
+
+class ParquetLoaderError(Exception):
+    pass
+
+class ParquetLoader(WattleLoad):
+    """
+      This class writes data as a hive-partitioned Parquet dataset, e.g.
+      `output/day=2024-01-31/part-<run>-0.parquet`. Readers (pandas, pyarrow, DuckDB,
+      Spark) read only the columns they need and skip the partitions a filter on
+      `partition_by` excludes, so reprocessing a single day touches a single directory.
+
+      Input is streamed in chunks into `pyarrow.dataset.write_dataset`, which writes
+      the files of all open partitions concurrently and buffers rows until a row
+      group is full. Every run writes files with its own name prefix, so:
+          append    - adds files next to the existing ones, nothing is rewritten.
+          replace   - partitions receiving data are cleared, the others are kept.
+          overwrite - the whole dataset is removed first.
+
+      Chunks are inferred on their own, so a later chunk can need a wider type than
+      the first one (e.g. a column empty in the first chunk). The schema is then
+      promoted (see `promote_schema`), the files written so far by the run are
+      rewritten with it and the run continues with new files.
+
+      Constructor(params)
+          output         - dataset directory.
+          input          - file path or list of file paths (csv|parquet|feather).
+          df             - DataFrame to write (instead of input).
+          partition_by   - partition column list (optional).
+          columns        - columns to write (default: all).
+          mode           - append|replace|overwrite (default: append).
+          row_group_size - rows per row group (default: 131072).
+          compression    - snappy|gzip|brotli|lz4|zstd|none (default: zstd).
+          dictionary     - True|False or list of dictionary encoded columns (default: True).
+          workers        - parallel file writers, 1 writes serially (default: pyarrow threads).
+          max_open_files - max partition files open at once (default: 512).
+          chunksize      - rows per chunk read from an input file (default: 100000).
+
+      Methods:
+          execute(self)          - write the input, returns the number of rows.
+          load_batches(batches)  - streaming mode, writes upstream DataFrames.
+    """
+    def __init__(self, log, params):
+        super().__init__(log, params)
+        assert isinstance(params['output'], str)
+
+        self._output         = params['output']
+        self._input          = params['input'] if 'input' in params else None
+        self._df             = params['df'] if 'df' in params else None
+        self._partition_by   = params['partition_by'] if 'partition_by' in params else []
+        self._columns        = params['columns'] if 'columns' in params else None
+        self._mode           = params['mode'] if 'mode' in params else 'append'
+        self._row_group_size = int(params['row_group_size']) if 'row_group_size' in params else PARQUET_ROW_GROUP
+        self._compression    = params['compression'] if 'compression' in params else PARQUET_COMPRESSION
+        self._dictionary     = params['dictionary'] if 'dictionary' in params else True
+        self._workers        = int(params['workers']) if 'workers' in params else None
+        self._max_open_files = int(params['max_open_files']) if 'max_open_files' in params else PARQUET_MAX_OPEN
+        self._chunksize      = int(params['chunksize']) if 'chunksize' in params else PARQUET_CHUNKSIZE
+        self._format         = WattleFormat()
+        self.files           = []
+
+        if isinstance(self._input, str):
+            self._input = [self._input]
+        if isinstance(self._partition_by, str):
+            self._partition_by = [self._partition_by]
+        if self._input and 'inputs' not in params:
+            self.inputs = list(self._input)
+        if self._mode not in PARQUET_MODES:
+            raise ParquetLoaderError("Unknown mode: {} (expected one of {}).".format(self._mode, ', '.join(PARQUET_MODES)))
+        if self._columns and any(c not in self._columns for c in self._partition_by):
+            raise ParquetLoaderError("Partition columns must be in `columns`.")
+
+    def _writer_options(self):
+        compression = None if self._compression in (None, 'none') else self._compression
+        return {'compression': compression, 'use_dictionary': self._dictionary}
+
+    def _file_options(self, ds):
+        return ds.ParquetFileFormat().make_write_options(**self._writer_options())
+
+    def _clear(self, run):
+        # files of earlier runs in the partitions this run wrote to; removed after the
+        # run, since promoted segments write to the same partitions again
+        prefix = f"part-{run}-"
+        for directory in sorted({os.path.dirname(f) for f in self.files}):
+            for name in os.listdir(directory):
+                if name.endswith('.parquet') and not name.startswith(prefix):
+                    os.remove(os.path.join(directory, name))
+
+    def _tables(self, frames):
+        import pyarrow as pa
+        for df in frames:
+            if self._columns: df = df[self._columns]
+            yield pa.Table.from_pandas(df, preserve_index=False)
+
+    def _batches(self, tables, schema, promoted):
+        # batches are cast to the schema, so the files of a run match; a table needing
+        # a wider schema ends the batches and is kept in `promoted`
+        for table in tables:
+            wider = promote_schema(schema, table.schema)
+            if wider is not schema:
+                promoted.append((wider, table))
+                return
+            yield from conform(table, schema).to_batches()
+
+    def _visit(self, written):
+        self.files.append(written.path)
+
+    def _write(self, frames):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        tables = self._tables(frames)
+        first = next(tables, None)
+        if first is None:
+            self.log.info("{}: nothing to write.".format(self._output))
+            return 0
+        missing = [c for c in self._partition_by if c not in first.schema.names]
+        if missing:
+            raise ParquetLoaderError("Partition columns not found: {}".format(', '.join(missing)))
+
+        if self._mode == 'overwrite' and os.path.isdir(self._output):
+            shutil.rmtree(self._output)
+        os.makedirs(self._output, exist_ok=True)
+
+        rows = 0
+        def counted(batches):
+            nonlocal rows
+            for batch in batches:
+                rows += batch.num_rows
+                yield batch
+
+        self.files = []
+        run = uuid.uuid4().hex[:12]
+        promoted = [(first.schema, first)]
+        started = time.perf_counter()
+        for segment in itertools.count():
+            if not promoted: break
+            schema, table = promoted.pop()
+            if segment:
+                self.log.info("{}: schema promoted, rewriting {} files.".format(self._output, len(self.files)))
+                for file_path in self.files:
+                    rewrite(file_path, schema, **self._writer_options())
+            partitioning = None
+            if self._partition_by:
+                partitioning = ds.partitioning(pa.schema([schema.field(c) for c in self._partition_by]), flavor='hive')
+            ds.write_dataset(
+                counted(self._batches(itertools.chain([table], tables), schema, promoted)),
+                self._output,
+                schema=schema,
+                format='parquet',
+                file_options=self._file_options(ds),
+                partitioning=partitioning,
+                basename_template=f"part-{run}-{segment}-{{i}}.parquet",
+                existing_data_behavior='overwrite_or_ignore',
+                min_rows_per_group=self._row_group_size,
+                max_rows_per_group=self._row_group_size,
+                max_open_files=self._max_open_files,
+                use_threads=self._workers != 1,
+                file_visitor=self._visit,
+            )
+        if self._mode == 'replace':
+            self._clear(run)
+        seconds = time.perf_counter() - started
+
+        self.report(rows_in=rows)
+        self.log.info("{}: {} rows, {} files in {:.3f} s ({:.0f} rows/s)".format(
+            self._output, rows, len(self.files), seconds, rows / seconds if seconds else 0))
+        return rows
+
+    def _threads(self):
+        import pyarrow as pa
+        # files are written on the pyarrow IO thread pool
+        if self._workers and self._workers > 1:
+            pa.set_io_thread_count(self._workers)
+
+    def _file_frames(self):
+        for file_path in self._input:
+            if not WattleUtils.file_exists(file_path):
+                msg = MSG_NOT_FOUND.format("File", file_path)
+                self.log.error(msg)
+                raise FileNotFoundError(msg)
+            yield from self._format.chunks(file_path, self._chunksize, self._columns)
+
+    def _frame_chunks(self, df):
+        for offset in range(0, len(df), self._chunksize):
+            yield df.iloc[offset:offset + self._chunksize]
+
+    def load_batches(self, batches):
+        self.log.debug("{}.load_batches()".format(self.__class__.__name__))
+        self._threads()
+        return self._write(batches)
+
+    def load(self):
+        super().load()
+        self._threads()
+        if isinstance(self._df, pd.DataFrame):
+            return self._write(self._frame_chunks(self._df))
+        if self._input:
+            return self._write(self._file_frames())
+        raise ParquetLoaderError("Nothing to load, `input` or `df` must be given.")
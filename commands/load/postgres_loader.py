@@ -0,0 +1,388 @@
+import io
+import csv
+import time
+import itertools
+import threading
+import numpy as np
+import pandas as pd
+
+from psycopg2 import sql
+from concurrent.futures import ThreadPoolExecutor
+
+from etl.core.constants import MSG_NOT_FOUND
+from etl.core.concrete import WattleLoad
+from etl.utils.base import WattleUtils
+from etl.utils.formats import WattleFormat, PARQUET, FEATHER
+from etl.utils.postgres import WattlePostgres, COPY_BUFFER
+
+LOADER_WORKERS   = 4
+LOADER_CHUNKSIZE = 100000
+LOADER_CSV_RANGE = 64 << 20
+
+CSV_BOM = b'\xef\xbb\xbf'
+
+class PostgresLoaderError(Exception):
+    pass
+
+def csv_ranges(file_path, size=LOADER_CSV_RANGE):
+    """
+      Header and (start, end) byte ranges of about `size` bytes of a CSV file, split
+      at record boundaries: newlines after an even number of quotes, so quoted fields
+      with newlines are kept whole (escaped quotes "" count twice).
+    """
+    bounds, parity, pos = [], 0, 0
+    with open(file_path, 'rb') as f:
+        start = len(CSV_BOM) if f.read(len(CSV_BOM)) == CSV_BOM else 0
+        f.seek(start)
+        pos = want = start
+        while True:
+            block = f.read(COPY_BUFFER)
+            if not block: break
+            while want < pos + len(block):
+                i = want - pos
+                quoted = (parity + block.count(b'"', 0, i)) & 1
+                j = block.find(b'\n', i)
+                while j != -1 and (quoted + block.count(b'"', i, j)) & 1:
+                    quoted = (quoted + block.count(b'"', i, j)) & 1
+                    i, j = j + 1, block.find(b'\n', j + 1)
+                if j == -1:
+                    want = pos + len(block)
+                    break
+                bounds.append(pos + j + 1)
+                want = pos + j + 1 + size
+            parity = (parity + block.count(b'"')) & 1
+            pos += len(block)
+        if not bounds: bounds.append(pos)
+        f.seek(start)
+        header = f.read(bounds[0] - start).decode('utf-8')
+    edges = bounds + ([pos] if pos > bounds[-1] else [])
+    return header, list(zip(edges[:-1], edges[1:]))
+
+def _read_range(file_path, start, end):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            data = f.read(min(COPY_BUFFER, left))
+            if not data: break
+            left -= len(data)
+            yield data
+
+class PostgresLoader(WattleLoad):
+    """
+      This class loads data into a PostgreSQL table with parallel `COPY ... FROM STDIN`.
+      The data is split into partitions (one per input file, chunk of a file, slice
+      of a DataFrame or upstream batch), and the partitions are copied concurrently
+      over a pool of `workers` connections. Rows, time and throughput are logged and
+      returned per partition.
+
+      CSV files are copied as they are, in byte ranges of about 64 MiB split at record
+      boundaries, with the columns of the header, so values reach COPY without being
+      parsed (leading zeros, integers). With `columns` other than the header the
+      file is read as text by pandas. Parquet and Feather files are read in chunks.
+
+      Without `staging` every partition is committed on its own, so a failed load
+      leaves the partitions already loaded in the table. With `staging` partitions are
+      loaded into an UNLOGGED copy of the table, and the target is changed only after
+      all partitions are loaded: `swap` replaces the table, `merge` upserts into it
+      on `keys`. A table other objects depend on (views, foreign keys) or with
+      triggers, row level security, identity columns or column privileges can't be
+      swapped, since they would be lost with it, and is refused before loading.
+      Privileges, comments and index names of a swapped table are kept.
+
+      Constructor(params)
+          connection - dict(user, pswd, host, port, dbname).
+          table      - target table, optionally schema qualified (schema.table).
+          input      - file path or list of file paths (csv|parquet|feather).
+          df         - DataFrame to load (instead of input).
+          columns    - columns to load (default: all columns of the data).
+          workers    - parallel connections (default: 4).
+          partitions - number of slices a DataFrame is split into (default: workers).
+          chunksize  - rows per partition read from a Parquet/Feather file (default: 100000).
+          truncate   - True|False truncate the table first (default: False).
+          staging    - swap|merge load through an UNLOGGED staging table (optional).
+          keys       - conflict key columns for `merge`.
+
+      Methods:
+          execute(self)          - load the input, returns the number of rows.
+          load_batches(batches)  - streaming mode, every batch is a partition.
+    """
+    def __init__(self, log, params):
+        super().__init__(log, params)
+        assert isinstance(params['connection'], dict)
+        assert isinstance(params['table'], str)
+
+        self._connection = params['connection']
+        self._table      = params['table']
+        self._input      = params['input'] if 'input' in params else None
+        self._df         = params['df'] if 'df' in params else None
+        self._columns    = params['columns'] if 'columns' in params else None
+        self._workers    = int(params['workers']) if 'workers' in params else LOADER_WORKERS
+        self._partitions = int(params['partitions']) if 'partitions' in params else self._workers
+        self._chunksize  = int(params['chunksize']) if 'chunksize' in params else LOADER_CHUNKSIZE
+        self._truncate   = params['truncate'] if 'truncate' in params else False
+        self._staging    = params['staging'] if 'staging' in params else None
+        self._keys       = params['keys'] if 'keys' in params else None
+        self._format     = WattleFormat()
+        self.partitions  = []
+
+        if isinstance(self._input, str):
+            self._input = [self._input]
+        if self._input and 'inputs' not in params:
+            self.inputs = list(self._input)
+        if self._staging not in (None, False, 'swap', 'merge'):
+            raise PostgresLoaderError("Unknown staging mode: {}".format(self._staging))
+        if self._staging == 'merge' and not self._keys:
+            raise PostgresLoaderError("Staging merge needs `keys`.")
+
+    def _connect(self):
+        # one more connection than workers, for the statements run around the copies
+        return WattlePostgres(logger=self.log, pool=self._workers + 1, **self._connection)
+
+    def _names(self):
+        # schema (or None) and bare table name
+        schema, _, name = self._table.rpartition('.')
+        return (schema.strip('"') if schema else None), name.strip('"')
+
+    def _identifier(self, *names):
+        # a relation (or column) in the schema of the table
+        schema, _ = self._names()
+        return sql.Identifier(schema, *names) if schema else sql.Identifier(*names)
+
+    def _staging_name(self):
+        return "{}_wattle_staging".format(self._names()[1])
+
+    def _target(self):
+        return self._identifier(self._staging_name()) if self._staging else self._identifier(self._names()[1])
+
+    def _swap_conflicts(self, db):
+        # objects depending on the table (view rules, foreign keys of other tables;
+        # its own constraints and indexes are also 'a'uto dependencies) and what a
+        # table created with LIKE doesn't get: triggers, row level security, the
+        # state of identity sequences and column privileges
+        db.cursor.execute("""
+            SELECT DISTINCT pg_describe_object(d.classid, d.objid, d.objsubid) FROM pg_depend d
+             WHERE d.refclassid = 'pg_class'::regclass AND d.refobjid = %(table)s::regclass AND d.deptype = 'n'
+               AND NOT EXISTS (SELECT 1 FROM pg_depend o WHERE o.classid = d.classid AND o.objid = d.objid
+                                  AND o.refobjid = d.refobjid AND o.deptype IN ('a', 'i'))
+            UNION ALL SELECT 'trigger ' || tgname FROM pg_trigger WHERE tgrelid = %(table)s::regclass AND NOT tgisinternal
+            UNION ALL SELECT 'policy ' || polname FROM pg_policy WHERE polrelid = %(table)s::regclass
+            UNION ALL SELECT 'row level security' FROM pg_class
+                       WHERE oid = %(table)s::regclass AND (relrowsecurity OR relforcerowsecurity)
+            UNION ALL SELECT 'identity column ' || attname FROM pg_attribute
+                       WHERE attrelid = %(table)s::regclass AND attidentity <> '' AND NOT attisdropped
+            UNION ALL SELECT 'privileges on column ' || attname FROM pg_attribute
+                       WHERE attrelid = %(table)s::regclass AND attacl IS NOT NULL AND NOT attisdropped
+        """, {'table': self._identifier(self._names()[1]).as_string(db.conn)})
+        return [row[0] for row in db.cursor.fetchall()]
+
+    def _prepare(self, db):
+        table = self._identifier(self._names()[1])
+        if self._staging == 'swap':
+            conflicts = self._swap_conflicts(db)
+            if conflicts:
+                raise PostgresLoaderError("{} can't be swapped, it has {}; use staging: merge.".format(
+                    self._table, ', '.join(conflicts)))
+        if self._staging:
+            staging = self._target()
+            db.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(staging))
+            # a swapped table replaces the target, so it needs its indexes and constraints
+            including = sql.SQL('ALL' if self._staging == 'swap' else 'DEFAULTS')
+            db.execute(sql.SQL("CREATE UNLOGGED TABLE {} (LIKE {} INCLUDING {})").format(staging, table, including))
+        elif self._truncate:
+            db.execute(sql.SQL("TRUNCATE {}").format(table))
+        db.commit()
+
+    def _indexes(self, db, table):
+        # index names by definition (columns, method, opclasses, predicate), which
+        # doesn't depend on the index and table names
+        db.cursor.execute("""
+            SELECT c.relname, i.indisunique, i.indisprimary, pg_get_indexdef(i.indexrelid)
+              FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+             WHERE i.indrelid = %s::regclass ORDER BY i.indexrelid
+        """, (table.as_string(db.conn),))
+        return [((unique, primary, definition[definition.index(' USING '):]), name)
+            for name, unique, primary, definition in db.cursor.fetchall()]
+
+    def _grant(self, db, table, staging):
+        # LIKE copies neither the privileges nor the comment of the table
+        db.cursor.execute("""
+            SELECT a.privilege_type, CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(r.rolname) END, a.is_grantable
+              FROM pg_class c CROSS JOIN aclexplode(c.relacl) a LEFT JOIN pg_roles r ON r.oid = a.grantee
+             WHERE c.oid = %s::regclass AND a.grantee <> c.relowner
+        """, (table.as_string(db.conn),))
+        for privilege, grantee, grantable in db.cursor.fetchall():
+            db.execute(sql.SQL("GRANT {} ON {} TO {}{}").format(sql.SQL(privilege), staging, sql.SQL(grantee),
+                sql.SQL(" WITH GRANT OPTION" if grantable else "")))
+        db.cursor.execute("SELECT obj_description(%s::regclass, 'pg_class')", (table.as_string(db.conn),))
+        comment = db.cursor.fetchone()[0]
+        if comment is not None:
+            db.execute(sql.SQL("COMMENT ON TABLE {} IS {}").format(staging, sql.Literal(comment)))
+
+    def _swap(self, db):
+        _, name = self._names()
+        table, staging, old = self._identifier(name), self._target(), f"{name}_wattle_old"
+        # serial sequences are owned by the old table and used by the staging defaults
+        db.cursor.execute("""
+            SELECT s.oid::regclass::text, a.attname FROM pg_depend d
+              JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+              JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+             WHERE d.refobjid = %s::regclass AND d.deptype = 'a'
+        """, (table.as_string(db.conn),))
+        sequences = db.cursor.fetchall()
+        # LIKE doesn't copy foreign keys, they are added again after the swap
+        db.cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            (table.as_string(db.conn),))
+        foreign_keys = db.cursor.fetchall()
+        names = {}
+        for key, index in self._indexes(db, table):
+            names.setdefault(key, []).append(index)
+        self._grant(db, table, staging)
+        db.execute(sql.SQL("ALTER TABLE {} SET LOGGED").format(staging))
+        db.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(table, sql.Identifier(old)))
+        db.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(staging, sql.Identifier(name)))
+        for sequence, column in sequences:
+            db.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}").format(
+                sql.SQL(sequence), self._identifier(name, column)))
+        db.execute(sql.SQL("DROP TABLE {}").format(self._identifier(old)))
+        # indexes copied by LIKE get generated names, the ones of the same definition
+        # are renamed back (a constraint is renamed with its index)
+        for key, index in self._indexes(db, table):
+            if key in names and names[key]:
+                original = names[key].pop(0)
+                if original != index:
+                    db.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(self._identifier(index), sql.Identifier(original)))
+        for constraint, definition in foreign_keys:
+            db.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+                table, sql.Identifier(constraint), sql.SQL(definition)))
+
+    def _merge(self, db):
+        table, staging = self._identifier(self._names()[1]), self._target()
+        db.cursor.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(staging))
+        columns = [c[0] for c in db.cursor.description]
+        fields = sql.SQL(', ').join(map(sql.Identifier, columns))
+        keys = sql.SQL(', ').join(map(sql.Identifier, self._keys))
+        update = [sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in columns if c not in self._keys]
+        action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(', ').join(update)) if update else sql.SQL("DO NOTHING")
+        db.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}").format(
+            table, fields, fields, staging, keys, action))
+        db.execute(sql.SQL("DROP TABLE {}").format(staging))
+
+    def _finish(self, db):
+        if not self._staging:
+            return
+        if self._staging == 'swap':
+            self._swap(db)
+        else:
+            self._merge(db)
+        db.commit()
+
+    def _drop_staging(self, db):
+        if self._staging:
+            db.conn.rollback()
+            db.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(self._target()))
+            db.commit()
+
+    def _copy(self, partition, batches, columns):
+        batches = iter(batches)
+        first = next(batches, None)
+        if first is None:
+            return {'partition': partition, 'rows': 0, 'seconds': 0.0, 'rows_per_sec': None}
+        if columns is None and isinstance(first, pd.DataFrame):
+            columns = list(first.columns)
+
+        db = self._connect()
+        try:
+            started = time.perf_counter()
+            target = self._target().as_string(db.conn)
+            rows = db.copy_iter(target, itertools.chain([first], batches), columns)
+            seconds = time.perf_counter() - started
+        finally:
+            db.close()
+        return {'partition': partition, 'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds else None}
+
+    def _load(self, partitions):
+        self.partitions, failed = [], []
+        # at most two partitions per worker are read ahead, so memory stays bounded
+        pending = threading.BoundedSemaphore(self._workers * 2)
+        lock = threading.Lock()
+
+        def run(partition, batches, columns):
+            try:
+                stats = self._copy(partition, batches, columns)
+                with lock: self.partitions.append(stats)
+                self.log.info("{}: partition {partition}: {rows} rows in {seconds:.3f} s ({rows_per_sec:.0f} rows/s)".format(
+                    self._table, **stats))
+            except Exception as e:
+                with lock: failed.append(partition)
+                self.log.error("{}: partition {}: {}".format(self._table, partition, e))
+            finally:
+                pending.release()
+
+        db = self._connect()
+        started = time.perf_counter()
+        try:
+            self._prepare(db)
+            with ThreadPoolExecutor(max_workers=max(1, self._workers)) as executor:
+                for partition, batches, columns in partitions:
+                    pending.acquire()
+                    executor.submit(run, partition, batches, columns)
+            if failed:
+                raise PostgresLoaderError("{} partition(s) of {} failed: {}".format(
+                    len(failed), self._table, ', '.join(f"{p}" for p in failed)))
+            self._finish(db)
+        except Exception:
+            self._drop_staging(db)
+            raise
+        finally:
+            db.close()
+
+        rows = sum(p['rows'] for p in self.partitions)
+        seconds = time.perf_counter() - started
+        self.report(rows_in=rows)
+        self.log.info("{}: {} rows in {} partitions, {:.3f} s ({:.0f} rows/s)".format(
+            self._table, rows, len(self.partitions), seconds, rows / seconds if seconds else 0))
+        return rows
+
+    def _csv_partitions(self, file_path):
+        header, ranges = csv_ranges(file_path)
+        columns = next(csv.reader(io.StringIO(header)), [])
+        if self._columns and list(self._columns) != columns:
+            # only the selected columns, read as text so values stay as written
+            chunks = self._format.chunks(file_path, self._chunksize, self._columns, dtype=str, keep_default_na=False)
+            for n, chunk in enumerate(chunks):
+                yield f"{file_path}:{n}", [chunk], list(self._columns)
+            return
+        for n, (start, end) in enumerate(ranges):
+            yield f"{file_path}:{n}", _read_range(file_path, start, end), columns
+
+    def _file_partitions(self):
+        for file_path in self._input:
+            if not WattleUtils.file_exists(file_path):
+                msg = MSG_NOT_FOUND.format("File", file_path)
+                self.log.error(msg)
+                raise FileNotFoundError(msg)
+            if self._format.detect(file_path) not in (PARQUET, FEATHER):
+                yield from self._csv_partitions(file_path)
+                continue
+            for n, chunk in enumerate(self._format.chunks(file_path, self._chunksize, self._columns)):
+                yield f"{file_path}:{n}", [chunk], self._columns
+
+    def _frame_partitions(self, df):
+        bounds = np.linspace(0, len(df), max(1, self._partitions) + 1, dtype=int)
+        for n in range(len(bounds) - 1):
+            part = df.iloc[bounds[n]:bounds[n + 1]]
+            if len(part) == 0: continue
+            yield n, (part.iloc[i:i + self._chunksize] for i in range(0, len(part), self._chunksize)), self._columns
+
+    def load_batches(self, batches):
+        self.log.debug("{}.load_batches()".format(self.__class__.__name__))
+        return self._load((n, [batch], self._columns) for n, batch in enumerate(batches))
+
+    def load(self):
+        super().load()
+        if isinstance(self._df, pd.DataFrame):
+            return self._load(self._frame_partitions(self._df))
+        if self._input:
+            return self._load(self._file_partitions())
+        raise PostgresLoaderError("Nothing to load, `input` or `df` must be given.")
@@ -4,13 +4,16 @@ import pandas as pd
 
 from etl.core.constants import (
     MSG_FILE_EXIST,
+    MSG_NOT_FOUND,
+    MSG_CREATION_ERROR,
     METHOD_EXEC,
     MSG_CSV_FILE_ERROR,
     MSG_FILE_CREATED
 )
 
 from etl.core.concrete import WattleExtract
-from etl.core.utils import WattleUtils
+from etl.utils.base import WattleUtils
+from etl.utils.formats import WattleFormat
 
 class GisInputError(Exception):
     pass
@@ -31,6 +34,8 @@ class GisExtract(WattleExtract):
           dataframe - must be Pandas data frame (optional if input is provided).
           columns   - csv field list (optional).
           usecols   - csv field list (optional).
+          point     - WKT point column (default: point).
+          format    - output format csv|parquet|feather (default: by output extension).
           overwrite - True|False. (optional for files).
 
       Methods:
@@ -44,6 +49,11 @@ class GisExtract(WattleExtract):
         self._output  = params['output']  if 'output'  in params else None
         self._columns = params['columns'] if 'columns' in params else None
         self._usecols = params['usecols'] if 'usecols' in params else None
+        self._point   = params['point']   if 'point'   in params else 'point'
+        self._format  = WattleFormat(params['format'] if 'format' in params else None)
+        if self._output:
+            self._output = self._format.path(self._output)
+            self.outputs = [self._output]
         self._overwrite = params['overwrite'] if 'overwrite' in params else True
 
     def _read(self):
@@ -54,10 +64,7 @@ class GisExtract(WattleExtract):
             raise FileNotFoundError(MSG_NOT_FOUND.format("Path", self._input))
 
         try:
-            if not self._columns:
-                self._df = pd.read_csv(self._input)
-            else:
-                self._df = pd.read_csv(self._input, usecols=self._columns)
+            self._df = self._format.read(self._input, self._columns)
             
             if self._usecols and isinstance(self._usecols, list):
                 self._df.columns = self._usecols
@@ -68,11 +75,6 @@ class GisExtract(WattleExtract):
             self.log.error(e)
             raise FileReadingError(msg)
 
-        self._read_requested_stats()
-
-        if self._unique and isinstance(self._unique, list):
-            self._distinct()
-
     def _save(self):
         self.log.debug("{}._save()".format(self.__class__.__name__))
 
@@ -87,15 +89,15 @@ class GisExtract(WattleExtract):
 
         try:
             if not os.path.exists(self._output):
-                self._df.to_csv(self._output, header=True, index=False)
+                self._format.write(self._df, self._output)
                 self.log.info(MSG_FILE_CREATED.format(self._output))
             else:
                 if self._overwrite: 
-                    self._df.to_csv(self._output, header=True, index=False)
+                    self._format.write(self._df, self._output)
                     self.log.info("File overwritten: {}".format(self._output))
 
         except Exception as e:
-            self.log.error(MSG_CREATION_ERROR.format(self._output))
+            self.log.error(MSG_CREATION_ERROR.format(self._output, e))
 
     def _update_gis(self, df, column):
         if not isinstance(df, pd.DataFrame): raise TypeError("Unexpected dataframe!")
@@ -106,13 +108,13 @@ class GisExtract(WattleExtract):
     def extract(self):
         super().extract()
 
-        if self._df:
-            self._update_gis()
-        else if self._input:
+        if self._df is None:
+            if not self._input:
+                raise GisInputError("Unknown input!")
             self._read()
-            self._update_gis()
-        else:
-            raise GisInputError("Unknown input!")
+        self.report(rows_in=len(self._df))
+
+        self._df = self._update_gis(self._df, self._point)
 
         self._save()
         return self._df
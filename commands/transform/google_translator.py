@@ -4,13 +4,14 @@ import gc
 import traceback
 import pandas as pd
 
-from googletrans import Translator
 from tqdm.notebook import tqdm
 from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
 from etl.utils import WattleUtils
+from etl.utils.formats import WattleFormat, CSV
 from etl.core.concrete import WattleTransform
+from etl.core.fanout import WattleFanOut
 from etl.utils.lambda_functions import (
     inc,
     zero
@@ -26,7 +27,7 @@ from etl.core.constants import (
 class GoogleTranslationError(Exception):
     pass
 
-class GoogleTranslator(WattleTransform):
+class GoogleTranslator(WattleFanOut, WattleTransform):
     """
       This class is a simple implementation of Google translation API in a dataframe.
       An CSV files will be loaded into a DataFrame and given text column will be translated to a destination language. 
@@ -36,8 +37,14 @@ class GoogleTranslator(WattleTransform):
       Constructor(params)
           path      - must have a path given
           pages     - user given page range.
+          workers   - number of files processed in parallel (default: available cores).
+          fanout    - process|thread|serial (default: process).
+          format    - format of the files, csv|parquet|feather (default: csv).
+          drop      - drop an existing to_column and insert it first, otherwise it's
+                      overwritten in its place (default: True).
       Methods:
           execute(self)       - evaluate given input params and extracts archive.
+          transform_batches(batches) - streaming mode, translates DataFrame batches.
     """
     def __init__(self, log, params):
         super().__init__(log, params)
@@ -49,7 +56,12 @@ class GoogleTranslator(WattleTransform):
         assert isinstance(params['min_threshold'], int)
         assert isinstance(params['num_threads'], int)
         self._path = params['path']
-        self.ext = ".csv"
+        self.format = WattleFormat(params['format'] if 'format' in params else CSV)
+        self.ext = self.format.suffix
+        if 'inputs' not in params:
+            self.inputs = [os.path.join(self._path, f"*{self.ext}")]
+        if 'outputs' not in params:
+            self.outputs = list(self.inputs)
         self.from_column = params['from_column']
         self.to_column = params['to_column']
         self.src = params['src']
@@ -57,22 +69,22 @@ class GoogleTranslator(WattleTransform):
         self.drop = params['drop'] if 'drop' in params else True
         self.min_threshold = params['min_threshold']
         self.num_threads = params['num_threads']
-        self.progress = None
         self.filelist = deque() #         self.statlist = deque()
         self.buffer = deque()
         self.counter = 0
-        self.transform()
+        self.progress = None
 
-    def _apply(self, text):
+    def _apply(self, text, progress):
         self.counter += 1;
         wc = len(f"{text}".split())
         if not wc >= self.min_threshold: #             self.stats.add(self.counter, '')
-            self.progress.update(1)
+            progress.update(1)
             return EMPTY
 
+        from googletrans import Translator
         translator = Translator()
         translated = translator.translate(text, src=self.src, dest=self.dest).text #         self.stats.add(self.counter, translated)
-        self.progress.update(1)
+        progress.update(1)
         return translated
 
     def _column_check(self, df):
@@ -80,19 +92,42 @@ class GoogleTranslator(WattleTransform):
             raise GoogleTranslationError( f"Column {self.from_column} doesn't exist in csv file." )
 
         if self.to_column in df.columns:
-            if self.drop == True: df.drop(self.to_column, axis=1, inplace=True)
+            if self.drop == True: df = df.drop(self.to_column, axis=1)
+        return df
+
+    def _translate(self, df, progress):
+        df = self._column_check(df)
+        self.report(rows_in=len(df))
+        num_threads = self.num_threads
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            column = list(executor.map(lambda text: self._apply(text, progress), df[self.from_column]))
+        if self.to_column in df.columns: # kept with drop: False, overwritten in its place
+            return df.assign(**{self.to_column: column})
+        df = df.copy(deep=False) # the caller's batch is left as it is
+        df.insert(0, self.to_column, column)
+        return df
+
+    def transform_batch(self, batch):
+        if self.progress is None:
+            self.progress = tqdm(desc="Translating batches")
+        return self._translate(batch, self.progress)
+
+    def transform_batches(self, batches):
+        try:
+            yield from super().transform_batches(batches)
+        finally:
+            if self.progress is not None:
+                self.progress.close()
+                self.progress = None
 
     def process_file(self, filename):
         try:
-            df = pd.read_csv(filename)
-            self._column_check(df)
-            self.progress = tqdm(total=len(df), desc=f"Translating: {filename}")
-            num_threads = self.num_threads
-            with ThreadPoolExecutor(max_workers=num_threads) as executor:
-                column = list(executor.map(self._apply, df[self.from_column]))
-            df.insert(0, self.to_column, column)
-            df.to_csv(filename, index=False)
+            df = self.format.read(filename)
+            progress = tqdm(total=len(df), desc=f"Translating: {filename}")
+            df = self._translate(df, progress)
+            self.format.write(df, filename)
             del df
+            return filename
         except Exception as e:
             msg = f"{self.__class__}._process_file: {e}\n"
             # msg += traceback.format_exc()
@@ -104,18 +139,15 @@ class GoogleTranslator(WattleTransform):
     def transform(self):
         super().transform()
         if not WattleUtils.path_exists(self._path):
-            msg = MSG_NOT_FOUND.format("File", self._input)
+            msg = MSG_NOT_FOUND.format("Path", self._path)
             self.log.error(msg)
             raise FileNotFoundError(msg)
 
-        for name in os.listdir(self._path):
-            if name.endswith(self.ext):
-                filename = os.path.join(self._path, name)
-                self.filelist.append(filename) #                 self.stats = Stats(name)
-                self.process_file(filename)    #                 self.statlist.append(self.stats)
-                self.counter += 1              #                 self.log.info(self.stats)
+        self.filelist.extend(self.discover(self._path, self.ext))
 
         if zero(self.filelist):
             msg=f"WARNING: Files {self.ext} not found."
             self.log.warning(msg)
-            raise GoogleTranslationError(msg)
\ No newline at end of file
+            raise GoogleTranslationError(msg)
+
+        return self.fan_out(self.filelist)
\ No newline at end of file
@@ -2,18 +2,19 @@ import io
 import os
 import sys
 import gc
+import traceback
 import warnings
 import pandas as pd
-# import dask.dataframe as dd
-import dask.multiprocessing # --> preporuceno za rad
 from tqdm.notebook import tqdm
 from collections import deque
-from transformers import pipeline
 from concurrent.futures import ThreadPoolExecutor
 
 from etl.utils import WattleUtils
+from etl.utils.formats import WattleFormat, CSV
 from etl.utils.lambda_functions import zero 
 from etl.core.concrete import WattleTransform
+from etl.core.fanout import WattleFanOut
+from etl.core.resources import WattleResources, resources
 from etl.core.constants import (
     SUMMARY_TEXT,
     MSG_NOT_FOUND,
@@ -39,7 +40,37 @@ def min_max(x):
 class SummariserError(Exception):
     pass
 
-class HuggingFaceSummariser(WattleTransform):
+def _load_pipeline(config):
+    from transformers import pipeline
+    return pipeline(config['task'], model=config['model'])
+
+WattleResources.register('transformers', _load_pipeline)
+
+class HuggingFaceSummariser(WattleFanOut, WattleTransform):
+    """
+      This class summarises a text column of every CSV file in a `path` using a
+      HuggingFace summarisation model. Files are processed in parallel by WattleFanOut
+      and the model is borrowed from the shared resource registry on first use. Files
+      are processed in threads sharing one model, a worker process would load its own.
+
+      Constructor(params)
+          path          - must have a path given.
+          model         - HuggingFace model name.
+          from_column   - text column.
+          to_column     - summary column.
+          num_threads   - number of rows summarised in parallel in each file.
+          min_threshold - minimum word count of a text to be summarised.
+          workers       - number of files processed in parallel (default: available cores).
+          fanout        - process|thread|serial (default: thread).
+          format        - format of the files, csv|parquet|feather (default: csv).
+          drop          - drop an existing to_column and insert it first, otherwise it's
+                          overwritten in its place (default: True).
+      Methods:
+          execute(self) - summarise all files, returns dict of processed files.
+          transform_batches(batches) - streaming mode, summarises DataFrame batches.
+    """
+    fanout_mode = 'thread'
+
     def __init__(self, log, params):
         super().__init__(log, params)
         assert isinstance(params['path'], str)
@@ -50,7 +81,12 @@ class HuggingFaceSummariser(WattleTransform):
         assert isinstance(params['min_threshold'], int)
 
         self._path          = params['path']
-        self._ext           = ".csv"
+        self._format        = WattleFormat(params['format'] if 'format' in params else CSV)
+        self._ext           = self._format.suffix
+        if 'inputs' not in params:
+            self.inputs = [os.path.join(self._path, f"*{self._ext}")]
+        if 'outputs' not in params:
+            self.outputs = list(self.inputs)
         self._filelist      = deque()        #         self.statlist = deque()
         self._counter       = 0
         self._from_column   = params['from_column']
@@ -58,9 +94,9 @@ class HuggingFaceSummariser(WattleTransform):
         self._num_threads   = int(params['num_threads'])
         self._min_threshold = int(params['min_threshold'])
         self._drop          = params['drop'] if 'drop' in params else True
-        self._summariser    = pipeline("summarization", model=params['model'])
+        self._model         = params['model']
+        self._summariser    = None
         self._progress      = None
-        self.transform()
 
     def transform(self):
         super().transform()
@@ -69,45 +105,81 @@ class HuggingFaceSummariser(WattleTransform):
             self.log.error(msg)
             raise FileNotFoundError(msg)
 
-        for name in os.listdir(self._path):
-            if name.endswith(self._ext):
-                filename = os.path.join(self._path, name)
-                self._filelist.append(filename) #                 self.stats = Stats(name)
-                self.process_file(filename)     #                 self.statlist.append(self.stats)
-                self._counter += 1              #                 self.log.info(self.stats)
+        self._filelist.extend(self.discover(self._path, self._ext))
 
         if zero(self._filelist):
             msg=f"WARNING: Files {self._ext} not found."
             self.log.warning(msg)
             raise SummariserError(msg)
 
+        try:
+            return self.fan_out(self._filelist)
+        finally:
+            self._release()
+
+    def _pipeline(self):
+        # borrowed on first use, so the command can be sent to worker processes
+        if self._summariser is None:
+            self._summariser = resources.borrow('transformers', {'task': 'summarization', 'model': self._model})
+        return self._summariser
+
+    def _release(self):
+        if self._summariser is not None:
+            resources.release('transformers', {'task': 'summarization', 'model': self._model})
+            self._summariser = None
+
     def _column_check(self, df):
         if not self._from_column in df.columns:
             raise Exception( f"Column {self._from_column} doesn't exist in csv file." )
         if self._to_column in df.columns:
-            if self._drop == True: df.drop(self._to_column, axis=1, inplace=True)
+            if self._drop == True: df = df.drop(self._to_column, axis=1)
+        return df
 
-    def _apply(self, text):
+    def _apply(self, text, progress):
         self._counter += 1
         wc = len(f"{text}".split())
         if not wc >= self._min_threshold:        #             self.stats.add(self.counter, text);
-            self._progress.update(1)
+            progress.update(1)
             return EMPTY
         max, min = min_max(wc)
-        summary  = self._summariser(text, max_length=max, min_length=min, do_sample=False)[0][SUMMARY_TEXT] #         self.stats.add(self.counter, summary);
-        self._progress.update(1)
+        summary  = self._pipeline()(text, max_length=max, min_length=min, do_sample=False)[0][SUMMARY_TEXT] #         self.stats.add(self.counter, summary);
+        progress.update(1)
         return summary if len(summary) > 0 else EMPTY
 
+    def _summarise(self, df, progress):
+        df = self._column_check(df)
+        self.report(rows_in=len(df))
+        self._pipeline()
+        with ThreadPoolExecutor(max_workers=self._num_threads) as executor:
+            column = list(executor.map(lambda text: self._apply(text, progress), df[self._from_column]))
+        if self._to_column in df.columns: # kept with drop: False, overwritten in its place
+            return df.assign(**{self._to_column: column})
+        df = df.copy(deep=False) # the caller's batch is left as it is
+        df.insert(0, self._to_column, column)
+        return df
+
+    def transform_batch(self, batch):
+        if self._progress is None:
+            self._progress = tqdm(desc="Summarising batches")
+        return self._summarise(batch, self._progress)
+
+    def transform_batches(self, batches):
+        try:
+            yield from super().transform_batches(batches)
+        finally:
+            if self._progress is not None:
+                self._progress.close()
+                self._progress = None
+            self._release()
+
     def process_file(self, filename):
         df = None
         try:
-            df = pd.read_csv(filename)
-            self._column_check(df)
-            self._progress = tqdm(total=len(df), desc=f"Summarisng: {filename}")
-            with ThreadPoolExecutor(max_workers=self._num_threads) as executor:
-                column = list(executor.map(self._apply, df[self._from_column]))
-            df.insert(0, self._to_column, column)
-            df.to_csv(filename, index=False)
+            df = self._format.read(filename)
+            progress = tqdm(total=len(df), desc=f"Summarisng: {filename}")
+            df = self._summarise(df, progress)
+            self._format.write(df, filename)
+            return filename
         except Exception as e:
             msg = f"{self.__class__}._process_file: {e}\n"
             msg += traceback.format_exc()
@@ -17,6 +17,14 @@ from etl.core.concrete import (
 )
 
 from etl.core.logger import (WattleLogger)
+from etl.core.scheduler import (WattleScheduler)
+from etl.core.stream import (WattleStream)
+from etl.core.metrics import (WattleMetrics)
+from etl.core.cache import (WattleCache)
+from etl.core.journal import (WattleJournal)
+from etl.core.fanout import (WattleFanOut)
+from etl.core.resources import (WattleResources, resources)
+from etl.core.pipeline import (WattlePipeline, WattleStage)
 
 __all__ = [
     'WattleFlow',
@@ -32,4 +40,14 @@ __all__ = [
     'WattleLoad',
     'WattleProcess',
     'WattleLogger',
+    'WattleScheduler',
+    'WattleStream',
+    'WattleMetrics',
+    'WattleCache',
+    'WattleJournal',
+    'WattleFanOut',
+    'WattleResources',
+    'resources',
+    'WattlePipeline',
+    'WattleStage',
 ]
\ No newline at end of file
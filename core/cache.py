@@ -0,0 +1,240 @@
+import os
+import glob
+import json
+import pickle
+import hashlib
+import datetime
+
+from etl.core.constants import DATE_FORMNAT
+
+CACHE_PATH  = '.wattle-cache'
+CACHE_BLOCK = 1024 * 1024
+CACHE_HASHES = ('mtime', 'content')
+CACHE_IGNORED = ('owner', 'cache')
+CACHE_LINEAGE = 64
+
+class WattleCacheError(Exception):
+    pass
+
+class WattleCache:
+    """
+      This class memoizes command execution. Each command is fingerprinted from its
+      class, its params and the signatures of its input files. When the fingerprint is
+      unchanged and all recorded output files are still there, the command is skipped
+      and its saved result is returned.
+
+      Input files are taken from the command `inputs` (glob patterns and directories
+      are expanded). Commands without inputs (their input files can't be determined),
+      whose params are not plain YAML values (e.g. a DataFrame) or that have
+      `cache: False` in params are always executed.
+
+      Files a command rewrites in place (both an input and an output, e.g. the
+      transforms of a directory) are not fingerprinted by content, their state after
+      the run is the expected one. For such files the cache records which signature
+      each rewrite was derived from, so an output counts as unchanged when it is the
+      recorded one or was derived from it by later in-place commands: in a chain
+      PDFPapers -> translate -> summarise a second run skips every command, while
+      a new PDFPapers output reruns the commands after it.
+
+      Each command has its own manifest file in the cache directory, so commands
+      running in parallel threads or processes never write the same file.
+
+      Constructor(log, config)
+          path    - cache directory (default: .wattle-cache).
+          hash    - mtime|content, how input and output files are compared (default: mtime).
+          results - True|False pickle command results (default: True).
+
+      Methods:
+          fingerprint(task)   - fingerprint or None if the task can't be cached.
+          wrap(task, action)  - action returning the cached result when unchanged.
+          clear()             - remove all manifests and results.
+    """
+    def __init__(self, log, config=None):
+        config = config if config else {}
+        assert isinstance(config, dict)
+
+        self.log = log
+        self.path = config['path'] if 'path' in config else CACHE_PATH
+        self.hash = config['hash'] if 'hash' in config else 'mtime'
+        self.results = config['results'] if 'results' in config else True
+
+        if self.hash not in CACHE_HASHES:
+            raise WattleCacheError("Unknown cache hash: {}".format(self.hash))
+        os.makedirs(self.path, exist_ok=True)
+
+    def _files(self, patterns):
+        files = []
+        for pattern in patterns:
+            for name in sorted(glob.glob(pattern)) or [pattern]:
+                if os.path.isdir(name):
+                    for root, dirs, names in os.walk(name):
+                        dirs.sort()
+                        files.extend(os.path.join(root, n) for n in sorted(names))
+                else:
+                    files.append(name)
+        return files
+
+    def _signature(self, file_path):
+        if not os.path.isfile(file_path):
+            return None
+        if self.hash == 'mtime':
+            stat = os.stat(file_path)
+            return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(CACHE_BLOCK), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _params(self, params):
+        def unsupported(value):
+            raise TypeError(type(value).__name__)
+        values = {k: v for k, v in params.items() if k not in CACHE_IGNORED}
+        return json.dumps(values, sort_keys=True, default=unsupported)
+
+    def _in_place(self, task):
+        outputs = set(self._files(task.outputs))
+        return [f for f in self._files(task.inputs) if f in outputs]
+
+    def _lineage_path(self, file_path):
+        key = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+        return os.path.join(self.path, 'lineage', f"{key}.json")
+
+    def _lineage(self, file_path):
+        try:
+            with open(self._lineage_path(file_path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _derive(self, file_path, before, after):
+        # `after` was written by a command which read `before`
+        if before is None or after is None or before == after: return
+        lineage = self._lineage(file_path)
+        lineage.pop(after, None)
+        lineage[after] = before
+        lineage = dict(list(lineage.items())[-CACHE_LINEAGE:])
+        lineage_path = self._lineage_path(file_path)
+        os.makedirs(os.path.dirname(lineage_path), exist_ok=True)
+        with open(f"{lineage_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(lineage, f)
+        os.replace(f"{lineage_path}.tmp", lineage_path)
+
+    def _unchanged(self, file_path, signature):
+        # the recorded signature, or derived from it by in-place commands
+        current, lineage, seen = self._signature(file_path), None, set()
+        while current is not None and current not in seen:
+            if current == signature: return True
+            if lineage is None: lineage = self._lineage(file_path)
+            seen.add(current)
+            current = lineage.get(current)
+        return False
+
+    def fingerprint(self, task):
+        if not task.inputs:
+            self.log.debug("{}: no input files, not cached.".format(task.name))
+            return None
+        try:
+            params = self._params(task.params)
+        except TypeError as e:
+            self.log.debug("{}: params can't be cached: {}".format(task.name, e))
+            return None
+
+        digest = hashlib.sha256()
+        digest.update(f"{task.__class__.__module__}.{task.__class__.__qualname__}".encode())
+        digest.update(params.encode())
+        in_place = set(self._in_place(task))
+        for file_path in self._files(task.inputs):
+            # only the names of files rewritten in place, their outputs are checked
+            signature = '' if file_path in in_place else self._signature(file_path)
+            digest.update(f"{file_path}={signature}".encode())
+        return digest.hexdigest()
+
+    def _key(self, task):
+        name = f"{task.__class__.__qualname__}-{task.name}"
+        return hashlib.sha1(name.encode()).hexdigest()
+
+    def _manifest_path(self, task):
+        return os.path.join(self.path, f"{self._key(task)}.json")
+
+    def _result_path(self, task):
+        return os.path.join(self.path, f"{self._key(task)}.pkl")
+
+    def _load(self, task, fingerprint):
+        manifest_path = self._manifest_path(task)
+        if not os.path.exists(manifest_path):
+            return False, None
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        if manifest['fingerprint'] != fingerprint:
+            return False, None
+        for file_path, signature in manifest['outputs'].items():
+            if not self._unchanged(file_path, signature):
+                return False, None
+
+        if not manifest['result']:
+            return True, None
+        try:
+            with open(self._result_path(task), 'rb') as f:
+                return True, pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+
+    def _save(self, task, fingerprint, result, before):
+        outputs = {f: self._signature(f) for f in self._files(task.outputs)}
+        for file_path, signature in before.items():
+            self._derive(file_path, signature, outputs.get(file_path))
+
+        saved = False
+        if self.results and result is not None:
+            try:
+                with open(self._result_path(task), 'wb') as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+                saved = True
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                self.log.debug("{}: result can't be cached: {}".format(task.name, e))
+
+        manifest = {
+            'name'       : task.name,
+            'class'      : task.__class__.__qualname__,
+            'fingerprint': fingerprint,
+            'outputs'    : outputs,
+            'result'     : saved,
+            'created'    : datetime.datetime.now().strftime(DATE_FORMNAT),
+        }
+        manifest_path = self._manifest_path(task)
+        with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def wrap(self, task, action):
+        if 'cache' in task.params and task.params['cache'] is False:
+            return action
+
+        def cached():
+            fingerprint = self.fingerprint(task)
+            if fingerprint is None:
+                return action()
+
+            hit, result = self._load(task, fingerprint)
+            if hit:
+                self.log.info("{}: unchanged, skipped.".format(task.name))
+                return result
+
+            before = {f: self._signature(f) for f in self._in_place(task)}
+            result = action()
+            self._save(task, fingerprint, result, before)
+            return result
+        return cached
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith(('.json', '.pkl')):
+                os.remove(os.path.join(self.path, name))
+        lineage = os.path.join(self.path, 'lineage')
+        if os.path.isdir(lineage):
+            for name in os.listdir(lineage):
+                os.remove(os.path.join(lineage, name))
@@ -1,11 +1,17 @@
 import os
 import sys
+import threading
 
 from abc import (
     abstractmethod
 )
 
 from etl.core.logger import WattleLogger
+from etl.core.scheduler import WattleScheduler
+from etl.core.stream import WattleStream
+from etl.core.metrics import WattleMetrics
+from etl.core.cache import WattleCache
+from etl.core.journal import WattleJournal
 from etl.core.abstract import (
     WattleCommand, 
     WattleComposite,
@@ -13,11 +19,19 @@ from etl.core.abstract import (
 )
 
 class Singleton(type):
+    """
+      Metaclass keeping a single instance of a class. Shared heavy resources such
+      as models and connections should be borrowed from `etl.core.resources`
+      instead, which keys them by configuration and can evict them.
+    """
     _instances = {}
+    _lock = threading.Lock()
 
     def __call__(cls, *args, **kwargs):
         if cls not in cls._instances:
-            cls._instances[cls] = super().__call__(*args, **kwargs)
+            with Singleton._lock:
+                if cls not in cls._instances:
+                    cls._instances[cls] = super().__call__(*args, **kwargs)
         return cls._instances[cls]
 
 class WattleTask(WattleCommand):
@@ -26,7 +40,24 @@ class WattleTask(WattleCommand):
         :log - WattleLoger instance
         :param - provide dict parameters from yaml file
         :param["owner"] - if assigned otherwire None
+        :param["name"] - command name used by the scheduler (default: class name)
+        :param["depends_on"] - list of command names which must be executed first
+        :param["inputs"] - list of files the command reads (default: [param["input"]])
+        :param["outputs"] - list of files the command writes (default: [param["output"]])
+
+      When `metrics` is assigned a WattleMetrics instance, execution of the task
+      is measured. Commands can add their own counters with `report`.
+      When `cache` is assigned a WattleCache instance, the task is skipped if its
+      class, params and input files haven't changed since the last execution.
+      When `journal` is assigned a WattleJournal instance, a task completed in the
+      previous run is skipped. Commands working on many files use `processed` and
+      `checkpoint` to skip the files already done.
     """
+    metrics = None
+    cache   = None
+    journal = None
+    step    = None
+
     def __init__(self, log, params):
         assert isinstance(log, WattleLogger)
         assert isinstance(params, dict)
@@ -34,8 +65,35 @@ class WattleTask(WattleCommand):
         self.log = log
         self.params = params
         self.owner  = params['owner'] if 'owner' in params else None
+        self.name   = params['name'] if 'name' in params else self.__class__.__name__
+        self.depends_on = params['depends_on'] if 'depends_on' in params else []
+        self.inputs  = params['inputs'] if 'inputs' in params else self._default_files(params, 'input')
+        self.outputs = params['outputs'] if 'outputs' in params else self._default_files(params, 'output')
         self.log.debug("{}.__init__({},{})".format(self.__class__.__name__, log, params))
 
+    def _default_files(self, params, key):
+        return [params[key]] if key in params and isinstance(params[key], str) else []
+
+    def _run(self, action):
+        if self.cache is not None:
+            action = self.cache.wrap(self, action)
+        if self.journal is not None:
+            action = self.journal.wrap(self, action)
+        if self.metrics is None:
+            return action()
+        return self.metrics.measure(self, action)
+
+    def report(self, **counters):
+        if self.metrics is not None:
+            self.metrics.count(self, **counters)
+
+    def processed(self, item):
+        return self.journal is not None and self.journal.processed(self, item)
+
+    def checkpoint(self, item):
+        if self.journal is not None:
+            self.journal.checkpoint(self, item)
+
     @abstractmethod
     def execute(self):
         self.log.debug("{}.execute()".format(self.__class__.__name__))
@@ -44,33 +102,72 @@ class WattleTask(WattleCommand):
 class WattleExtract(WattleTask):
     def execute(self):
         self.log.debug("{}.execute()".format(self.__class__.__name__))
-        return self.extract()
+        return self._run(self.extract)
    
     @abstractmethod
     def extract(self):
         self.log.debug("{}.extract()".format(self.__class__.__name__))
         pass
 
+    def batches(self):
+        """
+          Streaming mode: yields record batches (DataFrames). By default the whole
+          `extract` result is a single batch; commands reading large inputs should
+          override it and yield bounded batches instead.
+        """
+        self.log.debug("{}.batches()".format(self.__class__.__name__))
+        result = self.extract()
+        if result is not None:
+            yield result
+
 class WattleTransform(WattleTask):
     def execute(self):
         self.log.debug("{}.execute()".format(self.__class__.__name__))
-        return self.transform()
+        return self._run(self.transform)
    
     @abstractmethod
     def transform(self):
         self.log.debug("{}.transform()".format(self.__class__.__name__))
         pass
 
+    def transform_batch(self, batch):
+        raise NotImplementedError("{} doesn't support streaming.".format(self.__class__.__name__))
+
+    def transform_batches(self, batches):
+        """
+          Streaming mode: consumes record batches and yields transformed batches.
+          Batches for which `transform_batch` returns None are dropped.
+        """
+        self.log.debug("{}.transform_batches()".format(self.__class__.__name__))
+        for batch in batches:
+            result = self.transform_batch(batch)
+            if result is not None:
+                yield result
+
 class WattleLoad(WattleTask):
     def execute(self):
         self.log.debug("{}.execute()".format(self.__class__.__name__))
-        return self.load()
+        return self._run(self.load)
    
     @abstractmethod
     def load(self):
         self.log.debug("{}.load()".format(self.__class__.__name__))
         pass
 
+    def load_batch(self, batch):
+        raise NotImplementedError("{} doesn't support streaming.".format(self.__class__.__name__))
+
+    def load_batches(self, batches):
+        """
+          Streaming mode: drains record batches and returns the number of loaded rows.
+        """
+        self.log.debug("{}.load_batches()".format(self.__class__.__name__))
+        rows = 0
+        for batch in batches:
+            self.load_batch(batch)
+            rows += len(batch)
+        return rows
+
 # Process
 class WattleProcess(WattleComposite):
     """     
@@ -83,14 +180,36 @@ class WattleProcess(WattleComposite):
     This approach allows flexibility when implementing different approach in
     creating processes. They can also be synchronous and asynchronous.
 
+    Commands are executed one after another unless params has a `scheduler`
+    dict (mode: serial|thread|process, workers: N). In that case commands are
+    executed by WattleScheduler as a dependency graph built from each command's
+    `depends_on`, `inputs` and `outputs`, and independent commands run in parallel.
+
+    With a `metrics` dict in params (enabled, report, prometheus, tracemalloc),
+    every command is measured by WattleMetrics and the run report is saved at
+    the end of `execute`. `execute(metrics=False)` switches it off for a run.
+
+    With a `cache` dict in params (enabled, path, hash, results), unchanged
+    commands are skipped by WattleCache. `execute(cache=False)` forces a full run.
+
+    With a `journal` dict in params (path), progress is saved by WattleJournal
+    after each command and processed file. `execute(resume=True)` continues a
+    failed run from where it stopped.
+
+    With a `stream` dict in params (buffer: N), commands are chained as
+    extract -> transform(s) -> load and record batches are passed from one step
+    to the next in memory, holding at most `buffer` batches between two steps.
+    Stream runs are not measured by WattleMetrics, cached or journaled.
+
     The class is derived from an AbstractComposite class and streamlines 
     the process of reading commands from an external resource.
 
     Methods:
         Constructor(owner)
-        add(command)    - add commands to a list.
-        remove(command) - remove command from the list.
-        execute()       - execute all commands.
+        add(command)                    - add commands to a list.
+        remove(command)                 - remove command from the list.
+        execute(metrics, cache, resume) - execute all commands, True|False overrides params.
+        stream()                        - execute commands as a streaming chain of record batches.
     """
     def __init__(self, owner):
         assert isinstance(owner, WattleFactory)
@@ -112,10 +231,63 @@ class WattleProcess(WattleComposite):
         self.log.debug( "{}.remove({})".format(self.__class__.__name__, command) )
         self.commands.remove(command)
 
-    def execute(self):
-        self.log.debug( "{}.execute()".format(self.__class__.__name__) )
+    def _config(self, key, enabled):
+        config = self.params[key] if key in self.params else None
+        if config is None or isinstance(config, bool):
+            config, default = {}, bool(config)
+        else:
+            default = config['enabled'] if 'enabled' in config else True
+        return config if (default if enabled is None else enabled) else None
+
+    def _metrics(self, enabled):
+        config = self._config('metrics', enabled)
+        return WattleMetrics(self.log, config) if config is not None else None
+
+    def _cache(self, enabled):
+        config = self._config('cache', enabled)
+        return WattleCache(self.log, config) if config is not None else None
+
+    def _journal(self, resume):
+        config = self._config('journal', True if resume else None)
+        if config is None:
+            return None
+        journal = WattleJournal(self.log, config)
+        journal.start(resume)
+        return journal
+
+    def _execute(self):
+        if 'stream' in self.params:
+            return self.stream()
+
+        if 'scheduler' in self.params:
+            return WattleScheduler(self.log, self.params['scheduler']).run(self.commands)
+
+        results = []
         for command in self.commands:
-            command.execute()
+            results.append(command.execute())
+        return results
+
+    def execute(self, metrics=None, cache=None, resume=False):
+        self.log.debug( "{}.execute()".format(self.__class__.__name__) )
+        self.metrics = self._metrics(metrics)
+        self.cache = self._cache(cache)
+        self.journal = self._journal(resume)
+        for step, command in enumerate(self.commands):
+            command.step = step
+            command.metrics = self.metrics
+            command.cache = self.cache
+            command.journal = self.journal
+
+        try:
+            return self._execute()
+        finally:
+            if self.metrics is not None:
+                self.metrics.save()
+
+    def stream(self):
+        self.log.debug( "{}.stream()".format(self.__class__.__name__) )
+        config = self.params['stream'] if 'stream' in self.params else None
+        return WattleStream(self.log, config).run(self.commands)
 
     @abstractmethod
     def read_tasks(self):
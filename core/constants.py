@@ -24,3 +24,4 @@ TRANSLATOR_MAX_WORDS = 400
 TRANSLATOR_DEST      = 'en'
 DEFAULT_MULTIPLIER   = 0.7
 SUMMARY_TEXT         = 'summary_text'
+SPACY_MODEL          = 'en_core_web_sm'
@@ -0,0 +1,122 @@
+import os
+import time
+import traceback
+
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+    as_completed
+)
+
+FANOUT_MODES = ('serial', 'thread', 'process')
+
+_worker_task = None
+
+class WattleFanOutError(Exception):
+    pass
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError: # not available on macOS and Windows
+        return os.cpu_count() or 1
+
+def _call(task, filename):
+    try:
+        return filename, task.process_file(filename), None
+    except Exception as e:
+        return filename, None, f"{e}\n{traceback.format_exc()}"
+
+def _init_worker(task):
+    # the task is sent once per worker process, not once per file
+    global _worker_task
+    _worker_task = task
+
+def _process(filename):
+    return _call(_worker_task, filename)
+
+class WattleFanOut:
+    """
+      This mixin class is used by WattleTask commands which process every file of a
+      directory. Files are discovered once and fanned out across a pool of worker
+      processes sized to the available cores. Per-file results and errors are
+      collected and the aggregate progress is logged as files complete.
+
+      In process mode the command is pickled once per worker, so heavy resources
+      (models, connections) must be created on first use instead of in `__init__`,
+      and every worker process loads its own copy. Commands holding a model set the
+      class defaults `fanout_mode` (e.g. 'thread', one shared model) or
+      `fanout_workers`, process mode is then only used when given in params.
+      With a journal assigned, already processed files are skipped and every
+      completed file is checkpointed.
+
+      Params:
+          workers - number of workers (default: `fanout_workers`, available cores).
+          fanout  - process|thread|serial (default: `fanout_mode`, process).
+
+      Methods:
+          discover(path, ext)    - sorted file paths in `path` ending with `ext`.
+          process_file(filename) - must be implemented, returns the file result.
+          fan_out(files)         - dict of file results, raises WattleFanOutError
+                                   if any file failed.
+    """
+    fanout_mode    = 'process'
+    fanout_workers = None
+
+    def discover(self, path, ext):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(ext)]
+
+    def process_file(self, filename):
+        raise NotImplementedError("{}.process_file()".format(self.__class__.__name__))
+
+    def _fanout_config(self, files):
+        mode = self.params['fanout'] if 'fanout' in self.params else self.fanout_mode
+        workers = int(self.params['workers']) if 'workers' in self.params else self.fanout_workers
+        workers = workers if workers else available_cores()
+        if mode not in FANOUT_MODES:
+            raise WattleFanOutError("Unknown fan-out mode: {}".format(mode))
+        workers = max(1, min(workers, len(files)))
+        return ('serial' if workers == 1 else mode), workers
+
+    def _fanout_results(self, mode, workers, files):
+        if mode == 'serial':
+            for filename in files:
+                yield _call(self, filename)
+            return
+
+        if mode == 'thread':
+            executor = ThreadPoolExecutor(max_workers=workers)
+            futures = [executor.submit(_call, self, filename) for filename in files]
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,))
+            futures = [executor.submit(_process, filename) for filename in files]
+
+        with executor:
+            for future in as_completed(futures):
+                yield future.result()
+
+    def fan_out(self, files):
+        pending = [f for f in files if not self.processed(f)]
+        if len(pending) < len(files):
+            self.log.info("Already processed: {} file(s).".format(len(files) - len(pending)))
+        if not pending:
+            return {}
+
+        mode, workers = self._fanout_config(pending)
+        self.log.info("{}: {} file(s), {} {} worker(s).".format(self.name, len(pending), workers, mode))
+
+        results, errors, started = {}, {}, time.perf_counter()
+        for n, (filename, result, error) in enumerate(self._fanout_results(mode, workers, pending), 1):
+            if error is None:
+                results[filename] = result
+                self.checkpoint(filename)
+            else:
+                errors[filename] = error
+                self.log.error("{}: {}".format(filename, error))
+            self.log.info("{}: {}/{} file(s), {} error(s), {:.1f} s".format(
+                self.name, n, len(pending), len(errors), time.perf_counter() - started))
+
+        if errors:
+            raise WattleFanOutError("{} of {} file(s) failed: {}".format(
+                len(errors), len(pending), ", ".join(errors)))
+        return results
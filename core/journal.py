@@ -0,0 +1,110 @@
+import os
+import json
+import datetime
+import threading
+
+from etl.core.constants import DATE_FORMNAT
+
+JOURNAL_PATH = '.wattle-journal.jsonl'
+
+class WattleJournal:
+    """
+      This class persists the progress of a process run, so a failed run can be
+      resumed where it stopped. A command is recorded after it has finished, and
+      commands working on many files record each processed file.
+
+      The journal is an append-only JSON lines file, one event per line. Events are
+      written with a single append, so commands running in parallel threads or
+      processes can share the journal.
+
+      Constructor(log, config)
+          path - journal file path (default: .wattle-journal.jsonl).
+
+      Methods:
+          start(resume)         - load the journal to resume, or start a new run.
+          completed(task)       - True if the task finished in the resumed run.
+          complete(task)        - record a finished task.
+          processed(task, item) - True if the item (file) was processed by the task.
+          checkpoint(task, item)- record a processed item.
+          wrap(task, action)    - action skipped if completed, recorded when done.
+    """
+    def __init__(self, log, config=None):
+        config = config if config else {}
+        assert isinstance(config, dict)
+
+        self.log = log
+        self.path = config['path'] if 'path' in config else JOURNAL_PATH
+        self._completed = set()
+        self._processed = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _key(self, task):
+        return f"{task.step}:{task.__class__.__name__}:{task.name}"
+
+    def _append(self, event):
+        event['time'] = datetime.datetime.now().strftime(DATE_FORMNAT)
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue # last line of an interrupted write
+                if 'item' in event:
+                    self._processed.add((event['command'], event['item']))
+                else:
+                    self._completed.add(event['command'])
+
+    def start(self, resume=False):
+        self._completed.clear()
+        self._processed.clear()
+        if resume and os.path.exists(self.path):
+            self._load()
+            self.log.info("Resuming run: {} command(s) and {} file(s) completed.".format(
+                len(self._completed), len(self._processed)))
+            return
+
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+
+    def completed(self, task):
+        return self._key(task) in self._completed
+
+    def complete(self, task):
+        key = self._key(task)
+        self._completed.add(key)
+        self._append({'command': key})
+
+    def processed(self, task, item):
+        return (self._key(task), item) in self._processed
+
+    def checkpoint(self, task, item):
+        key = self._key(task)
+        self._processed.add((key, item))
+        self._append({'command': key, 'item': item})
+
+    def wrap(self, task, action):
+        def journaled():
+            if self.completed(task):
+                self.log.info("{}: completed in the previous run, skipped.".format(task.name))
+                return None
+            result = action()
+            self.complete(task)
+            return result
+        return journaled
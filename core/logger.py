@@ -3,7 +3,6 @@ import sys
 import datetime
 
 from etl.core.constants import MSG_MUST_HAVE
-from etl.utils.base import WattleUtils
 
 from logging import (getLogger, Logger, Formatter, StreamHandler, DEBUG, INFO, ERROR)
 from logging.handlers import TimedRotatingFileHandler
@@ -31,8 +30,11 @@ class WattleLogger(Logger):
         format = config['format'] if 'format' in config else None
 
         super().__init__(name, level)
+        self._config = config
 
         if path:
+            # imported here, etl.utils.base imports etl.core
+            from etl.utils.base import WattleUtils
             if not WattleUtils.path_exists(path):
                 raise FileNotFoundError(MSG_MUST_HAVE.format("Correct path"))
 
@@ -56,3 +58,7 @@ class WattleLogger(Logger):
         self.addHandler(console)
         # log.shutdown(); log.manager._clear_cache()
 
+    def __reduce__(self):
+        # Rebuild from config in a worker process, handlers can't be pickled.
+        return (self.__class__, (self._config,))
+
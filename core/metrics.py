@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import datetime
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+from etl.core.constants import DATE_FORMNAT
+
+PROC_IO         = '/proc/self/io'
+PROC_STATUS     = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+class WattleMetrics:
+    """
+      This class records execution metrics for each command of a run:
+          wall      - wall time in seconds.
+          cpu       - process CPU time in seconds, CPU time of the command's thread
+                      when `shared` (without the threads it started).
+          rss_start - resident set size of the process at the start in bytes.
+          rss_peak  - peak resident set size during the command above `rss_start`
+                      in bytes (the process peak is reset at the start on Linux,
+                      elsewhere it's the growth of the process lifetime peak).
+          mem_peak  - peak traced memory in bytes (only with `tracemalloc`).
+          rows_in   - rows read (reported by the command with `WattleTask.report`).
+          rows_out  - rows returned by the command.
+          bytes_read, bytes_written - process I/O during the command.
+          shared    - True if other commands were measured at the same time.
+
+      CPU, RSS, memory and I/O are process counters. With a thread scheduler
+      commands overlap, so for a command that ran alongside another one they would
+      include the other command: such records are `shared`, `cpu` is the CPU time
+      of the command's thread and rss_peak, mem_peak and the I/O bytes are None.
+      The RSS and tracemalloc peaks are reset only when no other command is being
+      measured. Counters can be reported from any thread of a command, counters
+      reported in a worker process are not collected. Stream runs
+      (`WattleProcess.stream`) are not measured. Metrics are only collected when a
+      WattleMetrics instance is assigned to a task, otherwise tasks run unchanged.
+
+      Constructor(log, config)
+          report      - JSON run report file path.
+          prometheus  - Prometheus textfile collector file path.
+          tracemalloc - True|False trace memory allocations (slow, default False).
+
+      Methods:
+          measure(task, action) - run action and record metrics for the task.
+          merge(records)        - add records collected in a worker process.
+          save()                - write JSON report and Prometheus textfile.
+    """
+    def __init__(self, log, config=None):
+        config = config if config else {}
+        assert isinstance(config, dict)
+
+        self.log = log
+        self.report_path = config['report'] if 'report' in config else None
+        self.prometheus_path = config['prometheus'] if 'prometheus' in config else None
+        self.tracemalloc = config['tracemalloc'] if 'tracemalloc' in config else False
+        self.started = datetime.datetime.now()
+        self.records = []
+        self._counters = {} # task id: reported counters
+        self._running = {}  # task id: shared flag of the measures in progress
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_counters'], state['_running'], state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.records = []
+        self._counters = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def _io(self):
+        try:
+            with open(PROC_IO) as f:
+                values = dict(line.split(':') for line in f)
+            return int(values['rchar']), int(values['wchar'])
+        except (OSError, KeyError, ValueError):
+            return None, None
+
+    def _status(self, key):
+        # VmRSS (current) or VmHWM (peak) resident set size in bytes
+        try:
+            with open(PROC_STATUS) as f:
+                for line in f:
+                    if line.startswith(key + ':'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _reset_peak(self):
+        # VmHWM is set to the current RSS (Linux 4.0+)
+        try:
+            with open(PROC_CLEAR_REFS, 'w') as f:
+                f.write('5')
+            return True
+        except OSError:
+            return False
+
+    def _maxrss(self):
+        if resource is None: return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _rss_peak(self, rss, reset, maxrss):
+        if reset:
+            peak = self._status('VmHWM')
+            if peak is not None and rss is not None:
+                return max(0, peak - rss)
+        # the lifetime peak only grows when the command exceeds an earlier peak
+        current = self._maxrss()
+        if current is None or maxrss is None: return None
+        return current - maxrss
+
+    def _rows(self, result):
+        if result is None or isinstance(result, (str, bytes)):
+            return None
+        try:
+            return len(result)
+        except TypeError:
+            return None
+
+    def _file_sizes(self, files):
+        return sum(os.path.getsize(f) for f in files if os.path.isfile(f))
+
+    def count(self, task, **counters):
+        with self._lock:
+            current = self._counters.get(id(task))
+            if current is None: return
+            for key, value in counters.items():
+                current[key] = current.get(key, 0) + value
+
+    def measure(self, task, action):
+        with self._lock:
+            self._counters[id(task)] = {}
+            alone = not self._running
+            # process counters of the measures in progress now include this command
+            for key in self._running: self._running[key] = True
+            self._running[id(task)] = not alone
+            # peaks are reset only when no other command is measured
+            if self.tracemalloc:
+                if not tracemalloc.is_tracing(): tracemalloc.start()
+                if alone: tracemalloc.reset_peak()
+            rss, reset, maxrss = self._status('VmRSS'), alone and self._reset_peak(), self._maxrss()
+        read, written = self._io()
+        cpu, thread_cpu, wall = time.process_time(), time.thread_time(), time.perf_counter()
+        error = None
+        try:
+            result = action()
+            return result
+        except Exception as e:
+            result, error = None, f"{e}"
+            raise
+        finally:
+            with self._lock:
+                shared = self._running.pop(id(task))
+            record = {
+                'name'    : task.name,
+                'class'   : task.__class__.__name__,
+                'wall'    : time.perf_counter() - wall,
+                'cpu'     : time.thread_time() - thread_cpu if shared else time.process_time() - cpu,
+                'rss_start': rss,
+                'rss_peak': None if shared else self._rss_peak(rss, reset, maxrss),
+                'mem_peak': tracemalloc.get_traced_memory()[1] if self.tracemalloc and not shared else None,
+                'rows_in' : None,
+                'rows_out': self._rows(result),
+                'error'   : error,
+                'shared'  : shared,
+            }
+            after_read, after_written = self._io()
+            if read is None:
+                record['bytes_read'] = self._file_sizes(task.inputs)
+                record['bytes_written'] = self._file_sizes(task.outputs)
+            elif shared:
+                record['bytes_read'] = record['bytes_written'] = None
+            else:
+                record['bytes_read'] = after_read - read
+                record['bytes_written'] = after_written - written
+            with self._lock:
+                record.update(self._counters.pop(id(task)))
+                self.records.append(record)
+            self.log.info("{name}: {wall:.3f} s wall, {cpu:.3f} s cpu, rows out: {rows_out}".format(**record))
+
+    def merge(self, records):
+        with self._lock:
+            self.records.extend(records)
+
+    def report(self):
+        return {
+            'started' : self.started.strftime(DATE_FORMNAT),
+            'finished': datetime.datetime.now().strftime(DATE_FORMNAT),
+            'commands': self.records,
+        }
+
+    def prometheus(self):
+        metrics = [
+            ('wall', 'wattle_command_wall_seconds', 'Command wall time in seconds.'),
+            ('cpu', 'wattle_command_cpu_seconds', 'Process CPU time used by the command.'),
+            ('rss_start', 'wattle_command_rss_start_bytes', 'Resident set size at the start of the command.'),
+            ('rss_peak', 'wattle_command_rss_peak_bytes', 'Peak resident set size growth during the command.'),
+            ('mem_peak', 'wattle_command_mem_peak_bytes', 'Peak traced memory of the command.'),
+            ('rows_in', 'wattle_command_rows_in', 'Rows read by the command.'),
+            ('rows_out', 'wattle_command_rows_out', 'Rows returned by the command.'),
+            ('bytes_read', 'wattle_command_read_bytes', 'Bytes read during the command.'),
+            ('bytes_written', 'wattle_command_written_bytes', 'Bytes written during the command.'),
+        ]
+        lines = []
+        for key, metric, text in metrics:
+            lines.append(f"# HELP {metric} {text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for record in self.records:
+                if record.get(key) is None: continue
+                name = record['name'].replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f"{metric}{{command=\"{name}\",class=\"{record['class']}\"}} {record[key]}")
+        return "\n".join(lines) + "\n"
+
+    def _write(self, file_path, text):
+        # textfile collectors may read at any time, so the file is replaced atomically
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, file_path)
+        self.log.info("Metrics saved: {}".format(file_path))
+
+    def save(self):
+        if self.report_path:
+            self._write(self.report_path, json.dumps(self.report(), indent=2, default=str))
+        if self.prometheus_path:
+            self._write(self.prometheus_path, self.prometheus())
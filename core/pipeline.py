@@ -0,0 +1,210 @@
+import time
+import queue
+import threading
+
+from etl.core.abstract import WattleComposite
+
+_END  = object()
+_SKIP = object()
+
+class WattlePipelineError(Exception):
+    pass
+
+class WattleStage:
+    """
+      This class is a single stage of a WattlePipeline.
+
+      Constructor(name, function, workers, queue, ordered)
+          function - called with each item, returns the item passed to the next
+                     stage, or None to drop it.
+          workers  - number of worker threads (default: 1).
+          queue    - max items waiting in front of the stage (default: 4).
+          ordered  - items are passed to the function in input order, the stage
+                     has a single worker (default: False).
+
+      Stats:
+          items     - items processed.
+          busy      - seconds spent in the function.
+          stall_in  - seconds workers waited for input (upstream is slower).
+          stall_out - seconds workers waited on a full queue (downstream is slower).
+          max_depth, mean_depth - input queue depth seen by the workers.
+    """
+    def __init__(self, name, function, workers=1, queue=4, ordered=False):
+        assert callable(function)
+        self.name = name
+        self.function = function
+        self.ordered = ordered
+        self.workers = 1 if ordered else max(1, int(workers))
+        self.queue = max(1, int(queue))
+        self.reset()
+
+    def reset(self):
+        self.stats = {
+            'stage': self.name, 'workers': self.workers, 'items': 0, 'busy': 0.0,
+            'stall_in': 0.0, 'stall_out': 0.0, 'max_depth': 0, 'mean_depth': 0.0,
+        }
+        self._depth, self._samples = 0, 0
+        self._running = self.workers
+        self._lock = threading.Lock()
+
+    def _add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def _sample(self, depth):
+        with self._lock:
+            self._depth += depth
+            self._samples += 1
+            self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+            self.stats['mean_depth'] = self._depth / self._samples
+
+class WattlePipeline(WattleComposite):
+    """
+      This class overlaps consecutive stages of a command. Each stage has its own
+      worker threads and a bounded input queue, so a slow stage blocks the stages in
+      front of it (backpressure) and memory stays flat however many items flow
+      through. Stage stats show the bottleneck: the slowest stage has the highest
+      busy time per worker, the stages before it stall on output and the stages
+      after it stall on input.
+
+      Methods:
+          add(stage)     - append a WattleStage.
+          remove(stage)  - remove a stage.
+          execute(items) - run items through all stages, returns the results of the
+                           last stage in input order.
+          stats()        - list of stage stats.
+          bottleneck()   - name of the stage with the highest busy time per worker.
+    """
+    def __init__(self, log, stages=None):
+        self.log = log
+        self.stages = list(stages) if stages else []
+
+    def add(self, stage):
+        assert isinstance(stage, WattleStage)
+        self.stages.append(stage)
+
+    def remove(self, stage):
+        self.stages.remove(stage)
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _feed(self, items, outbox):
+        try:
+            for seq, item in enumerate(items):
+                if not self._put(outbox, (seq, item)):
+                    return
+            self._put(outbox, _END)
+        except Exception as e:
+            self._fail(e)
+
+    def _process(self, stage, seq, value, outbox):
+        if value is not _SKIP:
+            started = time.perf_counter()
+            value = stage.function(value)
+            stage._add(items=1, busy=time.perf_counter() - started)
+            value = _SKIP if value is None else value
+
+        started = time.perf_counter()
+        self._put(outbox, (seq, value))
+        stage._add(stall_out=time.perf_counter() - started)
+
+    def _work(self, stage, inbox, outbox):
+        pending, expected = {}, 0
+        try:
+            while True:
+                started = time.perf_counter()
+                depth = inbox.qsize()
+                item = self._get(inbox)
+                stage._add(stall_in=time.perf_counter() - started)
+                if item is None:
+                    return
+                if item is _END:
+                    self._put(inbox, _END) # for the other workers of the stage
+                    break
+
+                stage._sample(depth)
+                seq, value = item
+                if not stage.ordered:
+                    self._process(stage, seq, value, outbox)
+                    continue
+
+                pending[seq] = value
+                while expected in pending:
+                    self._process(stage, expected, pending.pop(expected), outbox)
+                    expected += 1
+        except Exception as e:
+            self._fail(e)
+            return
+
+        with stage._lock:
+            stage._running -= 1
+            last = stage._running == 0
+        if last:
+            self._put(outbox, _END)
+
+    def execute(self, items):
+        if not self.stages:
+            raise WattlePipelineError("Pipeline has no stages.")
+
+        self._stop = threading.Event()
+        self._error = None
+        queues = [queue.Queue(maxsize=stage.queue) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.stages[-1].queue))
+
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for n, stage in enumerate(self.stages):
+            stage.reset()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(stage, queues[n], queues[n + 1]), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        results = []
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is None or item is _END:
+                    break
+                if item[1] is not _SKIP:
+                    results.append(item)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        for stats in self.stats():
+            self.log.debug("stage {stage}: {items} items, busy {busy:.3f} s, stall in {stall_in:.3f} s, "
+                "stall out {stall_out:.3f} s, max queue {max_depth}".format(**stats))
+        return [value for _, value in sorted(results, key=lambda r: r[0])]
+
+    def stats(self):
+        return [dict(stage.stats) for stage in self.stages]
+
+    def bottleneck(self):
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda s: s.stats['busy'] / s.workers).name
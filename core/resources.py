@@ -0,0 +1,118 @@
+import os
+import json
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+RESOURCES_MAX_SIZE = 8
+
+class WattleResourceError(Exception):
+    pass
+
+class WattleResources:
+    """
+      This class is a registry of heavy shared resources such as NLP models and
+      database connections. Resources are keyed by (kind, config), created once by
+      the factory registered for their kind and borrowed by commands, so a process
+      with ten NLP steps loads the model only once.
+
+      Borrowed resources are reference counted. Released resources stay cached and
+      the least recently used ones are closed when there are more than `max_size`
+      unused resources. The registry is thread-safe (a resource is created only once
+      even when borrowed by many threads), and a forked worker process starts with an
+      empty registry instead of sharing the parent's connections.
+
+      Constructor(max_size)
+          max_size - max number of unused resources kept (default: 8).
+
+      Methods:
+          register(kind, factory, close) - factory(config) creates, close(resource) closes.
+          borrow(kind, config)           - shared resource, created on first borrow.
+          release(kind, config)          - return a borrowed resource.
+          using(kind, config)            - context manager for borrow/release.
+          clear()                        - close all resources.
+    """
+    _factories = {}
+
+    def __init__(self, max_size=RESOURCES_MAX_SIZE):
+        self.max_size = max_size
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._entries = OrderedDict()
+        self._creating = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def register(cls, kind, factory, close=None):
+        cls._factories[kind] = (factory, close)
+
+    def _key(self, kind, config):
+        return (kind, json.dumps(config if config else {}, sort_keys=True, default=str))
+
+    def borrow(self, kind, config=None):
+        if kind not in self._factories:
+            raise WattleResourceError("Unknown resource kind: {}".format(kind))
+
+        key = self._key(kind, config)
+        with self._lock:
+            creating = self._creating.setdefault(key, threading.Lock())
+
+        with creating:
+            with self._lock:
+                if key in self._entries:
+                    entry = self._entries[key]
+                    entry['refs'] += 1
+                    self._entries.move_to_end(key)
+                    return entry['resource']
+
+            factory, _ = self._factories[kind]
+            resource = factory(config if config else {})
+
+            with self._lock:
+                self._entries[key] = {'resource': resource, 'refs': 1}
+                self._evict()
+            return resource
+
+    def release(self, kind, config=None):
+        key = self._key(kind, config)
+        with self._lock:
+            if key not in self._entries:
+                return
+            entry = self._entries[key]
+            entry['refs'] = max(0, entry['refs'] - 1)
+            self._evict()
+
+    @contextmanager
+    def using(self, kind, config=None):
+        resource = self.borrow(kind, config)
+        try:
+            yield resource
+        finally:
+            self.release(kind, config)
+
+    def _close(self, key, entry):
+        _, close = self._factories[key[0]]
+        if close:
+            close(entry['resource'])
+
+    def _evict(self):
+        unused = [key for key, entry in self._entries.items() if entry['refs'] == 0]
+        while len(unused) > self.max_size:
+            key = unused.pop(0)
+            self._close(key, self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            while self._entries:
+                key, entry = self._entries.popitem(last=False)
+                self._close(key, entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+# Registry shared by all commands of a process.
+resources = WattleResources()
@@ -0,0 +1,154 @@
+import os
+import time
+
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+    wait
+)
+
+SCHEDULER_MODES = ('serial', 'thread', 'process')
+
+class WattleSchedulerError(Exception):
+    pass
+
+def _execute(command):
+    return command.execute()
+
+def _execute_remote(command):
+    # metrics recorded in a worker process are sent back with the result
+    result = command.execute()
+    metrics = getattr(command, 'metrics', None)
+    return result, (metrics.records if metrics is not None else None)
+
+class WattleScheduler:
+    """
+      This class runs process commands as a dependency graph (DAG). A command is ready
+      when all the commands it depends on have finished. Ready commands are submitted to
+      a thread or process pool at the same time, so the wall-clock time of a process is
+      set by its critical path instead of the sum of all steps.
+
+      Dependencies are read from the command params:
+          name       - command name (default: class name).
+          depends_on - list of command names which must finish first.
+          inputs     - list of files the command reads (default: `input`).
+          outputs    - list of files the command writes (default: `output`).
+
+      A command depends on an earlier command when it reads or writes a file the earlier
+      command writes, or writes a file the earlier command reads.
+
+      Constructor(log, config)
+          mode     - serial|thread|process (default: thread).
+          workers  - pool size (default: cpu count).
+
+      Methods:
+          graph(commands) - dict of command index and set of indexes it depends on.
+          order(commands) - command indexes in a topological order.
+          run(commands)   - execute commands, results are returned in command order.
+    """
+    def __init__(self, log, config=None):
+        config = config if config else {}
+        assert isinstance(config, dict)
+
+        self.log = log
+        self.mode = config['mode'] if 'mode' in config else 'thread'
+        self.workers = int(config['workers']) if 'workers' in config else (os.cpu_count() or 1)
+
+        if self.mode not in SCHEDULER_MODES:
+            raise WattleSchedulerError("Unknown scheduler mode: {}".format(self.mode))
+
+        self.log.debug("{}.__init__({}, {})".format(self.__class__.__name__, self.mode, self.workers))
+
+    def _names(self, commands):
+        names = {}
+        for n, command in enumerate(commands):
+            name = getattr(command, 'name', command.__class__.__name__)
+            names.setdefault(name, []).append(n)
+        return names
+
+    def graph(self, commands):
+        names = self._names(commands)
+        graph = {n: set() for n in range(len(commands))}
+
+        for n, command in enumerate(commands):
+            for name in getattr(command, 'depends_on', []):
+                if name not in names:
+                    raise WattleSchedulerError("{} depends on unknown command: {}".format(command.name, name))
+                graph[n].update(i for i in names[name] if i != n)
+
+            reads  = set(getattr(command, 'inputs', []))
+            writes = set(getattr(command, 'outputs', []))
+            for i in range(n):
+                before_reads  = set(getattr(commands[i], 'inputs', []))
+                before_writes = set(getattr(commands[i], 'outputs', []))
+                if before_writes & (reads | writes) or before_reads & writes:
+                    graph[n].add(i)
+
+        return graph
+
+    def order(self, commands):
+        graph = self.graph(commands)
+        pending = {n: set(deps) for n, deps in graph.items()}
+        result = []
+
+        while pending:
+            ready = sorted(n for n, deps in pending.items() if not deps)
+            if not ready:
+                raise WattleSchedulerError("Cyclic dependencies: {}".format(
+                    [commands[n].name for n in sorted(pending)]))
+            for n in ready:
+                del pending[n]
+                result.append(n)
+            for deps in pending.values():
+                deps.difference_update(ready)
+
+        return result
+
+    def _run_serial(self, commands):
+        results = [None] * len(commands)
+        for n in self.order(commands):
+            results[n] = _execute(commands[n])
+        return results
+
+    def _run_pool(self, commands):
+        self.order(commands) # validates the graph before anything is submitted
+        graph = self.graph(commands)
+        pending = {n: set(deps) for n, deps in graph.items()}
+        results = [None] * len(commands)
+        running = {}
+
+        remote = self.mode == 'process'
+        Executor = ProcessPoolExecutor if remote else ThreadPoolExecutor
+        with Executor(max_workers=self.workers) as executor:
+            while pending or running:
+                for n in sorted(n for n, deps in pending.items() if not deps):
+                    del pending[n]
+                    self.log.debug("{}.submit({})".format(self.__class__.__name__, commands[n].name))
+                    action = _execute_remote if remote else _execute
+                    running[executor.submit(action, commands[n])] = (n, time.perf_counter())
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    n, started = running.pop(future)
+                    try:
+                        results[n] = future.result()
+                        if remote:
+                            results[n], records = results[n]
+                            if records: commands[n].metrics.merge(records)
+                    except Exception as e:
+                        self.log.error("{} failed: {}".format(commands[n].name, e))
+                        for other in running:
+                            other.cancel()
+                        raise
+                    self.log.debug("{} finished in {:.3f} s".format(commands[n].name, time.perf_counter() - started))
+                    for deps in pending.values():
+                        deps.discard(n)
+
+        return results
+
+    def run(self, commands):
+        self.log.debug("{}.run({})".format(self.__class__.__name__, len(commands)))
+        if self.mode == 'serial' or self.workers < 2:
+            return self._run_serial(commands)
+        return self._run_pool(commands)
@@ -0,0 +1,97 @@
+import queue
+import threading
+
+_END = object()
+
+class WattleStreamError(Exception):
+    pass
+
+class WattleStream:
+    """
+      This class chains commands in a streaming mode. The first command must be an
+      extractor (`batches`), followed by any number of transformers (`transform_batches`)
+      and optionally a loader (`load_batches`) as the last command. Record batches are
+      passed from one step to the next in memory instead of through intermediate files.
+
+      With `buffer` > 0 every step runs in its own thread and hands batches over through
+      a queue holding at most `buffer` batches, so the steps overlap while memory stays
+      bounded. With `buffer` 0 the steps are plain chained generators.
+
+      Constructor(log, config)
+          buffer - max batches held between two steps (default: 2).
+
+      Methods:
+          bounded(batches) - iterate batches through a bounded queue.
+          run(commands)    - loader result, or an iterator of batches if there is no loader.
+    """
+    def __init__(self, log, config=None):
+        config = config if config else {}
+        assert isinstance(config, dict)
+
+        self.log = log
+        self.buffer = int(config['buffer']) if 'buffer' in config else 2
+        self.log.debug("{}.__init__({})".format(self.__class__.__name__, self.buffer))
+
+    def _put(self, q, item, stop):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _bounded(self, batches):
+        q = queue.Queue(maxsize=self.buffer)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for batch in batches:
+                    if not self._put(q, (batch, None), stop):
+                        return
+                self._put(q, (_END, None), stop)
+            except Exception as e:
+                self._put(q, (_END, e), stop)
+            finally:
+                close = getattr(batches, 'close', None)
+                if close: close()
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch, error = q.get()
+                if batch is _END:
+                    if error: raise error
+                    return
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
+
+    def bounded(self, batches):
+        if self.buffer < 1:
+            return iter(batches)
+        return self._bounded(batches)
+
+    def run(self, commands):
+        self.log.debug("{}.run({})".format(self.__class__.__name__, len(commands)))
+        if len(commands) == 0 or not hasattr(commands[0], 'batches'):
+            raise WattleStreamError("Stream must start with an extract command.")
+
+        loader = commands[-1] if len(commands) > 1 and hasattr(commands[-1], 'load_batches') else None
+        transforms = commands[1:-1] if loader else commands[1:]
+
+        batches = self.bounded(commands[0].batches())
+        for command in transforms:
+            if not hasattr(command, 'transform_batches'):
+                raise WattleStreamError("{} is not a transform command.".format(command.name))
+            batches = self.bounded(command.transform_batches(batches))
+
+        if loader is None:
+            return batches
+
+        rows = loader.load_batches(batches)
+        self.log.info("{}: {} rows loaded.".format(loader.name, rows))
+        return rows
@@ -0,0 +1,52 @@
+import logging
+
+from etl.core.cache import WattleCache
+from etl.core.logger import WattleLogger
+from etl.commands import get_command
+from etl.benchmarks import stubs
+from etl.benchmarks import generators as gen
+
+class CountingCache(WattleCache):
+    """ WattleCache recording the commands it skipped. """
+    def __init__(self, log, config=None):
+        super().__init__(log, config)
+        self.hits = []
+
+    def _load(self, task, fingerprint):
+        hit, result = super()._load(task, fingerprint)
+        self.hits.append(hit)
+        return hit, result
+
+def _chain(log, path):
+    # PDFPapers writes a CSV per PDF, the transforms rewrite the CSVs in place
+    common = {'path': path, 'fanout': 'serial', 'num_threads': 1, 'min_threshold': 1, 'from_column': 'text'}
+    return [
+        get_command('PDFPapers')(log, {'path': path, 'min_words': 5, 'max_words': 400, 'max_length': 2000, 'fanout': 'serial'}),
+        get_command('GoogleTranslator')(log, dict(common, to_column='translated', src='en', dest='de', drop=False)),
+        get_command('HuggingFaceSummariser')(log, dict(common, to_column='summary', model='stub')),
+    ]
+
+def _run(log, path, cache):
+    cache.hits = []
+    for task in _chain(log, path):
+        task.cache = cache
+        task.execute()
+    return cache.hits
+
+def test_cache_chain(tmp_path):
+    stubs.install()
+    log = WattleLogger({'name': 'test', 'level': logging.ERROR})
+    path = f"{tmp_path}/papers/"
+    (tmp_path / 'papers').mkdir()
+    for n in range(2):
+        gen.pdf(f"{path}paper-{n}.pdf", 3, 10, n)
+    cache = CountingCache(log, {'path': f"{tmp_path}/cache"})
+
+    assert _run(log, path, cache) == [False, False, False]
+    # the transforms rewrote the CSV files of PDFPapers and their own inputs
+    assert _run(log, path, cache) == [True, True, True]
+
+    # a new PDF changes the input of PDFPapers, the CSVs it rewrites rerun the transforms
+    gen.pdf(f"{path}paper-2.pdf", 3, 10, 2)
+    assert _run(log, path, cache) == [False, False, False]
+    assert _run(log, path, cache) == [True, True, True]
@@ -1,11 +1,31 @@
-from etl.utils.gis import WattleGis
-from etl.utils.postgres import WattlePostgres
-from etl.utils.sqlalchemy import WattleSqlAlchemy
-from etl.utils.base import WattleUtils
+import importlib
+
+# Classes are imported on first access, so `import etl.utils` doesn't load
+# psycopg2, sqlalchemy, numpy or pandas until a class that needs them is used.
+_modules = {
+    'WattleFormat'    : 'etl.utils.formats',
+    'WattleGis'       : 'etl.utils.gis',
+    'WattlePostgres'  : 'etl.utils.postgres',
+    'WattleSqlAlchemy': 'etl.utils.sqlalchemy',
+    'WattleSQLite'    : 'etl.utils.sqlite',
+    'WattleUtils'     : 'etl.utils.base',
+}
 
 __all__ = [
+    'WattleFormat',
     'WattleGis',
     'WattlePostgres',
     'WattleSqlAlchemy',
+    'WattleSQLite',
     'WattleUtils'
-]
\ No newline at end of file
+]
+
+def __getattr__(name):
+    if name not in _modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_modules[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
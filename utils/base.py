@@ -1,5 +1,6 @@
 import os 
 import re
+import heapq
 import datetime
 import urllib
 
@@ -80,32 +81,31 @@ class WattleUtils:
         return df
 
     def unique(self, df, column):
-        return sorted(df[column].apply(lambda x: x.strip() if isinstance(x, str) else x).dropna().unique())
+        from etl.utils.profiler import strip
+        return sorted(strip(df[column]).dropna().unique())
 
     def show_distinct(self, df, col='', mx=10):
-        distinct, records = [], df.shape[0]
+        from etl.utils.profiler import ColumnProfile
         log = []
         if col in df.columns:
-            distinct = sorted(df[col].unique())
-            uniques = len(distinct)
-            nans = int(df[col].isna().sum())
-            itms = [ str(item) for item in distinct ]
-            show = mx if len(itms) > mx else len(itms)
+            profile = ColumnProfile(col)
+            profile.update(df[col])
+            itms = [ str(item) for item in profile.values(mx) ]
             log.append("\nField \"{}\" has ({}:{}) unique values and ({}) NaN entries found.\n>>> {}".format(
                 col,
-                show,
-                uniques,
-                nans,
-                ", ".join(itms[:show]))
+                len(itms),
+                profile.distinct,
+                profile.nulls,
+                ", ".join(itms))
             )
         return "{}".format(str(log))
 
     def get_field_unique_values(df, key, items=5, spaces=18):
-        unq = sorted(df[key].astype(str).unique())
+        unq = df[key].astype(str).fillna('nan').unique()
         if len(unq) > items:
-            return "{} : {} of ({}) values.".format(key.ljust(spaces), unq[:items], len(unq))
+            return "{} : {} of ({}) values.".format(key.ljust(spaces), heapq.nsmallest(items, unq), len(unq))
         else:
-            return "{} : [{}] of ({}) values.".format(key.ljust(spaces), ', '.join(unq), len(unq))
+            return "{} : [{}] of ({}) values.".format(key.ljust(spaces), ', '.join(sorted(unq)), len(unq))
 
     def get_dataframe_details(df, ticks, inrows=None):
         iserror = 'error' in df.columns
@@ -0,0 +1,267 @@
+import os
+import importlib.util
+
+import pandas as pd
+
+CSV     = 'csv'
+PARQUET = 'parquet'
+FEATHER = 'feather'
+
+EXTENSIONS = {
+    '.csv'    : CSV,
+    '.parquet': PARQUET,
+    '.pq'     : PARQUET,
+    '.feather': FEATHER,
+    '.arrow'  : FEATHER,
+}
+
+SUFFIXES = {CSV: '.csv', PARQUET: '.parquet', FEATHER: '.feather'}
+
+FEATHER_COMPRESSION = 'zstd'
+
+class WattleFormatError(Exception):
+    pass
+
+def has_pyarrow():
+    return importlib.util.find_spec('pyarrow') is not None
+
+class WattleFormat:
+    """
+      This class is the intermediate file format layer used by the commands.
+      CSV loses dtypes and has to be parsed again by every following command, so
+      intermediates can be written as Parquet or Feather (Arrow IPC) instead, which
+      keep dtypes, are compressed, and are read back column by column.
+
+      Files are read in the format of their extension (so a command reads whatever
+      the previous command wrote) and written in the given `format`. CSV files are
+      parsed with the multi-threaded pyarrow engine when pyarrow is installed.
+
+      Constructor(format)
+          format - csv|parquet|feather (default: by file extension, csv otherwise).
+
+      Methods:
+          suffix            - file extension of the format, e.g. `.parquet`.
+          path(file_path)   - file path with the extension of the format.
+          read(file_path, columns)       - DataFrame, only `columns` are read.
+          chunks(file_path, size, columns) - DataFrames of at most `size` rows.
+          write(df, file_path)           - save a DataFrame.
+          writer(file_path)              - WattleFormatWriter appending DataFrames.
+    """
+    def __init__(self, format=None):
+        if format is not None and format not in SUFFIXES:
+            raise WattleFormatError("Unknown format: {} (expected one of {}).".format(format, ', '.join(SUFFIXES)))
+        self.format = format
+
+    @property
+    def suffix(self):
+        return SUFFIXES[self.format if self.format else CSV]
+
+    def path(self, file_path):
+        if self.format is None:
+            return file_path
+        return os.path.splitext(file_path)[0] + self.suffix
+
+    def detect(self, file_path):
+        ext = os.path.splitext(f"{file_path}")[1].lower()
+        return EXTENSIONS[ext] if ext in EXTENSIONS else None
+
+    def _read_format(self, file_path):
+        detected = self.detect(file_path)
+        if detected: return detected
+        return self.format if self.format else CSV
+
+    def _write_format(self, file_path):
+        if self.format: return self.format
+        detected = self.detect(file_path)
+        return detected if detected else CSV
+
+    def read(self, file_path, columns=None, **kwargs):
+        columns = list(columns) if columns else None
+        fmt = self._read_format(file_path)
+        if fmt == PARQUET:
+            return pd.read_parquet(file_path, columns=columns)
+        if fmt == FEATHER:
+            return pd.read_feather(file_path, columns=columns)
+        if has_pyarrow() and 'engine' not in kwargs:
+            kwargs['engine'] = 'pyarrow'
+        return pd.read_csv(file_path, usecols=columns, **kwargs)
+
+    def chunks(self, file_path, size, columns=None, **kwargs):
+        columns = list(columns) if columns else None
+        size = int(size)
+        fmt = self._read_format(file_path)
+        if fmt == PARQUET:
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(file_path).iter_batches(batch_size=size, columns=columns):
+                yield batch.to_pandas()
+        elif fmt == FEATHER:
+            import pyarrow as pa
+            with pa.memory_map(file_path, 'r') as source:
+                reader = pa.ipc.open_file(source)
+                for n in range(reader.num_record_batches):
+                    batch = reader.get_batch(n)
+                    if columns: batch = batch.select(columns)
+                    for offset in range(0, batch.num_rows, size):
+                        yield batch.slice(offset, size).to_pandas()
+        else:
+            # the pyarrow engine doesn't support chunks
+            with pd.read_csv(file_path, usecols=columns, chunksize=size, **kwargs) as reader:
+                for chunk in reader:
+                    yield chunk
+
+    def write(self, df, file_path, **kwargs):
+        fmt = self._write_format(file_path)
+        if fmt == PARQUET:
+            df.to_parquet(file_path, index=False, **kwargs)
+        elif fmt == FEATHER:
+            kwargs.setdefault('compression', FEATHER_COMPRESSION)
+            df.reset_index(drop=True).to_feather(file_path, **kwargs)
+        else:
+            df.to_csv(file_path, index=False, **kwargs)
+        return file_path
+
+    def writer(self, file_path):
+        return WattleFormatWriter(self._write_format(file_path), file_path)
+
+def _common_type(a, b):
+    import pyarrow as pa
+    if a.equals(b) or pa.types.is_null(b): return a
+    if pa.types.is_null(a): return b
+    try:
+        return pa.unify_schemas([pa.schema([('_', a)]), pa.schema([('_', b)])], promote_options='permissive').field('_').type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, NotImplementedError):
+        # no common type (e.g. numbers and text), values are kept as text
+        for t in (a, b):
+            if pa.types.is_string(t) or pa.types.is_large_string(t): return t
+        return pa.large_string()
+
+def promote_schema(schema, other):
+    """
+      Schema wide enough for the rows of both schemas: null columns take the type
+      of the other schema, numbers are widened (int -> float) and columns without
+      a common type become text. Returns `schema` itself when nothing changes.
+    """
+    import pyarrow as pa
+    if other.names != schema.names:
+        raise WattleFormatError("Chunk columns {} don't match {}.".format(other.names, schema.names))
+    fields = [f.with_type(_common_type(f.type, other.field(n).type)) for n, f in zip(schema.names, schema)]
+    # without the pandas metadata of the first chunk, which would restore its dtypes
+    promoted = pa.schema(fields)
+    return schema if promoted.equals(schema) else promoted
+
+def conform(table, schema):
+    """ Table with the columns and types of `schema`. """
+    table = table.select(schema.names)
+    return table if table.schema.equals(schema) else table.cast(schema)
+
+def _row_groups(file_path, format):
+    # the schema, then one table per row group (record batch), so they are kept
+    import pyarrow as pa
+    if format == PARQUET:
+        import pyarrow.parquet as pq
+        with pq.ParquetFile(file_path) as f:
+            yield f.schema_arrow
+            for n in range(f.num_row_groups):
+                yield f.read_row_group(n)
+    else:
+        with pa.memory_map(file_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            yield reader.schema
+            for n in range(reader.num_record_batches):
+                yield pa.Table.from_batches([reader.get_batch(n)])
+
+def _open_writer(file_path, format, schema, **kwargs):
+    import pyarrow as pa
+    if format == PARQUET:
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(file_path, schema, **kwargs)
+    options = pa.ipc.IpcWriteOptions(compression=FEATHER_COMPRESSION)
+    return pa.ipc.new_file(file_path, schema, options=options)
+
+def copy_promoted(source, target, format, schema, writer=None, **kwargs):
+    """
+      Copies a Parquet or Feather file row group by row group to `target` with the
+      (promoted) `schema`, columns missing in the file (e.g. partition columns) are
+      skipped. Returns the open writer when one is given, otherwise closes it.
+      `kwargs` are options of a new Parquet writer (compression, use_dictionary).
+    """
+    import pyarrow as pa
+    tables = _row_groups(source, format)
+    file_schema = next(tables)
+    target_schema = pa.schema([schema.field(n) for n in file_schema.names])
+    owned = writer is None
+    if owned: writer = _open_writer(target, format, target_schema, **kwargs)
+    for table in tables:
+        writer.write_table(table.cast(target_schema))
+    if owned: writer.close()
+    return writer
+
+def rewrite(file_path, schema, **kwargs):
+    """ Rewrites a Parquet or Feather file in place with a (promoted) schema. """
+    format = WattleFormat().detect(file_path)
+    tmp_path = f"{file_path}.tmp"
+    copy_promoted(file_path, tmp_path, format, schema, **kwargs)
+    os.replace(tmp_path, file_path)
+
+class WattleFormatWriter:
+    """
+      Appends DataFrames to a single file, so large inputs can be written chunk by
+      chunk. Parquet chunks become row groups, Feather chunks record batches.
+
+      Chunks are inferred on their own, so a later chunk can have a wider type than
+      the first one (e.g. a column empty in the first chunk, or floats after ints).
+      The schema is then promoted with `promote_schema`, and the rows written so far
+      are copied into a new file with it, batch by batch.
+    """
+    def __init__(self, format, file_path):
+        self.format = format
+        self.file_path = file_path
+        self.rows = 0
+        self._written = False
+        self._writer = None
+        self._schema = None
+        self._path = file_path
+        self._promotions = 0
+
+    def _promote(self, schema):
+        # a Parquet/Arrow file can't change its schema, rows so far are copied
+        self._writer.close()
+        self._promotions += 1
+        path = f"{self.file_path}.{self._promotions}.tmp"
+        self._writer = copy_promoted(self._path, path, self.format, schema, _open_writer(path, self.format, schema))
+        if self._path != self.file_path: os.remove(self._path)
+        self._path, self._schema = path, schema
+
+    def write(self, df):
+        if self.format == CSV:
+            df.to_csv(self.file_path, mode='a' if self._written else 'w', header=not self._written, index=False)
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = _open_writer(self._path, self.format, self._schema)
+            else:
+                schema = promote_schema(self._schema, table.schema)
+                if schema is not self._schema:
+                    self._promote(schema)
+                table = conform(table, self._schema)
+            self._writer.write_table(table)
+        self._written = True
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            if self._path != self.file_path:
+                os.replace(self._path, self.file_path)
+                self._path = self.file_path
+        elif not self._written and self.format == CSV:
+            open(self.file_path, 'w').close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,17 +1,151 @@
+import io
 import os
 import re
+import csv
 import time
 import datetime
+import threading
 import psycopg2
+import psycopg2.pool
+import psycopg2.extras
+import itertools
 import numpy as np
 import pandas as pd
 
 from etl.core.constants import MSG_NOT_FOUND
+from etl.core.resources import WattleResources, resources
 
 class WattlePostgresError(Exception):
     pass
 
+COPY_BUFFER = 1 << 20
+PAGE_SIZE   = 1000
+
+WattleResources.register('postgres', lambda config: psycopg2.connect(**config), lambda conn: conn.close())
+class BlockingPool(psycopg2.pool.ThreadedConnectionPool):
+    """ Thread-safe pool waiting for a free connection instead of raising when exhausted. """
+    def __init__(self, maxconn, **kwargs):
+        super().__init__(1, maxconn, **kwargs)
+        self._free = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        self._free.acquire()
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._free.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._free.release()
+
+WattleResources.register('postgres-pool',
+    lambda config: BlockingPool(config['pool'], **config['connection']),
+    lambda pool: pool.closeall())
+
+def integral(df):
+    """
+      DataFrame with float columns holding only whole numbers converted to Int64: an
+      integer column with nulls is float64 in pandas, and the `5.0` it is written as
+      is rejected by PostgreSQL integer columns (numeric and float accept `5`).
+    """
+    converted = {}
+    for name in df.columns:
+        series = df[name]
+        if series.dtype.kind != 'f' or isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            continue
+        values = series.to_numpy()
+        values = values[~np.isnan(values)]
+        if len(values) and np.isfinite(values).all() and (values == np.trunc(values)).all() and np.abs(values).max() < 2 ** 53:
+            converted[name] = series.astype('Int64')
+    return df.assign(**converted) if converted else df
+
+class CopyBuffer(io.RawIOBase):
+    """
+      Read-only file-like adapter over an iterator of record batches, used as the
+      source of `COPY ... FROM STDIN`. Batches are encoded to CSV one at a time when
+      COPY reads from the buffer, so nothing is written to disk and only one batch
+      is held as text. Batches can be DataFrames, pyarrow RecordBatches/Tables,
+      lists of rows (tuples or lists) or already encoded str/bytes. Whole-number
+      float columns of DataFrames are written as integers (see `integral`).
+    """
+    def __init__(self, batches, columns=None):
+        self._batches = iter(batches)
+        self._columns = columns
+        self._pending = b''
+        self._offset = 0
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def _encode(self, batch):
+        if isinstance(batch, bytes):
+            return batch
+        if isinstance(batch, str):
+            return batch.encode('utf-8')
+        if isinstance(batch, pd.DataFrame):
+            self.rows += len(batch)
+            if self._columns: batch = batch[self._columns]
+            return integral(batch).to_csv(header=False, index=False).encode('utf-8')
+        if hasattr(batch, 'num_rows') and hasattr(batch, 'schema'): # pyarrow
+            import pyarrow.csv
+            self.rows += batch.num_rows
+            if self._columns: batch = batch.select(self._columns)
+            out = io.BytesIO()
+            pyarrow.csv.write_csv(batch, out, pyarrow.csv.WriteOptions(include_header=False))
+            return out.getvalue()
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator='\n')
+        for row in batch:
+            writer.writerow(row)
+            self.rows += 1
+        return text.getvalue().encode('utf-8')
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        while len(self._pending) - self._offset < size:
+            batch = next(self._batches, None)
+            if batch is None: break
+            self._pending = self._pending[self._offset:] + self._encode(batch)
+            self._offset = 0
+        data = memoryview(self._pending)[self._offset:self._offset + size]
+        buffer[:len(data)] = data
+        self._offset += len(data)
+        return len(data)
+
 class WattlePostgres:
+    """
+      This class is a simple psycopg2 wrapper. Every instance opens its own
+      connection, unless `shared` is True: instances with the same connection
+      parameters then share one connection (and its transaction) from the resource
+      registry. With `pool` every instance takes its own connection from a shared
+      thread-safe pool of at most `pool` connections and returns it on `close`, so
+      one instance per thread can load in parallel. Each instance has its own cursor.
+      A transaction left open is rolled back when a shared or pooled connection is
+      given back.
+
+      `copy_dataframe` and `copy_iter` stream DataFrames or record batches straight
+      into `COPY ... FROM STDIN` through a CopyBuffer, without temporary files.
+
+      Constructor(**kwargs)
+          user, pswd, host, port, dbname - connection parameters.
+          logger  - WattleLogger instance.
+          verbose - print log entries when logger isn't given (default: True).
+          shared  - borrow a shared connection (default: False).
+          pool    - max connections of a shared pool, takes a pooled connection (optional).
+
+      Methods:
+          copy(file_path, table)            - load a tab separated file.
+          expert(sql, file)                 - copy_expert with a file path or object.
+          copy_dataframe(table, df, columns, chunksize) - load a DataFrame, returns rows.
+          copy_iter(table, batches, columns)            - load record batches, returns rows.
+          executemany(sql, data, page_size)             - batched execute of any statement.
+          insert(table, rows, columns, ...)             - multi-row insert/upsert, returns rows.
+    """
     def __init__(self, **kwargs):
         _user = kwargs['user'] if 'user' in kwargs else None
         _pswd = kwargs['pswd'] if 'pswd' in kwargs else None
@@ -20,13 +154,23 @@ class WattlePostgres:
         _dbname = kwargs['dbname'] if 'dbname' in kwargs else None
         self.logger  = kwargs['logger'] if 'logger' in kwargs else None
         self.verbose = kwargs['verbose'] if 'verbose' in kwargs else True
-        self.conn=psycopg2.connect(
+        self.shared  = kwargs['shared'] if 'shared' in kwargs else False
+        self.pool    = kwargs['pool'] if 'pool' in kwargs else None
+        self._config = dict(
             host=_host,
             port=_port,
             user=_user,
             password=_pswd,
             database=_dbname
         )
+        if self.pool:
+            self._pool_config = {'pool': int(self.pool), 'connection': self._config}
+            self._pool = resources.borrow('postgres-pool', self._pool_config)
+            self.conn = self._pool.getconn()
+        elif self.shared:
+            self.conn = resources.borrow('postgres', self._config)
+        else:
+            self.conn = psycopg2.connect(**self._config)
         self.cursor = self.conn.cursor()
 
     def log(self, text):
@@ -40,8 +184,8 @@ class WattlePostgres:
             print(entry)
 
     def read_sql_file(self, file_path):       
-        if not os.path.exists(self._input):
-            msg = MSG_NOT_FOUND.format("File", self._input)
+        if not os.path.exists(file_path):
+            msg = MSG_NOT_FOUND.format("File", file_path)
             self.log(msg)
             raise FileNotFoundError(msg)
 
@@ -54,10 +198,83 @@ class WattlePostgres:
             return self.cursor.rowcount
         except Exception as e:
             msg = f"ERROR: WattlePostgress.execute: {e}"
+            if hasattr(sql, 'as_string'): sql = sql.as_string(self.conn) # psycopg2.sql
             raise Exception(f"{msg}\n{sql}")
 
-    def executemany(self, sql, data):
-        self.cursor.executemany(sql, data)
+    def executemany(self, sql, data, page_size=PAGE_SIZE):
+        # sends `page_size` statements per round-trip instead of one per row
+        psycopg2.extras.execute_batch(self.cursor, sql, data, page_size=page_size)
+
+    def _rows(self, rows):
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.astype(object).where(rows.notna(), None)
+            return rows.itertuples(index=False, name=None)
+        return iter(rows)
+
+    def _insert_sql(self, table, columns, conflict, update):
+        fields = ', '.join('"{}"'.format(c) for c in columns)
+        sql = f"INSERT INTO {table} ({fields}) VALUES %s"
+        if conflict:
+            keys = ', '.join('"{}"'.format(c) for c in conflict)
+            update = [c for c in columns if c not in conflict] if update is None else update
+            if update:
+                values = ', '.join('"{0}" = EXCLUDED."{0}"'.format(c) for c in update)
+                sql += f" ON CONFLICT ({keys}) DO UPDATE SET {values}"
+            else:
+                sql += f" ON CONFLICT ({keys}) DO NOTHING"
+        return sql
+
+    def _prepare(self, name, sql, width, page_size):
+        # server-side prepared statement for a full page, e.g. VALUES ($1, $2), ($3, $4)
+        values = ', '.join('({})'.format(', '.join(f"${p * width + n + 1}" for n in range(width))) for p in range(page_size))
+        self.cursor.execute(f"PREPARE {name} AS {sql.replace('%s', values)}")
+        return f"EXECUTE {name} ({', '.join(['%s'] * width * page_size)})"
+
+    def insert(self, table, rows, columns, page_size=PAGE_SIZE, conflict=None, update=None, prepare=False, commit_every=None):
+        """
+          Inserts rows (tuples or a DataFrame) with multi-row VALUES of `page_size`
+          rows per statement. With `conflict` key columns it's an upsert updating
+          `update` columns (default: all other columns, [] does nothing on conflict).
+          `prepare` plans the page statement once on the server, `commit_every`
+          commits after every N rows instead of once at the end.
+        """
+        columns = list(columns)
+        sql = self._insert_sql(table, columns, conflict, update)
+        prepared = None
+        if prepare:
+            name = "wattle_insert_{}".format(abs(hash((sql, page_size))))
+            prepared = self._prepare(name, sql, len(columns), page_size)
+
+        rows, total, uncommitted = self._rows(rows), 0, 0
+        started = time.perf_counter()
+        try:
+            while True:
+                page = list(itertools.islice(rows, page_size))
+                if not page: break
+                if prepared and len(page) == page_size:
+                    self.cursor.execute(prepared, [value for row in page for value in row])
+                else:
+                    psycopg2.extras.execute_values(self.cursor, sql, page, page_size=page_size)
+                total += len(page)
+                uncommitted += len(page)
+                if commit_every and uncommitted >= commit_every:
+                    self.commit()
+                    uncommitted = 0
+            # deallocated within the last transaction, so the connection is left idle
+            if prepared:
+                self.cursor.execute(f"DEALLOCATE {name}")
+                prepared = None
+            self.commit()
+        except Exception:
+            self.conn.rollback()
+            if prepared: # prepared statements outlive the transaction
+                self.cursor.execute(f"DEALLOCATE {name}")
+                self.commit()
+            raise
+
+        seconds = time.perf_counter() - started
+        self.log(f"INSERT {table}: {total} rows in {seconds:.3f} s ({total / seconds if seconds else 0:.0f} rows/s)")
+        return total
 
     def selects(self, lista):
         assert isinstance(lista, list)
@@ -67,21 +284,58 @@ class WattlePostgres:
             res.append( self.cursor.fetchall() )
         return res
 
-    def copy(self, file_path, table):
-        if not os.path.exists(self._input):
-            msg = MSG_NOT_FOUND.format("File", self._input)
+    def copy(self, file_path, table, sep='\t'):
+        if not os.path.exists(file_path):
+            msg = MSG_NOT_FOUND.format("File", file_path)
             self.log(msg)
             raise FileNotFoundError(msg)
         with open(file_path, 'r') as file:
-            self.cursor.copy_from(file.read(), table) 
+            self.cursor.copy_from(file, table, sep=sep, size=COPY_BUFFER)
         self.commit()
 
     def expert(self, sql, file):
-        self.cursor.copy_expert(file, path)
+        if isinstance(file, str):
+            with open(file, 'r') as f:
+                self.cursor.copy_expert(sql, f, size=COPY_BUFFER)
+        else:
+            self.cursor.copy_expert(sql, file, size=COPY_BUFFER)
         self.commit()
 
+    def _copy_sql(self, table, columns):
+        fields = " ({})".format(', '.join('"{}"'.format(c) for c in columns)) if columns else ""
+        return f"COPY {table}{fields} FROM STDIN WITH (FORMAT CSV)"
+
+    def copy_iter(self, table, batches, columns=None, commit=True):
+        started = time.perf_counter()
+        source = CopyBuffer(batches, columns)
+        try:
+            self.cursor.copy_expert(self._copy_sql(table, columns), source, size=COPY_BUFFER)
+        except Exception:
+            self.conn.rollback()
+            raise
+        if commit: self.commit()
+        seconds = time.perf_counter() - started
+        rows = self.cursor.rowcount if self.cursor.rowcount >= 0 else source.rows
+        self.log(f"COPY {table}: {rows} rows in {seconds:.3f} s ({rows / seconds if seconds else 0:.0f} rows/s)")
+        return rows
+
+    def copy_dataframe(self, table, df, columns=None, chunksize=100000, commit=True):
+        columns = list(columns) if columns else list(df.columns)
+        chunks = (df.iloc[n:n + chunksize] for n in range(0, len(df), chunksize))
+        return self.copy_iter(table, chunks, columns, commit)
+
     def commit(self):
         self.conn.commit()
 
     def close(self):
-        self.conn.close()
+        self.cursor.close()
+        if self.pool:
+            self._pool.putconn(self.conn)
+            resources.release('postgres-pool', self._pool_config)
+        elif self.shared:
+            # an uncommitted transaction would stay open, holding its locks
+            if self.conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                self.conn.rollback()
+            resources.release('postgres', self._config)
+        else:
+            self.conn.close()
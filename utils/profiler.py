@@ -0,0 +1,199 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+PROFILER_EXACT     = 100000 # distinct values counted exactly before switching to HyperLogLog
+PROFILER_TOP       = 10
+PROFILER_PRECISION = 14     # 2^14 registers, ~0.8% standard error
+
+def strip(series):
+    """ Strips string values of a column, other values are kept as they are. """
+    if series.dtype.kind not in 'OSU' and not pd.api.types.is_string_dtype(series):
+        return series
+    stripped = series.str.strip()
+    return stripped.where(stripped.notna(), series)
+
+class HyperLogLog:
+    """
+      Approximate distinct count with a fixed memory of 2^precision bytes.
+      Values are hashed in a single vectorized call per chunk.
+    """
+    def __init__(self, precision=PROFILER_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        if len(values) == 0: return
+        hashes = pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy(dtype=np.uint64)
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes << p
+        # rank = position of the leftmost 1 bit of the remaining 64 - p bits
+        bits = np.zeros(len(rest), dtype=np.int64)
+        nonzero = rest > 0
+        bits[nonzero] = np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.int64) + 1
+        rank = np.minimum(64 - bits + 1, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        assert self.precision == other.precision
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros) # linear counting for small cardinalities
+        return int(round(estimate))
+
+class ColumnProfile:
+    """ Running stats of a single column. """
+    def __init__(self, name, exact=PROFILER_EXACT, top=PROFILER_TOP, precision=PROFILER_PRECISION):
+        self.name = name
+        self.exact = exact
+        self.top = top
+        self.precision = precision
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.ordered = True
+        self.counts = pd.Series(dtype=np.int64)
+        self.hll = None
+
+    def _min_max(self, values):
+        if not self.ordered: return
+        try:
+            low, high = values.min(), values.max()
+            # chunks can be inferred with different dtypes, e.g. numbers then text
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        except TypeError: # mixed types can't be ordered
+            self.min, self.max, self.ordered = None, None, False
+
+    def _add_counts(self, counts):
+        self.counts = self.counts.add(counts, fill_value=0).astype(np.int64) if len(self.counts) else counts.astype(np.int64)
+        if self.hll is None and len(self.counts) > self.exact:
+            self.hll = HyperLogLog(self.precision)
+            self.hll.update(self.counts.index.to_series())
+        if self.hll is not None:
+            # keep the heaviest values only, top-k becomes approximate
+            self.counts = self.counts.nlargest(max(self.top * 100, 1000))
+
+    def update(self, series):
+        self.count += len(series)
+        values = strip(series).dropna()
+        self.nulls += len(series) - len(values)
+        if len(values) == 0: return
+
+        self._min_max(values)
+        if self.hll is not None:
+            self.hll.update(values)
+        self._add_counts(values.value_counts(sort=False))
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        if not other.ordered:
+            self.min, self.max, self.ordered = None, None, False
+        for value in (other.min, other.max):
+            if value is not None: self._min_max(pd.Series([value]))
+        if other.hll is not None:
+            if self.hll is None:
+                self.hll = HyperLogLog(self.precision)
+                self.hll.update(self.counts.index.to_series())
+            self.hll.merge(other.hll)
+        elif self.hll is not None:
+            self.hll.update(other.counts.index.to_series())
+        self._add_counts(other.counts)
+
+    @property
+    def approximate(self):
+        return self.hll is not None
+
+    @property
+    def distinct(self):
+        return self.hll.count() if self.hll is not None else len(self.counts)
+
+    def values(self, limit=None):
+        """ Smallest distinct values (all if exact and no limit). """
+        index = self.counts.index
+        if limit is None:
+            return sorted(index)
+        return heapq.nsmallest(limit, index)
+
+    def most_common(self, top=None):
+        counts = self.counts.nlargest(top if top else self.top)
+        return [(value, int(count)) for value, count in counts.items()]
+
+    def stats(self):
+        return {
+            'column'     : self.name,
+            'count'      : self.count,
+            'nulls'      : self.nulls,
+            'min'        : self.min,
+            'max'        : self.max,
+            'distinct'   : self.distinct,
+            'approximate': self.approximate,
+            'top'        : self.most_common(),
+        }
+
+class WattleProfiler:
+    """
+      This class profiles DataFrame columns in a single vectorized pass: count,
+      nulls, min/max, distinct count and top-k values. Distinct values are counted
+      exactly until a column has more than `exact` of them, then the count switches
+      to HyperLogLog and top-k keeps only the heaviest values, so memory stays bounded
+      on high-cardinality columns. String values are stripped before counting.
+
+      Profiles are updated chunk by chunk, and profiles built on different chunks
+      (e.g. in worker processes) can be merged.
+
+      Constructor(columns, exact, top, precision)
+          columns   - columns to profile (default: all columns).
+          exact     - max distinct values counted exactly (default: 100000).
+          top       - number of most common values (default: 10).
+          precision - HyperLogLog precision (default: 14).
+
+      Methods:
+          update(df)      - add a DataFrame (chunk).
+          merge(profiler) - add the profiles of another profiler.
+          profile(column) - ColumnProfile of a column.
+          stats()         - list of column stats dicts.
+    """
+    def __init__(self, columns=None, exact=PROFILER_EXACT, top=PROFILER_TOP, precision=PROFILER_PRECISION):
+        self.columns = list(columns) if columns else None
+        self.exact = exact
+        self.top = top
+        self.precision = precision
+        self.rows = 0
+        self.profiles = {}
+
+    def _profile(self, column):
+        if column not in self.profiles:
+            self.profiles[column] = ColumnProfile(column, self.exact, self.top, self.precision)
+        return self.profiles[column]
+
+    def update(self, df):
+        self.rows += len(df)
+        for column in (self.columns if self.columns else df.columns):
+            self._profile(column).update(df[column])
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        for column, profile in other.profiles.items():
+            self._profile(column).merge(profile)
+        return self
+
+    def profile(self, column):
+        return self.profiles[column] if column in self.profiles else None
+
+    def stats(self):
+        return [profile.stats() for profile in self.profiles.values()]
+
+    def __getitem__(self, column):
+        return self.profiles[column]
@@ -0,0 +1,155 @@
+import os
+import io
+import json
+import threading
+
+import pandas as pd
+
+SCHEMA_CACHE  = '.wattle-schema.json'
+SCHEMA_SAMPLE = 10000      # rows read from the head of a file
+SCHEMA_TAIL   = 1 << 20    # bytes read from the end of a file
+VARCHAR_SIZE  = 255
+
+# pandas dtype kinds ordered from the narrowest to the widest
+WIDTH = {'b': 0, 'i': 1, 'u': 1, 'f': 2, 'O': 3}
+
+PG_TYPES = {
+    'b': 'BOOLEAN',
+    'i': 'BIGINT',
+    'u': 'BIGINT',
+    'f': 'DOUBLE PRECISION',
+}
+
+class WattleSchemaError(Exception):
+    pass
+
+class WattleSchema:
+    """
+      This class infers PostgreSQL column types of a CSV file from a bounded sample
+      instead of parsing the whole file: the first `sample` rows and the last
+      `tail` bytes. Types are widened safely, a column is the widest type seen in
+      either sample (boolean < integer < float < text), integers are
+      always BIGINT and text becomes TEXT when a sampled value doesn't fit VARCHAR(255).
+
+      Inferred schemas are cached in a JSON file keyed by file path, size and mtime,
+      so generating scripts again for unchanged files doesn't read them at all.
+
+      Constructor(log, config)
+          cache  - cache file path (default: .wattle-schema.json), False disables it.
+          sample - rows sampled from the head of a file (default: 10000).
+          tail   - bytes sampled from the end of a file (default: 1 MiB).
+
+      Methods:
+          infer(file_path) - list of (column, PostgreSQL type).
+          clear()          - remove the cache file.
+    """
+    def __init__(self, log, config=None):
+        config = config if config else {}
+        assert isinstance(config, dict)
+
+        self.log = log
+        self.path = config['cache'] if 'cache' in config else SCHEMA_CACHE
+        self.sample = int(config['sample']) if 'sample' in config else SCHEMA_SAMPLE
+        self.tail = int(config['tail']) if 'tail' in config else SCHEMA_TAIL
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                self.log.warning("Schema cache ignored: {}: {}".format(self.path, e))
+        return self._entries
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _key(self, file_path):
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sample': self.sample, 'tail': self.tail}
+
+    def _read_tail(self, file_path, names):
+        size = os.path.getsize(file_path)
+        if size <= self.tail:
+            return None
+        with open(file_path, 'rb') as f:
+            f.seek(size - self.tail)
+            block = f.read()
+        # the first line is cut at the block start
+        block = block[block.find(b'\n') + 1:]
+        try:
+            return pd.read_csv(io.BytesIO(block), header=None, names=names)
+        except Exception as e:
+            self.log.debug("Tail sample skipped: {}: {}".format(file_path, e))
+            return None
+
+    def _kind(self, series):
+        kind = series.dtype.kind
+        return kind if kind in WIDTH else 'O'
+
+    def _max_length(self, series):
+        if series.dtype.kind in 'biuf':
+            return 0
+        lengths = series.dropna().astype(str).str.len()
+        return int(lengths.max()) if len(lengths) else 0
+
+    def _widen(self, columns, df):
+        for name in df.columns:
+            kind, length = self._kind(df[name]), self._max_length(df[name])
+            if name not in columns:
+                columns[name] = {'kind': kind, 'length': length}
+                continue
+            column = columns[name]
+            if column['kind'] != kind:
+                column['kind'] = kind if WIDTH[kind] > WIDTH[column['kind']] else column['kind']
+                # mixed numbers and booleans are read as text by a full read
+                if 'b' in (column['kind'], kind):
+                    column['kind'] = 'O'
+            column['length'] = max(column['length'], length)
+
+    def _pg_type(self, column):
+        if column['kind'] in PG_TYPES:
+            return PG_TYPES[column['kind']]
+        return f"VARCHAR({VARCHAR_SIZE})" if column['length'] <= VARCHAR_SIZE else 'TEXT'
+
+    def _infer(self, file_path):
+        head = pd.read_csv(file_path, nrows=self.sample)
+        columns = {}
+        self._widen(columns, head)
+        if len(head) == self.sample:
+            tail = self._read_tail(file_path, list(head.columns))
+            if tail is not None:
+                self._widen(columns, tail)
+        return [(name, self._pg_type(columns[name])) for name in head.columns]
+
+    def infer(self, file_path):
+        if not os.path.exists(file_path):
+            raise WattleSchemaError("File not found: {}".format(file_path))
+
+        key, stamp = self._key(file_path)
+        if self.path:
+            with self._lock:
+                entry = self._load().get(key)
+            if entry and entry['stamp'] == stamp:
+                self.log.debug("Schema cache hit: {}".format(file_path))
+                return [tuple(field) for field in entry['fields']]
+
+        fields = self._infer(file_path)
+        if self.path:
+            with self._lock:
+                self._load()[key] = {'stamp': stamp, 'fields': fields}
+                self._save()
+        return fields
+
+    def clear(self):
+        self._entries = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
@@ -4,12 +4,55 @@ import time
 import datetime
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+
+from etl.core.resources import WattleResources, resources
+
+QUERY_CHUNKSIZE = 100000
+
+# PostgreSQL type OIDs to nullable pandas dtypes and Arrow types
+PG_DTYPES = {
+    16  : ('boolean', 'bool_'),
+    20  : ('Int64', 'int64'),
+    21  : ('Int64', 'int16'),
+    23  : ('Int64', 'int32'),
+    700 : ('float64', 'float32'),
+    701 : ('float64', 'float64'),
+    1700: ('float64', 'float64'), # numeric, decimals are converted to floats
+    25  : ('string', 'string'),
+    1042: ('string', 'string'),
+    1043: ('string', 'string'),
+    1082: ('datetime64[us]', 'date32'),
+    1114: ('datetime64[us]', 'timestamp_us'),
+    1184: ('datetime64[us, UTC]', 'timestamp_us_tz'),
+}
 
 class WattleSqlAlchemyError(Exception):
     pass
 
+WattleResources.register('sqlalchemy', lambda config: create_engine(config['url']), lambda engine: engine.dispose())
+
 class WattleSqlAlchemy:
+    """
+      This class is a simple SQLAlchemy wrapper for PostgreSQL. Instances with the
+      same connection parameters share one engine (and its connection pool) from
+      the resource registry, each instance checks out its own connection.
+
+      Constructor(**kwargs)
+          user, pswd, host, port, dbname - connection parameters.
+          logger  - WattleLogger instance.
+          verbose - print log entries when logger isn't given (default: False).
+
+      Methods:
+          query(sql)      - whole result as a DataFrame.
+          query_iter(sql, chunksize, dtypes, arrow) - result in chunks of `chunksize`
+                            rows read from a server-side cursor, so memory doesn't grow
+                            with the result size. Column dtypes come from the result
+                            column types instead of being inferred per chunk (`dtypes`
+                            overrides them, a column that can't be converted raises).
+                            With `arrow` chunks are pyarrow RecordBatches.
+          count(tablename) - number of rows of a table.
+    """
     def __init__(self, **kwargs):
         _user = kwargs['user'] if 'user' in kwargs else None
         _pswd = kwargs['pswd'] if 'pswd' in kwargs else None
@@ -20,7 +63,7 @@ class WattleSqlAlchemy:
         self.verbose = kwargs['verbose'] if 'verbose' in kwargs else False
 
         self.config = f"postgresql+psycopg2://{_user}:{_pswd}@{_host}:{_port}/{_db}"
-        self.engine = create_engine(self.config)
+        self.engine = resources.borrow('sqlalchemy', {'url': self.config})
         self.conn = self.engine.connect()
         connstr = re.sub(r":\w+@", ":***@", self.config)
         if self.verbose: self.log(f"Connected: {connstr}")
@@ -46,9 +89,71 @@ class WattleSqlAlchemy:
             }
             return pd.DataFrame(error, index=[0])
 
+    def _dtypes(self, description, dtypes):
+        result = {}
+        for column in description:
+            name, oid = column[0], column[1]
+            if dtypes and name in dtypes:
+                result[name] = dtypes[name]
+            elif oid in PG_DTYPES:
+                result[name] = PG_DTYPES[oid][0]
+        return result
+
+    def _arrow_type(self, oid):
+        import pyarrow as pa
+        if oid not in PG_DTYPES:
+            return None
+        name = PG_DTYPES[oid][1]
+        if name == 'timestamp_us': return pa.timestamp('us')
+        if name == 'timestamp_us_tz': return pa.timestamp('us', tz='UTC')
+        return getattr(pa, name)()
+
+    def _frame(self, rows, names, dtypes):
+        df = pd.DataFrame.from_records(rows, columns=names, coerce_float=True)
+        for name, dtype in dtypes.items():
+            try:
+                df[name] = df[name].astype(dtype)
+            except (TypeError, ValueError) as e:
+                # a chunk left with inferred dtypes wouldn't match the others
+                raise WattleSqlAlchemyError(f"Column {name} can't be converted to {dtype}: {e}")
+        return df
+
+    def _batch(self, rows, names, types):
+        import pyarrow as pa
+        columns = list(zip(*rows)) if rows else [[] for _ in names]
+        arrays = []
+        for values, kind in zip(columns, types):
+            if kind is not None and pa.types.is_floating(kind):
+                values = [float(v) if v is not None else None for v in values]
+            arrays.append(pa.array(values, type=kind))
+        return pa.RecordBatch.from_arrays(arrays, names=names)
+
+    def query_iter(self, sql, chunksize=QUERY_CHUNKSIZE, dtypes=None, arrow=False):
+        conn = self.engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize)
+        started, total = time.perf_counter(), 0
+        try:
+            result = conn.execute(text(sql) if isinstance(sql, str) else sql)
+            # read before fetching, a fully fetched small result closes its cursor
+            names = list(result.keys())
+            description = result.cursor.description
+            mapping = self._dtypes(description, dtypes)
+            types = [self._arrow_type(column[1]) for column in description]
+            while True:
+                rows = result.fetchmany(chunksize)
+                if not rows: break
+                total += len(rows)
+                yield self._batch(rows, names, types) if arrow else self._frame(rows, names, mapping)
+        finally:
+            conn.close()
+            seconds = time.perf_counter() - started
+            self.log(f"query_iter: {total} rows in {seconds:.3f} s")
+
     def close(self):
         self.conn.close()
+        resources.release('sqlalchemy', {'url': self.config})
 
     def count(self, tablename, details=False):
-        df1 = self.query(f"SELECT COUNT(*) FROM {tablename};", details)
-        return df.iloc[0,0]
\ No newline at end of file
+        df = self.query(f"SELECT COUNT(*) FROM {tablename};")
+        if 'error' in df.columns:
+            raise WattleSqlAlchemyError(df.iloc[0]['error'])
+        return int(df.iloc[0,0])
\ No newline at end of file
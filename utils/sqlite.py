@@ -0,0 +1,210 @@
+import time
+import sqlite3
+import pathlib
+
+import pandas as pd
+
+SQLITE_TIMEOUT = 60.0
+SQLITE_CHUNKSIZE = 100000
+SQLITE_FETCHSIZE = 50000
+
+# PRAGMAs of a bulk load: WAL doesn't rewrite pages into a rollback journal,
+# synchronous NORMAL syncs on checkpoints only, a 256 MiB page cache and
+# temporary b-trees (index builds) in memory
+BULK_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous' : 'NORMAL',
+    'cache_size'  : -262144,
+    'temp_store'  : 'MEMORY',
+}
+
+# PRAGMAs of a read-only connection: a 64 MiB page cache and memory-mapped reads
+READ_PRAGMAS = {
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+    'mmap_size' : 1 << 28,
+}
+
+SQLITE_TYPES = {'b': 'INTEGER', 'i': 'INTEGER', 'u': 'INTEGER', 'f': 'REAL'}
+
+# pandas dtypes of declared column types, by the affinity rules of SQLite (first
+# match); NUMERIC and BLOB columns can hold any value and are left to inference
+SQLITE_DTYPES = (
+    ('INT' , 'Int64'),
+    ('CHAR', 'string'),
+    ('CLOB', 'string'),
+    ('TEXT', 'string'),
+    ('REAL', 'float64'),
+    ('FLOA', 'float64'),
+    ('DOUB', 'float64'),
+)
+
+class WattleSQLiteError(Exception):
+    pass
+
+def quote(name):
+    return '"{}"'.format(str(name).replace('"', '""'))
+
+class WattleSQLite:
+    """
+      This class is a small sqlite3 wrapper for bulk loads and exports. DataFrame chunks are
+      inserted with `executemany` of Python values taken column by column (no
+      row-wise pandas conversion), inside a single transaction, on a connection
+      tuned with BULK_PRAGMAS. Indexes are created after the rows are loaded, which
+      builds each index once instead of updating it on every insert.
+
+      SQLite allows one writer per database file, so tables of the same file are
+      loaded one after the other, tables of different files can be loaded by
+      instances in parallel threads.
+
+      Query results are read with `fetchmany` into DataFrames of at most `size`
+      rows, so a table is exported with constant memory. Any number of `readonly`
+      instances can read one database file in parallel. Batches are built with the
+      `dtypes` of the declared column types (`table_dtypes`), so a batch whose
+      column is all NULL has the same types as the others.
+
+      Constructor(database, pragmas, timeout, logger, readonly)
+          database - database file path or sqlite3 connection (not closed by `close`).
+          pragmas  - dict of PRAGMAs set on the connection (default: BULK_PRAGMAS,
+                     READ_PRAGMAS when readonly).
+          timeout  - seconds to wait for a locked database (default: 60).
+          logger   - WattleLogger instance (optional).
+          readonly - True|False open the database file read-only (default: False).
+
+      Methods:
+          load(table, chunks, replace, indexes) - load DataFrames, returns rows.
+          create_indexes(table, indexes)        - create indexes on column lists.
+          table_dtypes(table, columns)          - pandas dtypes of declared column types.
+          query_iter(sql, size, params, dtypes) - yields DataFrames of a query.
+          export(sql, writer, size, convert, dtypes) - write a query to a WattleFormatWriter.
+          close()                               - close an owned connection.
+    """
+    def __init__(self, database, pragmas=None, timeout=SQLITE_TIMEOUT, logger=None, readonly=False):
+        self.logger = logger
+        self.owned = not isinstance(database, sqlite3.Connection)
+        if self.owned and readonly:
+            database = pathlib.Path(database).resolve().as_uri() + '?mode=ro'
+        # transactions are handled explicitly
+        self.conn = sqlite3.connect(database, timeout=timeout, isolation_level=None, check_same_thread=False, uri=readonly) \
+            if self.owned else database
+        if pragmas is None:
+            pragmas = READ_PRAGMAS if readonly else BULK_PRAGMAS
+        self.pragmas(pragmas)
+
+    def log(self, text):
+        if self.logger:
+            self.logger.info(text)
+
+    def pragmas(self, pragmas):
+        for name, value in pragmas.items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+
+    def _columns(self, df):
+        fields = []
+        for name in df.columns:
+            kind = df[name].dtype.kind
+            fields.append("{} {}".format(quote(name), SQLITE_TYPES[kind] if kind in SQLITE_TYPES else 'TEXT'))
+        return ', '.join(fields)
+
+    def _values(self, df):
+        # one list of Python values per column; sqlite stores float NaN as NULL
+        columns = []
+        for name in df.columns:
+            series = df[name]
+            if series.dtype.kind in 'biuf' and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+                columns.append(series.tolist())
+            else:
+                values = series.astype(str) if series.dtype.kind in 'mM' else series.astype(object)
+                columns.append(values.where(series.notna(), None).tolist())
+        return zip(*columns)
+
+    def _create(self, table, df, replace):
+        if replace:
+            self.conn.execute(f"DROP TABLE IF EXISTS {quote(table)}")
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(table)} ({self._columns(df)})")
+
+    def load(self, table, chunks, replace=True, indexes=None):
+        started = time.perf_counter()
+        rows, sql = 0, None
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for df in chunks:
+                if sql is None:
+                    self._create(table, df, replace)
+                    fields = ', '.join(quote(c) for c in df.columns)
+                    sql = "INSERT INTO {} ({}) VALUES ({})".format(quote(table), fields, ', '.join('?' * len(df.columns)))
+                self.conn.executemany(sql, self._values(df))
+                rows += len(df)
+            if sql is None:
+                raise WattleSQLiteError("No data to load into {}.".format(table))
+            if indexes:
+                self.create_indexes(table, indexes)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        seconds = time.perf_counter() - started
+        self.log("sqlite: loaded {}: {} rows in {:.3f} s ({:.0f} rows/s)".format(
+            table, rows, seconds, rows / seconds if seconds else 0))
+        return rows
+
+    def create_indexes(self, table, indexes):
+        for columns in indexes:
+            columns = [columns] if isinstance(columns, str) else list(columns)
+            name = "idx_{}_{}".format(table, '_'.join(columns))
+            self.conn.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                quote(name), quote(table), ', '.join(quote(c) for c in columns)))
+
+    def table_dtypes(self, table, columns=None):
+        dtypes = {}
+        for _, name, declared, *_ in self.conn.execute(f"PRAGMA table_info({quote(table)})"):
+            if columns and name not in columns: continue
+            declared = f"{declared}".upper()
+            for affinity, dtype in SQLITE_DTYPES:
+                if affinity in declared:
+                    dtypes[name] = dtype
+                    break
+        return dtypes
+
+    def _frame(self, rows, names, dtypes):
+        df = pd.DataFrame.from_records(rows, columns=names)
+        for name, dtype in dtypes.items():
+            if name not in df.columns: continue
+            try:
+                df[name] = df[name].astype(dtype)
+            except (TypeError, ValueError) as e:
+                # a value not matching the declared type, the column stays inferred
+                if self.logger:
+                    self.logger.warning("sqlite: column {} not converted to {}: {}".format(name, dtype, e))
+        return df
+
+    def query_iter(self, sql, size=SQLITE_FETCHSIZE, params=(), dtypes=None):
+        cursor = self.conn.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        dtypes = dtypes if dtypes else {}
+        try:
+            empty = True
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows: break
+                empty = False
+                yield self._frame(rows, names, dtypes)
+            if empty:
+                # an empty result still has columns
+                yield self._frame([], names, dtypes)
+        finally:
+            cursor.close()
+
+    def export(self, sql, writer, size=SQLITE_FETCHSIZE, convert=None, dtypes=None):
+        started = time.perf_counter()
+        for df in self.query_iter(sql, size, dtypes=dtypes):
+            writer.write(convert(df) if convert else df)
+        seconds = time.perf_counter() - started
+        self.log("sqlite: exported {}: {} rows in {:.3f} s ({:.0f} rows/s)".format(
+            writer.file_path, writer.rows, seconds, writer.rows / seconds if seconds else 0))
+        return writer.rows
+
+    def close(self):
+        if self.owned:
+            self.conn.close()